@@ -31,7 +31,9 @@ enum FUNCTION {
 	GET_ENABLE,         // 16
 	GET_TIMER,          // 17   // timer
 	GET_TIMEOUT,        // 18
-	SET_TIMEOUT         // 19
+	SET_TIMEOUT,        // 19
+	SET_BINARY,         // 20	// reserved: binary replies. See python/temp_controller/comms/SerialCodec.py
+	GET_PARAMETERS      // 21	// all parameters of every channel
 };
 
 enum COMMAND {
@@ -134,6 +134,29 @@ void parseStringCommand( char buffer[],     float target[],  float measure[],
 			printPorts( F("TIMEOUT"), timeout);
 			return;
 		}
+		
+		// all parameters in one reply: kp, ki, kd, alpha, beta, error, noise, imax, imin, 
+		// timeout, enable | repeated for each channel
+		else if( function == GET_PARAMETERS ) {
+			Serial.print( F("PARAMETERS") );
+			
+			for( uint8_t ch = 0; ch < NUM_PORT; ch += 1 ) {
+				float data[11];
+				controller[ch].getPIDGains(data);
+				controller[ch].getFilterGains(data + 3);
+				filter[ch].getGains(data + 5);
+				controller[ch].getInputLimits(data + 7);
+				data[9] = timeout[ch];
+				data[10] = enable_pid[ch];
+				
+				for( uint8_t i = 0; i < 11; i += 1 ) {
+					Serial.print( F(DELIM_CHAR) );
+					Serial.print( data[i], DECIMAL_MAX );
+				}
+			}
+			Serial.println();
+			return;
+		}
 	}
 	
 		// check valid channel
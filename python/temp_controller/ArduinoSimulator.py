@@ -0,0 +1,753 @@
+"""
+Stand-in for the Arduino firmware that runs on a pseudo-terminal. It speaks the same serial protocol
+as `arduino/SerialCom.ino` (sensor type handshake, the commands of `arduino/Commands.h` and
+`BAD_COMMAND`), so `TempControllerCN0391(port=...)` can be used without hardware:
+
+```bash
+python3 ArduinoSimulator.py --latency 0.01
+```
+
+The port that is printed (Ex: `/dev/pts/3`) is then passed to the Python API. Each channel heats a
+simple first-order thermal model with the output of a copy of the firmware's PID controller.
+
+__Note:__ Pseudo-terminals are only available on Linux and macOS.
+"""
+
+# Global libraries
+import os
+import pty
+import tty
+import re
+import math
+import time
+import random
+import select
+import struct
+import argparse
+import threading
+
+# local file
+from comms import SerialCodec
+
+#--- CONSTANTS ---
+# See: arduino/Constants.h
+_NUM_PORT    = 4
+_N_AVERAGE   = 10
+_BAUD_RATE   = 9600
+_BUFFER_SIZE = 30
+_INPUTS_MAX  = 6
+_DECIMAL_MAX = 2
+_RX_BUFFER   = 64 		# bytes | Serial input buffer of the Arduino Uno. Extra bytes are lost
+_READ_TIMEOUT = 1 		# seconds | Default timeout of Serial.readBytesUntil()
+_SENSOR_TYPES = ('T', 'J', 'K', 'E', 'S', 'R', 'N', 'B')
+
+# See: arduino/Commands.h
+(GET_FILTER, GET_RAW, GET_TARGET, SET_TARGET, GET_PID, SET_PID, GET_IN_LIMIT, SET_IN_LIMIT,
+ GET_AB_FILTER, SET_AB_FILTER, GET_K_FILTER, SET_K_FILTER, SET_K_FILTER_STATE, GET_SENSOR_TYPE,
+ SET_ENABLE, SET_DISABLE, GET_ENABLE, GET_TIMER, GET_TIMEOUT, SET_TIMEOUT, SET_BINARY,
+ GET_PARAMETERS) = range(22)
+CH_ALL   = 4
+TIME_INF = -1
+
+# See: arduino/src/PIDController/PIDController.cpp
+_OUT_MAX = 1
+_OUT_MIN = 0
+_IN_DIFF_MIN = 1
+
+# Numbers accepted by strtod(). The whole token must be converted. See: parseNumbers()
+_NUMBER = re.compile(r'\s*[+-]?((\d+\.?\d*|\.\d+)([eE][+-]?\d+)?|inf(inity)?|nan)\Z', re.I)
+
+#===================================================================================================
+
+def float32(num:float) -> float:
+	'''Round a number to the single precision floats used by the Arduino
+	'''
+	try:
+		return struct.unpack('f', struct.pack('f', num))[0]
+	except OverflowError:
+		return math.copysign(math.inf, num)
+
+
+def limit(num:float) -> float:
+	'''Constrain a coefficient to [0, 1]. See the `LIMIT` macro of `PIDController.h`
+	'''
+	return 0 if num < 0 else 1 if num > 1 else num
+
+
+def print_float(num:float, digits:int = _DECIMAL_MAX) -> str:
+	'''Format a number like `Serial.print(float, digits)` of the Arduino core.
+	'''
+	if math.isnan(num):
+		return "nan"
+	if math.isinf(num):
+		return "inf" if num > 0 else "-inf"
+	if num > 4294967040.0 or num < -4294967040.0:
+		return "ovf"
+	
+	sign = "-" if num < 0 else ""
+	num = abs(num) + 0.5 / 10**digits 			# round, then truncate
+	integer = int(num)
+	decimals = int( (num - integer) * 10**digits )
+	return f"{sign}{integer}.{decimals:0{digits}d}" if digits > 0 else f"{sign}{integer}"
+
+#===================================================================================================
+
+class PIDcontroller:
+	'''Copy of the PID controller of the firmware. See: arduino/src/PIDController
+	'''
+	
+	def __init__(self, kp:float, ki:float, kd:float, imax:float, imin:float,
+	             alpha:float, beta:float):
+		self.setPIDGains(kp, ki, kd)
+		self.setFilterGains(alpha, beta)
+		self.setInputLimits(imax, imin)
+		self.setState(0)
+	
+	
+	def setState(self, value:float) -> None:
+		self._output = 0
+		self.integral = 0
+		self.dx_dt = 0
+		self.xvar = self.normalize(value)
+	
+	
+	def normalize(self, value:float) -> float:
+		return value*self.in_scale + self.in_offset
+	
+	
+	def update(self, target:float, measure:float, dt:float) -> None:
+		target = self.normalize(target)
+		measure = self.normalize(measure)
+		
+		# alpha-beta filter
+		dx = measure - self.xvar
+		self.xvar += self.dx_dt*dt + self.alpha*dx
+		self.dx_dt += self.beta * dx/dt
+		
+		# Sum components
+		error = target - self.xvar
+		integral_new = self.integral + self.ki*error*dt
+		output = self.kp*error + integral_new - self.kd*self.dx_dt
+		
+		if output > _OUT_MAX:
+			output = _OUT_MAX
+		elif output < _OUT_MIN:
+			output = _OUT_MIN
+		else:						# Prevent integral windup
+			self.integral = integral_new
+		self._output = output
+	
+	
+	def output(self) -> float:
+		return self._output
+	
+	
+	def setPIDGains(self, kp:float, ki:float, kd:float) -> None:
+		self.kp, self.ki, self.kd = float32(kp), float32(ki), float32(kd)
+	
+	
+	def getPIDGains(self) -> list:
+		return [self.kp, self.ki, self.kd]
+	
+	
+	def setFilterGains(self, alpha:float, beta:float = None) -> None:
+		self.alpha = float32( limit(alpha) )
+		if beta == None:
+			beta = 0.5 * self.alpha * self.alpha	# constant damping ratio
+		self.beta = float32( limit(beta) )
+	
+	
+	def getFilterGains(self) -> list:
+		return [self.alpha, self.beta]
+	
+	
+	def setInputLimits(self, imax:float, imin:float) -> None:
+		if abs(imax - imin) < _IN_DIFF_MIN:		# prevent zero division
+			imax = _IN_DIFF_MIN
+			imin = 0
+		self.in_scale = float32( 1.0/(imax - imin) )
+		self.in_offset = float32( -imin * self.in_scale )
+	
+	
+	def getInputLimits(self) -> list:
+		inv = float32( 1 / self.in_scale )
+		imin = float32( -self.in_offset * inv )
+		return [float32(inv + imin), imin]
+
+#---------------------------------------------------------------------------------------------------
+
+class KalmanFilter1D:
+	'''Copy of the Kalman filter of the firmware. See: arduino/src/KalmanFilter1D
+	'''
+	
+	def __init__(self, error:float, qval:float):
+		self.x = 0
+		self.var = 1
+		self.setGains(error, qval)
+	
+	
+	def setGains(self, error:float, qval:float) -> None:
+		if error > 0 and qval > 0:
+			self.var_measure = float32(error*error)
+			self.qval = float32(qval)
+		else:
+			self.var_measure = 1 		# default values
+			self.qval = 0
+	
+	
+	def getGains(self) -> list:
+		return [float32( math.sqrt(self.var_measure) ), self.qval]
+	
+	
+	def setState(self, value:float) -> None:
+		self.x = float32(value)
+	
+	
+	def update(self, xin:float) -> None:
+		gain = self.var/(self.var + self.var_measure)
+		dx = xin - self.x
+		dxq = dx*self.qval
+		self.var = (1 - gain)*self.var + dxq*dxq
+		self.x += gain*dx
+	
+	
+	def value(self) -> float:
+		return self.x
+
+#===================================================================================================
+
+class ArduinoSimulator:
+
+	def __init__(self, latency:float = 0, baud_rate:int = _BAUD_RATE, loop_period:float = 0.05,
+	             boot_time:float = 1, reset_on_open:bool = True, ambient:float = 25,
+	             noise:float = 0.05, tau:float = 60, heat:float = 2, binary:bool = False):
+		'''Initialize a simulated Arduino. Call `start()` to open the pseudo-terminal.
+		
+		Parameters
+		----------
+		latency: float
+			Additional time (in seconds) before each reply is written
+		
+		baud_rate: int
+			Baud rate used to pace the bytes that are sent and received. Zero disables pacing.
+		
+		loop_period: float
+			Time (in seconds) of one iteration of `loop()` in the firmware. Only one command is
+			read per iteration.
+		
+		boot_time: float
+			Duration (in seconds) of each `delay(1000)` of the firmware setup. Zero starts fast.
+		
+		reset_on_open: bool
+			Whether the firmware restarts each time the port is opened, like an Arduino Uno
+			without a capacitor on its reset pin.
+		
+		ambient: float
+			Temperature (in Celsius) of the surroundings of each channel
+		
+		noise: float
+			Standard deviation (in Celsius) of the raw measurements
+		
+		tau: float
+			Time constant (in seconds) of the thermal model of each channel
+		
+		heat: float
+			Heating rate (in Celsius per second) of a channel whose output is fully on
+		
+		binary: bool
+			Whether the firmware accepts the command that selects binary replies. See `SerialCodec`.
+			Otherwise it answers `BAD_COMMAND`, like `arduino/SerialCom.ino`.
+		'''
+		# configuration
+		self.latency = latency
+		self.baud_rate = baud_rate
+		self.loop_period = loop_period
+		self.boot_time = boot_time
+		self.reset_on_open = reset_on_open
+		self.ambient = ambient
+		self.noise = noise
+		self.tau = tau
+		self.heat = heat
+		self.binary = binary
+		
+		# pseudo-terminal
+		self.port = None
+		self._master = None
+		self._thread = None
+		self._stop = threading.Event()
+		
+		# serial buffers
+		self._rx = bytearray()
+		self._rx_time = 0				# time the last byte arrived
+		self._attached = False
+		
+		self._temperature = [ambient]*_NUM_PORT
+		self._boot()
+	
+	
+	def _boot(self) -> None:
+		'''Private function that restores the state of the firmware after a reset
+		'''
+		self.state = 'detached'
+		self.stype = ['N']*_NUM_PORT		# SENSOR_TYPE
+		self.target = [0.0]*_NUM_PORT		# PID_TARGET
+		self.enable_pid = [False]*_NUM_PORT
+		self.timer = [0.0]*_NUM_PORT
+		self.timeout = [float(TIME_INF)]*_NUM_PORT
+		self.measure = list(self._temperature)
+		self.binary_replies = False
+		
+		# PID_COEFF_1 ... PID_COEFF_4 and FILT_COEFF_1 ... FILT_COEFF_4
+		self.controller = [ PIDcontroller(0, 0, 0, imax, 0, 0, 0) for imax in (5, 10, 20, 30) ]
+		self.filter = [ KalmanFilter1D(0, 0) for ch in range(_NUM_PORT) ]
+		self._time_last = time.monotonic()
+	
+	
+	def start(self) -> str:
+		'''Open the pseudo-terminal and start the firmware on a background thread.
+		
+		Returns
+		-------
+		port: str
+			Path of the serial port. Ex: `/dev/pts/3`
+		'''
+		self._master, slave = pty.openpty()
+		tty.setraw(slave)
+		self.port = os.ttyname(slave)
+		os.close(slave)				# detect when a client opens the port
+		
+		self._stop.clear()
+		self._thread = threading.Thread(target=self._run, name='arduino-simulator', daemon=True)
+		self._thread.start()
+		return self.port
+	
+	
+	def stop(self) -> None:
+		'''Stop the firmware and close the pseudo-terminal
+		'''
+		self._stop.set()
+		if self._thread != None:
+			self._thread.join()
+		if self._master != None:
+			os.close(self._master)
+			self._master = None
+	
+	
+	def __enter__(self):
+		self.start()
+		return self
+	
+	
+	def __exit__(self, *args) -> None:
+		self.stop()
+	
+	# ================ serial port ================
+	
+	def _poll_port(self, timeout:float) -> None:
+		'''Private function that waits for bytes from the client and tracks whether the port is
+		open. A closed pseudo-terminal reports a hang-up.
+		'''
+		poller = select.poll()
+		poller.register(self._master, select.POLLIN)
+		events = poller.poll( max(0, timeout) * 1e3 )
+		is_open = not any( flag & select.POLLHUP for fd, flag in events )
+		
+		if is_open and not self._attached:			# client opened the port
+			self._attached = True
+			self._rx.clear()
+			if self.reset_on_open or self.state == 'detached':
+				self._boot()
+				self.state = 'booting'
+				self._state_time = time.monotonic()
+		
+		elif not is_open and self._attached:		# client closed the port
+			self._attached = False
+			self._rx.clear()
+			if self.reset_on_open:
+				self.state = 'detached'
+		
+		if not is_open:
+			time.sleep( min(timeout, 0.05) ) 	# hang-up is reported immediately
+			return
+		
+		if any( flag & select.POLLIN for fd, flag in events ):
+			try:
+				data = os.read(self._master, 1024)
+			except OSError:
+				return
+			
+			# transfer time of the bytes at the baud rate
+			if self.baud_rate > 0:
+				time.sleep( 10*len(data)/self.baud_rate )
+			
+			room = _RX_BUFFER - len(self._rx)
+			self._rx += data[:max(0, room)]			# overflow is lost, as on the Arduino
+			self._rx_time = time.monotonic()
+	
+	
+	def _println(self, string:str) -> None:
+		'''Private function that writes a line like `Serial.println()`. Blocks until the bytes are
+		sent, like `Serial.flush()`.
+		'''
+		if not self._attached:
+			return
+		
+		if self.binary_replies:
+			data = SerialCodec.encode_reply(string)
+		else:
+			data = f"{string}\r\n".encode('utf-8')
+		if self.baud_rate > 0:
+			time.sleep( 10*len(data)/self.baud_rate )
+		try:
+			os.write(self._master, data)
+		except OSError:
+			pass
+	
+	
+	def _read_command(self) -> bytes | None:
+		'''Private function that captures characters like `Serial.readBytesUntil()`. Returns `None`
+		if no complete command is available.
+		'''
+		if len(self._rx) == 0:
+			return None
+		
+		end = self._rx.find(b'\n')
+		timed_out = time.monotonic() - self._rx_time > _READ_TIMEOUT
+		
+		if end < 0 or end >= _BUFFER_SIZE:
+			if len(self._rx) < _BUFFER_SIZE and not timed_out:
+				return None
+			data = bytes( self._rx[:_BUFFER_SIZE] )	# buffer is full: terminator is kept
+			del self._rx[:_BUFFER_SIZE]
+			return data
+		
+		data = bytes( self._rx[:end] )
+		del self._rx[:end + 1]
+		return data
+	
+	# ================ firmware ================
+	
+	def _run(self) -> None:
+		'''Private loop of the simulated firmware
+		'''
+		while not self._stop.is_set():
+			self._poll_port(self.loop_period if self.state == 'running' else 0.01)
+			
+			if self.state == 'booting':
+				if time.monotonic() - self._state_time >= self.boot_time:
+					self._println("CONNECTED")
+					self._println("WAITING-TYPES")
+					self.state = 'waiting-types'
+			
+			elif self.state == 'waiting-types':
+				self._read_sensor_types()
+			
+			elif self.state == 'calibrating':
+				if time.monotonic() - self._state_time >= self.boot_time:
+					self._calibrate()
+					self._println("CALIBRATED")
+					self.state = 'running'
+			
+			elif self.state == 'running':
+				self._loop()
+	
+	
+	def _read_sensor_types(self) -> None:
+		'''Private function that mirrors `readSensorTypes()` of `SerialCom.ino`
+		'''
+		buffer = self._read_command()
+		if buffer == None:
+			return
+		
+		if len(buffer) == _NUM_PORT:
+			types = buffer.decode('utf-8', errors='replace')
+			if all(char in _SENSOR_TYPES for char in types):
+				self.stype = list(types)
+				self._println("RECEIVED-TYPES")
+				self._start_calibration()
+			else:
+				self._println("BAD_COMMAND")
+		
+		elif buffer == b'0':
+			self._println("DEFAULT-TYPES")
+			self._start_calibration()
+		
+		else:
+			self._println("BAD_COMMAND")
+	
+	
+	def _start_calibration(self) -> None:
+		self.state = 'calibrating'
+		self._state_time = time.monotonic()
+	
+	
+	def _measure(self) -> list:
+		'''Private function that returns noisy measurements of the thermal model
+		'''
+		return [ float32( temp + random.gauss(0, self.noise) ) for temp in self._temperature ]
+	
+	
+	def _calibrate(self) -> None:
+		'''Private function that mirrors `setupControllers()` and `setupFilters()`
+		'''
+		temp_av = [0.0]*_NUM_PORT
+		for i in range(_N_AVERAGE):
+			measure = self._measure()
+			for ch in range(_NUM_PORT):
+				temp_av[ch] += measure[ch] / _N_AVERAGE
+		
+		for ch in range(_NUM_PORT):
+			self.controller[ch].setState(temp_av[ch])
+			self.filter[ch].setState(temp_av[ch])
+		self._time_last = time.monotonic()
+	
+	
+	def _loop(self) -> None:
+		'''Private function that mirrors `loop()` of `arduino.ino`
+		'''
+		time_now = time.monotonic()
+		dt = max(time_now - self._time_last, 1e-3)
+		self._time_last = time_now
+		
+		self.measure = self._measure()
+		
+		# readSerialInputs()
+		for ch in range(_NUM_PORT):
+			if self.enable_pid[ch]:
+				self.timer[ch] += dt
+			if self.timeout[ch] > 0 and self.timer[ch] > self.timeout[ch]:
+				self.enable_pid[ch] = False
+				self.timer[ch] = 0
+		
+		buffer = self._read_command()
+		if buffer != None:
+			if self.latency > 0:
+				time.sleep(self.latency)
+			self._parse_command(buffer)
+		
+		# updateControllers() and the thermal model
+		for ch in range(_NUM_PORT):
+			if self.enable_pid[ch]:
+				self.controller[ch].update(self.target[ch], self.measure[ch], dt)
+				duty = self.controller[ch].output()
+			else:
+				self.controller[ch].setState(self.measure[ch])
+				duty = 0
+			
+			temp = self._temperature[ch]
+			self._temperature[ch] = temp + dt*( (self.ambient - temp)/self.tau + self.heat*duty )
+		
+		# updateOutputFilters()
+		for ch in range(_NUM_PORT):
+			self.filter[ch].update(self.measure[ch])
+	
+	# ================ serial commands ================
+	
+	def _print_ports(self, label:str, data:list, is_number:bool = True) -> None:
+		if is_number:
+			data = [ print_float(num) for num in data ]
+		self._println( ",".join([label, *map(str, data)]) )
+	
+	
+	def _print_parameters(self, label:str, data:list, ch:int) -> None:
+		self._println( f"{label}{ch}," + ",".join( print_float(num) for num in data ) )
+	
+	
+	def _parse_numbers(self, buffer:bytes) -> list:
+		'''Private function that mirrors `parseNumbers()`. Returns an empty list if any token is
+		not a number.
+		'''
+		tokens = [ token for token in buffer.split(b',') if token != b'' ]		# strtok()
+		numbers = []
+		
+		for token in tokens[:_INPUTS_MAX]:
+			token = token.decode('utf-8', errors='replace')
+			if _NUMBER.match(token) == None:
+				return []
+			numbers.append( float32( float(token) ) )
+		
+		return numbers
+	
+	
+	def _parse_command(self, buffer:bytes) -> None:
+		'''Private function that mirrors `parseStringCommand()` of `SerialCom.ino`
+		'''
+		numbers = self._parse_numbers(buffer)
+		ninput = len(numbers)
+		
+		if ninput == 0:
+			self._println("BAD_COMMAND")
+			return
+		
+		# float input[INPUTS_MAX] = {-1}
+		values = numbers + [0.0]*(_INPUTS_MAX - ninput)
+		truncate = lambda num: int(num) if math.isfinite(num) else -1
+		function = truncate(values[0])
+		ch = truncate(values[1])
+		param = values[2:]
+		
+		if ninput == 1:
+			if function == GET_FILTER:
+				self._print_ports("FILTER", [ filt.value() for filt in self.filter ])
+				return
+			elif function == GET_RAW:
+				self._print_ports("RAW", self.measure)
+				return
+			elif function == GET_TARGET:
+				self._print_ports("TARGET", self.target)
+				return
+			elif function == GET_SENSOR_TYPE:
+				self._print_ports("SENSOR_TYPES", self.stype, is_number=False)
+				return
+			elif function == GET_ENABLE:		# booleans are printed in base 2
+				self._print_ports("ENABLE", [ int(flag) for flag in self.enable_pid ], False)
+				return
+			elif function == GET_TIMER:
+				self._print_ports("TIMER", self.timer)
+				return
+			elif function == GET_TIMEOUT:
+				self._print_ports("TIMEOUT", self.timeout)
+				return
+			elif function == GET_PARAMETERS:
+				data = []
+				for ch, controller in enumerate(self.controller):
+					data += controller.getPIDGains() + controller.getFilterGains() + \
+					        self.filter[ch].getGains() + controller.getInputLimits() + \
+					        [ self.timeout[ch], int(self.enable_pid[ch]) ]
+				self._print_ports("PARAMETERS", data)
+				return
+		
+		elif 0 <= ch < _NUM_PORT:
+			controller = self.controller[ch]
+			
+			if ninput == 2:
+				if function == GET_PID:
+					self._print_parameters("PID_", controller.getPIDGains(), ch)
+					return
+				elif function == GET_IN_LIMIT:
+					self._print_parameters("IN_LIMIT_", controller.getInputLimits(), ch)
+					return
+				elif function == GET_AB_FILTER:
+					self._print_parameters("AB_FILTER_", controller.getFilterGains(), ch)
+					return
+				elif function == GET_K_FILTER:
+					self._print_parameters("K_FILTER_", self.filter[ch].getGains(), ch)
+					return
+				elif function == SET_ENABLE:
+					self.enable_pid[ch] = True
+					self._println("SET_ENABLE")
+					return
+				elif function == SET_DISABLE:
+					self.enable_pid[ch] = False
+					self.timer[ch] = 0
+					self._println("SET_DISABLE")
+					return
+				elif function == SET_BINARY and self.binary and ch <= 1:
+					self.binary_replies = False		# the reply is always text
+					self._println("SET_BINARY")
+					self.binary_replies = bool(ch)
+					return
+			
+			elif ninput == 3:
+				if function == SET_TARGET:
+					self.target[ch] = param[0]
+					self._println("SET_TARGET")
+					return
+				elif function == SET_AB_FILTER:
+					controller.setFilterGains(param[0])
+					self._println("SET_AB_FILTER")
+					return
+				elif function == SET_K_FILTER_STATE:
+					self.filter[ch].setState(param[0])
+					self._println("SET_K_FILTER_STATE")
+					return
+				# NOTE: same operator precedence as the firmware. Any command with 3 inputs and
+				# a value of -1 sets the timeout.
+				elif function == SET_TIMEOUT and param[0] > 0 or param[0] == TIME_INF:
+					self.timeout[ch] = param[0]
+					self._println("SET_TIMEOUT")
+					return
+			
+			elif ninput == 4:
+				if function == SET_IN_LIMIT:
+					controller.setInputLimits(param[0], param[1])
+					self._println("SET_IN_LIMIT")
+					return
+				elif function == SET_AB_FILTER:
+					controller.setFilterGains(param[0], param[1])
+					self._println("SET_AB_FILTER")
+					return
+				elif function == SET_K_FILTER:
+					self.filter[ch].setGains(param[0], param[1])
+					self._println("SET_K_FILTER")
+					return
+			
+			elif ninput == 5 and function == SET_PID:
+				controller.setPIDGains(param[0], param[1], param[2])
+				self._println("SET_PID")
+				return
+		
+		elif ch == CH_ALL:
+			if ninput == 6 and function == SET_TARGET:
+				self.target = list( param[:_NUM_PORT] )
+				self._println("SET_TARGET")
+				return
+			
+			elif ninput == 2:
+				if function == SET_ENABLE:
+					self.enable_pid = [True]*_NUM_PORT
+					self._println("SET_ENABLE")
+					return
+				elif function == SET_DISABLE:
+					self.enable_pid = [False]*_NUM_PORT
+					self.timer = [0.0]*_NUM_PORT
+					self._println("SET_DISABLE")
+					return
+		
+		self._println("BAD_COMMAND")
+
+#===================================================================================================
+
+def captureInputs() -> object:
+	'''Captures the command line parameters of the simulator. See `ArduinoSimulator`
+	'''
+	parser = argparse.ArgumentParser()
+	
+	parser.add_argument('--latency', type=float, default=0, \
+	                    help="Additional delay before each reply (Seconds)")
+	
+	parser.add_argument('--baud_rate', type=int, default=_BAUD_RATE, \
+	                    help="Baud rate used to pace the serial data. Zero disables pacing")
+	
+	parser.add_argument('--loop_period', type=float, default=0.05, \
+	                    help="Duration of one iteration of the firmware loop (Seconds)")
+	
+	parser.add_argument('--boot_time', type=float, default=1, \
+	                    help="Duration of each delay of the firmware setup (Seconds)")
+	
+	parser.add_argument('--no_reset', action='store_true', \
+	                    help="Keep the firmware running when the port is reopened")
+	
+	parser.add_argument('--binary', action='store_true', \
+	                    help="Accept the command that selects binary replies")
+	
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	args = captureInputs()
+	
+	simulator = ArduinoSimulator(latency=args.latency,         \
+	                             baud_rate=args.baud_rate,     \
+	                             loop_period=args.loop_period, \
+	                             boot_time=args.boot_time,     \
+	                             reset_on_open=not args.no_reset, \
+	                             binary=args.binary)
+	print( simulator.start() )
+	
+	try:
+		while True:
+			time.sleep(1)
+	except KeyboardInterrupt:
+		simulator.stop()
+
@@ -0,0 +1,636 @@
+"""
+This module is an `asyncio` counterpart of `TempControllerCN0391`. It sends the same serial
+commands, but every getter and setter is a coroutine, so a single event loop can drive several
+controllers, a web server and a logger at the same time.
+
+```python
+async with AsyncTempController(port="/dev/ttyACM0") as controller:
+	await controller.set_target(0, 45)
+	print( await controller.get_filter() )
+```
+"""
+
+# Global libraries
+import asyncio
+
+# local file
+from comms import AsyncSerial
+from comms import ArduinoSerial
+import TempControllerCN0391 as cntl
+from TempControllerCN0391 import round_input
+
+#--- CONSTANTS ---
+_SETUP_TIMEOUT = 30 	# seconds | Time allowed for the Arduino to reset and calibrate its sensors
+
+#===================================================================================================
+
+class AsyncTempController:
+
+	# JSON bookkeeping is shared with the blocking controller
+	_load_json_file       = cntl.TempControllerCN0391._load_json_file
+	_construct_json       = cntl.TempControllerCN0391._construct_json
+	get_json_data         = cntl.TempControllerCN0391.get_json_data
+	save_json_file        = cntl.TempControllerCN0391.save_json_file
+	_set_pid_json         = cntl.TempControllerCN0391._set_pid_json
+	_set_in_limit_json    = cntl.TempControllerCN0391._set_in_limit_json
+	_set_k_filter_json    = cntl.TempControllerCN0391._set_k_filter_json
+	_set_ab_filter_json   = cntl.TempControllerCN0391._set_ab_filter_json
+	_set_enable_json      = cntl.TempControllerCN0391._set_enable_json
+	_set_enable_all_json  = cntl.TempControllerCN0391._set_enable_all_json
+	_set_disable_json     = cntl.TempControllerCN0391._set_disable_json
+	_set_disable_all_json = cntl.TempControllerCN0391._set_disable_all_json
+	_set_timeout_json     = cntl.TempControllerCN0391._set_timeout_json
+	_set_timeout_inf_json = cntl.TempControllerCN0391._set_timeout_inf_json
+	_parse_parameters     = cntl.TempControllerCN0391._parse_parameters
+	_parse_getters        = cntl.TempControllerCN0391._parse_getters
+	
+	def __init__(self, port:str = None, baud_rate:int = cntl._DEFAULT_BAUD, path:str = None,
+	             sensor_types:list = None, deadline:float = ArduinoSerial._DEADLINE ):
+		'''Initialize the temperature controller. The serial connection is opened by `connect()`,
+		or by using the controller in an `async with` block.
+		
+		Parameters
+		----------
+		See `TempControllerCN0391` for details
+		'''
+		# initialize dictionary
+		self.json_data = {}
+		self.serial = None
+		self._deadline = deadline
+		self._sensor_types = sensor_types
+		self._has_path = path != None
+		
+		# json file is provided
+		if path != None:
+			self._load_json_file(path)
+		
+		# no json file
+		elif port != None:
+			self.json_data = self._construct_json()
+			self.json_data["serial_port"] = port
+			self.json_data["baud_rate"] = baud_rate
+		
+		else:
+			raise ValueError("Did not specify a Serial Port!")
+	
+	
+	async def connect(self) -> None:
+		'''Open the serial connection, configure the sensor types and synchronize the
+		parameters with the JSON file or with the device.
+		'''
+		self.serial = AsyncSerial.AsyncSerialCommunication( self.json_data["serial_port"], \
+		                                                    self.json_data["baud_rate"],   \
+		                                                    self._deadline )
+		if self._has_path:
+			await self._setup( self.json_data["sensor_types"] )
+			await self._set_json_coefficients()
+		else:
+			await self._setup( self._sensor_types )
+			await self._get_device_coefficients()
+	
+	
+	async def __aenter__(self):
+		await self.connect()
+		return self
+	
+	
+	async def __aexit__(self, *args) -> None:
+		self.close()
+	
+	# ================ setup ================
+	
+	async def _setup_arduino(self, cmd:str) -> None:
+		'''Waits for the Arduino to request the sensor types, sends them and waits for the
+		calibration to finish. See `TempControllerCN0391._setup_arduino()`
+		
+		Parameters
+		----------
+		cmd : string
+			Serial command
+		'''
+		loop = asyncio.get_running_loop()
+		end = loop.time() + _SETUP_TIMEOUT
+		
+		while True:
+			data = await self.serial.read_event( end - loop.time() )
+			print(data)
+			
+			if data == 'WAITING-TYPES': # COMMAND MUST MATCH ARDUINO OUTPUT
+				reply = await self._setter(cmd)
+				print(reply)
+			elif data == "CALIBRATED":  # COMMAND MUST MATCH ARDUINO OUTPUT
+				break
+	
+	
+	async def _setup(self, sensor_types:list) -> None:
+		'''Assigns the sensor types for each port. See `TempControllerCN0391._setup()`
+		
+		Parameters
+		----------
+		sensor_types: list(str)
+			List of characters with the sensor type for each port.
+		'''
+		if sensor_types == None:
+			await self._setup_arduino('0')
+		else:
+			for char in sensor_types:
+				if char not in ('T', 'J', 'K', 'E', 'S', 'R', 'N', 'B'):
+					self.serial.close() # gracefully stop connection
+					raise ValueError("Provided an incorrect sensor type for the Arduino setup")
+			
+			await self._setup_arduino( "".join(sensor_types) )
+		
+		self.json_data["sensor_types"] = await self.get_sensor_type()
+	
+	# ================ wrappers ================
+	
+	def close(self) -> None:
+		''' Close the serial connection. Pending commands fail with a `ConnectionError`. Closing \
+		    a controller that is already closed does nothing.
+		'''
+		if self.serial != None:
+			self.serial.close()
+	
+	
+	def is_active(self) -> bool:
+		'''Returns whether the serial connection is active (True) or disabled (False)
+		
+		Returns
+		-------
+		is_active: bool
+		'''
+		return self.serial != None and self.serial.is_active()
+	
+	
+	async def set_binary(self, enable:bool = True) -> bool:
+		'''Select binary replies (True) or CSV replies (False). Binary replies are about half as
+		long, which shortens every round trip. See `AsyncSerialCommunication.set_binary()`
+		
+		Returns
+		-------
+		is_binary: bool
+			Whether the replies are binary. False if the firmware does not support them.
+		'''
+		return await self.serial.set_binary(enable)
+	
+	
+	async def send_serial_command(self, cmd:str) -> str:
+		''' Send an arbitrary serial command and receive a reply from the Arduino
+		
+		Parameters
+		----------
+		cmd: str
+			String that contains serial command
+		
+		Returns
+		-------
+		reply : str
+			String that contains serial reply from the Arduino
+		'''
+		return await self._setter(cmd)
+	
+	# ================ functions ================
+		# private
+	async def _getter(self, cmd:str, out:str = None) -> str | list | dict:
+		''' Private function to send a serial command and receive a parsed reply.
+		See `TempControllerCN0391._getter()`
+		'''
+		return await self.serial.request_data(cmd, out)
+	
+	
+	async def _setter(self, cmd:str) -> str:
+		''' Private function to send a serial command and receive the raw reply
+		'''
+		return await self.serial.request(cmd)
+		
+		# sensor
+	async def get_filter(self) -> list:
+		'''Gets the temperature measurements that have been smoothed by a kalman filter
+		
+		Returns
+		-------
+		temp: list[float]
+			Temperature of each port: [port1, port2, port3, port4]
+		'''
+		return await self._getter("0", out='param')
+	
+	
+	async def get_raw(self) -> list:
+		'''Gets the raw temperature measurements of the sensor(s)
+		
+		Returns
+		-------
+		temp: list[float]
+			Temperature of each port: [port1, port2, port3, port4]
+		'''
+		return await self._getter("1", out='param')
+	
+	
+	async def get_target(self) -> list:
+		'''Gets the target temperatures of the PID controllers
+		
+		Returns
+		-------
+		temp: list[float]
+			Target temperature of each port: [port1, port2, port3, port4]
+		'''
+		return await self._getter("2", out='param')
+		
+		# target
+	async def set_target(self, ch:int, target:float) -> None:
+		'''Sets the target temperature of the PID controller of a specific port
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the temperature shield. Options are: {0, 1, 2, 3}
+		
+		target : float
+			Target temperature (in Celsius) for the PID controller of specified channel
+		'''
+		target = round_input(target)
+		
+		cmd = "3," + str(ch) + "," + str(target)
+		await self._setter(cmd)
+	
+	
+	async def set_target_all(self, targ0:float, targ1:float, targ2:float, targ3:float) -> None:
+		'''Sets the target temperature for all PID controllers simultaneously
+		
+		Parameters
+		----------
+		targ0 : float
+			Target temperature (in Celsius) for the PID controller of channel 0
+		
+		targ1 : float
+			Target temperature (in Celsius) for the PID controller of channel 1
+		
+		targ2 : float
+			Target temperature (in Celsius) for the PID controller of channel 2
+		
+		targ3 : float
+			Target temperature (in Celsius) for the PID controller of channel 3
+		'''
+		targ0 = round_input(targ0)
+		targ1 = round_input(targ1)
+		targ2 = round_input(targ2)
+		targ3 = round_input(targ3)
+		
+		cmd = "3,4," + str(targ0) + "," + str(targ1) + "," + str(targ2) + "," + str(targ3)
+		await self._setter(cmd)
+		
+		# PID controller
+	async def get_pid(self, ch:int) -> list:
+		'''Gets the PID coefficients of a specific channel
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		Returns
+		-------
+		coefficients: list[float]
+			values in the order: [Proportional, Integral, Derivative]
+		'''
+		return await self._getter("4," + str(ch), out='param')
+	
+	
+	async def set_pid(self, ch:int, kp:float, ki:float, kd:float) -> None:
+		'''Sets the PID coefficients of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		kp : float
+			Proportional coefficient
+		
+		ki : float
+			Integral coefficient
+		
+		kd : float
+			Derivative coefficient
+		'''
+		kp = round_input(kp)
+		ki = round_input(ki)
+		kd = round_input(kd)
+		
+		cmd = "5," + str(ch) + "," + str(kp) + "," + str(ki) + "," + str(kd)
+		await self._setter(cmd)
+		self._set_pid_json(ch, kp, ki, kd)
+		
+			# input limits
+	async def get_in_limit(self, ch:int) -> list:
+		"""Gets the target temperature limits (in Celsius) for the PID controller 
+		of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		Returns
+		-------
+		limits: list[float]
+			values in the order: [input_max, input_min]
+		"""
+		return await self._getter("6," + str(ch), out='param')
+	
+	
+	async def set_in_limit(self, ch:int, imax:float, imin:float) -> None:
+		'''Sets the target temperature limits (in Celsius) for the PID controller \
+		of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		imax : float
+			Maximum allowable target temperature (in Celsius)
+		
+		imin : float
+			Minimum allowable target temperature (in Celsius)
+		'''
+		imax = round_input(imax)
+		imin = round_input(imin)
+		
+		cmd = "7," + str(ch) + "," + str(imax) + "," + str(imin)
+		await self._setter(cmd)
+		self._set_in_limit_json(ch, imax, imin)
+		
+		# Filters
+			# alpha-beta
+	async def get_ab_filter(self, ch:int) -> list:
+		'''Gets the coefficients of the alpha-beta filter assigned to the PID controller
+		of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		Returns
+		-------
+		coefficients: list[float]
+			 values in the order: [alpha, beta]
+		'''
+		return await self._getter("8," + str(ch), out='param')
+	
+	
+	async def set_ab_filter(self, ch:int, alpha:float, beta:float) -> None:
+		'''Sets the coefficients of the alpha-beta filter assigned to the PID controller \
+		of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		alpha: float
+			Alpha coefficient (signal smoothing): 0 < alpha < 1
+		
+		beta : float
+			Beta coefficient (derivative smoothing): 0 < beta < 1
+		'''
+		alpha = round_input(alpha)
+		beta = round_input(beta)
+		
+		cmd = "9," + str(ch) + "," + str(alpha) + "," + str(beta)
+		await self._setter(cmd)
+		self._set_ab_filter_json(ch, alpha, beta)
+		
+			# kalman
+	async def get_k_filter(self, ch:int) -> list:
+		'''Gets the coefficients of the kalman filter assigned to the temperature \
+		measurements of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		Returns
+		-------
+		Coefficients: list[float]
+			values in the order: [error, noise]
+		'''
+		return await self._getter("10," + str(ch), out='param')
+	
+	
+	async def set_k_filter(self, ch:int, error:float, noise:float) -> None:
+		'''Sets the coefficients of the kalman filter assigned to the temperature \
+		measurements of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		error : float
+			Standard deviation of the measurement. Must be positive.
+		
+		noise : float
+			Process noise parameter. A smaller value smooths the data at the cost of lag: \
+			0 < noise < 1
+		'''
+		error = round_input(error)
+		noise = round_input(noise)
+		
+		cmd = "11," + str(ch) + "," + str(error) + "," + str(noise)
+		await self._setter(cmd)
+		self._set_k_filter_json(ch, error, noise)
+	
+	
+	async def set_k_filter_state(self, ch:int, value:float) -> None:
+		'''Sets state of the kalman filter assigned to specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		value : float
+			Value of the filter (in Celsius)
+		'''
+		value = round_input(value)
+		
+		cmd = "12," + str(ch) + "," + str(value)
+		await self._setter(cmd)
+		
+		# Sensors
+	async def get_sensor_type(self) -> list: 	# NOTE: returns characters
+		'''Retrieves the sensor type (N, K, J, etc) that was assigned \
+		to each port of the CN0391 
+		
+		Returns
+		-------
+		types: list[str]
+			Sensor type of each port: [port1, port2, port3, port4]
+		'''
+		data = await self._getter("13", out='str_arr')
+		return data[1:]
+		
+		#Enable / Disable controllers
+	async def set_enable(self, ch:int) -> None:
+		'''Enables the PID controller of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		'''
+		await self._setter("14," + str(ch))
+		self._set_enable_json(ch)
+	
+	
+	async def set_enable_all(self) -> None:
+		''' Enables the PID controller of every channel
+		'''
+		await self._setter("14,4")
+		self._set_enable_all_json()
+	
+	
+	async def set_disable(self, ch:int) -> None:
+		'''Disables the PID controller of a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		'''
+		await self._setter("15," + str(ch))
+		self._set_disable_json(ch)
+	
+	
+	async def set_disable_all(self) -> None:
+		''' Disables the PID controller of every channel
+		'''
+		await self._setter("15,4")
+		self._set_disable_all_json()
+	
+	
+	async def get_enable(self) -> list:
+		'''Retrieves which ports have a PID controller actively monitoring their temperature.
+		A port can be active (True) or disabled (False)
+		
+		Returns
+		-------
+		state: list[bool]
+			condition of each port: [port1, port2, port3, port4]
+		'''
+		data = await self._getter("16", out='param')
+		#[FORLOOP]
+		return [elem == True for elem in data]
+		
+		# timers
+	async def get_timer(self) -> list:
+		'''Retrieves the time (in seconds) each port has been actively controlling its temperature.
+		
+		Returns
+		-------
+		times: list[float]
+			Time each port has been active: [port1, port2, port3, port4]
+		'''
+		return await self._getter("17", out='param')
+	
+	
+	async def get_timeout(self) -> list:
+		'''Retrieves the time (in seconds) each port is allowed to control its temperature.
+		
+		Returns
+		-------
+		timeouts: list[float]
+			Time each port can be active: [port1, port2, port3, port4]
+		'''
+		return await self._getter("18", out='param')
+	
+	
+	async def set_timeout(self, ch:int, time:float) -> None:
+		'''Sets the time a PID controller will be enabled for a specific channel
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		time : float
+			Time (in seconds) the controller will be active
+		'''
+		time = round_input(time)
+		
+		cmd = "19," + str(ch) + "," + str(time)
+		await self._setter(cmd)
+		self._set_timeout_json(ch, time)
+	
+	
+	async def set_timeout_inf(self, ch:int) -> None:
+		'''Allow the PID controller at a specific port to run forever
+		
+		Parameters
+		----------
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		'''
+		await self._setter("19," + str(ch) + ",-1")	# value for infinite time. See `Commands.h`
+		self._set_timeout_inf_json(ch)
+	
+	# ================ JSON coefficients ================
+	
+	async def _set_json_coefficients(self) -> None:
+		'''Load the coefficients contained in the JSON file. The commands of every channel are
+		pipelined and awaited together.
+		'''
+		tasks = []
+		
+		#[FORLOOP]
+		for channel, param in enumerate( self.json_data["parameters"] ):
+			tasks.append( self.set_pid(channel, param["kp"], param["ki"], param["kd"]) )
+			tasks.append( self.set_ab_filter(channel, param["alpha"], param["beta"]) )
+			tasks.append( self.set_k_filter(channel, param["error"], param["noise"]) )
+			tasks.append( self.set_in_limit(channel, param["imax"], param["imin"]) )
+			tasks.append( self.set_timeout(channel, param["timeout"]) )
+			
+			if param["enable"]:
+				tasks.append( self.set_enable(channel) )
+		
+		await asyncio.gather(*tasks)
+	
+	
+	async def get_device_snapshot(self) -> cntl.DeviceSnapshot:
+		'''Retrieves every parameter loaded on the Arduino in a single batch. 
+		See `TempControllerCN0391.get_device_snapshot()`
+		
+		Returns
+		-------
+		snapshot: DeviceSnapshot
+			Sensor types and the parameters of each port
+		
+		Raises
+		------
+		ValueError
+			If a reply does not have the expected layout
+		'''
+		types, parameters = await asyncio.gather( self.serial.request("13"), \
+		                                          self.serial.request("21") )
+		sensor_types = self.serial._parse_serial_string(types, 'str_arr')[1:]
+		
+		if parameters != 'BAD_COMMAND':
+			return cntl.DeviceSnapshot( sensor_types, self._parse_parameters(parameters) )
+		
+		replies = await asyncio.gather( *[ self.serial.request(cmd) \
+		                                   for cmd in cntl._CHANNEL_GETTERS ] )
+		return cntl.DeviceSnapshot( sensor_types, self._parse_getters(replies) )
+	
+	
+	async def _get_device_coefficients(self) -> None:
+		'''Gets the coefficients currently loaded on the Arduino and saves them to the internal
+		buffer. See `TempControllerCN0391._get_device_coefficients()`
+		'''
+		snapshot = await self.get_device_snapshot()
+		
+		#[FORLOOP]
+		for ch, param in enumerate(snapshot.channels):
+			self.json_data["parameters"][ch].update( param.to_json() )
+
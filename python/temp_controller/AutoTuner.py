@@ -0,0 +1,314 @@
+"""
+Search of the PID coefficients of each channel with the offline simulation of the firmware (see
+`PlantSimulator`). Candidates are drawn at random within log-spaced ranges, simulated in batches
+by a pool of processes, and scored by their integrated error, overshoot and settling time. Each
+round draws new candidates around the best one so far, within narrower ranges. The best set of
+each channel is written into the `parameters` of a JSON configuration:
+
+```bash
+python3 AutoTuner.py --path ../coefficients.json --output ../coefficients-tuned.json \
+                     --target 60 --tau 90 --heat 1.5 --delay 4
+```
+
+The configuration is then loaded with `TempControllerCN0391(path=...)`. The coefficients are only
+as good as the plant model: see `PlantSimulator` for its parameters.
+"""
+
+# Global libraries
+import os
+import json
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# local file
+import PlantSimulator as ps
+
+#--- CONSTANTS ---
+# Ranges of the search: [minimum, maximum]. Searched in log space.
+_RANGES = {'kp': [0.1, 100], 'ki': [0.01, 1], 'kd': [0.1, 500]}
+_FILTER_RANGES = {'alpha': [0.05, 1], 'beta': [0.01, 0.5]}
+
+_WEIGHTS = {'iae': 1, 'overshoot': 1, 'settling': 1} 	# see: score()
+_SAMPLES = 256 		# candidates per channel and round
+_ROUNDS = 3
+_SHRINK = 0.3 		# fraction | Width of the ranges of a round, relative to the previous one
+_BATCH = 64 		# candidates simulated by a process at once
+_DECIMAL_MAX = 2 	# see: TempControllerCN0391.round_input()
+
+#===================================================================================================
+
+def score(result:dict, target:float, initial:float, duration:float, \
+          weights:dict = _WEIGHTS) -> np.ndarray:
+	'''Cost of each simulated parameter set. Lower is better. Each term is relative to the size of
+	the step, or to the duration, so the weights are comparable:
+	
+	`iae / (duration * step) + overshoot / step + settling / duration`
+	
+	Parameters
+	----------
+	result: dict
+		Result of `PlantSimulator.run()`
+	
+	target: float
+		Target temperature
+	
+	initial: float
+		Temperature at the start of the simulation
+	
+	duration: float
+		Simulated time (in seconds)
+	
+	weights: dict
+		Weight of each term: `iae`, `overshoot` and `settling`
+	
+	Returns
+	-------
+	cost: np.ndarray
+		One value per parameter set. Infinite for the sets that diverge.
+	'''
+	step = max( abs(target - initial), 1 )
+	cost = weights['iae'] * result['iae'] / (duration * step) + \
+	       weights['overshoot'] * result['overshoot'] / step + \
+	       weights['settling'] * result['settling'] / duration
+	return np.nan_to_num(cost, nan=np.inf) 		# sets that diverge
+
+
+def _evaluate(parameters:list, plant:dict, target:float, duration:float, seed:int, \
+              weights:dict) -> np.ndarray:
+	'''Private function, executed by the processes of the pool, that simulates a batch of \
+	candidates and returns their cost
+	'''
+	simulator = ps.PlantSimulator(parameters, plant)
+	result = simulator.run(duration, target, record=duration, seed=seed)
+	initial = simulator.plant['ambient']
+	return score(result, target, initial, duration, weights)
+
+
+def _sample(rng:np.random.Generator, ranges:dict, center:dict, width:float, count:int) -> list:
+	'''Private function that draws candidates in log space, within `width` (fraction of each \
+	range) around a center. Coefficients are rounded like the serial commands that set them.
+	'''
+	candidates = [ {} for i in range(count) ]
+	for key, (low, high) in ranges.items():
+		low, high = np.log(low), np.log(high)
+		middle = np.log( min(max(center[key], np.exp(low)), np.exp(high)) )
+		half = 0.5 * width * (high - low)
+		values = np.exp( rng.uniform( max(low, middle - half), min(high, middle + half), count ) )
+		for candidate, value in zip(candidates, values):
+			candidate[key] = round( float(value), _DECIMAL_MAX ) 	# as sent to the Arduino
+	return candidates
+
+#===================================================================================================
+
+class AutoTuner:
+
+	def __init__(self, parameters:list, plants:list, targets:list, duration:float, \
+	             filters:bool = False, weights:dict = _WEIGHTS, workers:int = None, \
+	             seed:int = 0):
+		'''Prepare the search of the coefficients of several channels
+		
+		Parameters
+		----------
+		parameters: list(dict)
+			Current parameters of each channel, in the layout of the JSON configuration. \
+			They are the starting point of the search, and one of its candidates.
+		
+		plants: list(dict)
+			Thermal plant of each channel. See `PlantSimulator`
+		
+		targets: list(float)
+			Target temperature of each channel
+		
+		duration: float
+			Simulated time (in seconds) of each candidate
+		
+		filters: bool
+			Whether the coefficients of the alpha-beta filter are also searched
+		
+		weights: dict
+			See `score()`
+		
+		workers: int
+			Number of processes. Defaults to the number of processors.
+		
+		seed: int
+			Seed of the candidates and of the measurement noise
+		'''
+		self.parameters = [ dict(param) for param in parameters ]
+		self.plants = plants
+		self.targets = targets
+		self.duration = duration
+		self.weights = weights
+		self.workers = workers if workers != None else os.cpu_count()
+		self.seed = seed
+		self.ranges = dict(_RANGES)
+		if filters:
+			self.ranges.update(_FILTER_RANGES)
+		self.costs = {} 				# cost of each tuned channel; (before, after)
+	
+	
+	def tune(self, channels:list = None, samples:int = _SAMPLES, rounds:int = _ROUNDS) -> list:
+		'''Search the best coefficients of each channel
+		
+		Parameters
+		----------
+		channels: list(int)
+			Channels that are tuned. All if none are given.
+		
+		samples: int
+			Number of candidates of each channel per round
+		
+		rounds: int
+			Number of rounds. Each one searches narrower ranges around the best candidate.
+		
+		Returns
+		-------
+		parameters: list(dict)
+			Parameters of every channel, with the best coefficients of the tuned ones. The cost \
+			of each tuned channel before and after is stored in `costs`.
+		
+		Warns
+		-----
+		RuntimeWarning
+			If `alpha` of a channel is 0 and the filters are not tuned. The measurements then \
+			never reach the PID controller, so every candidate has about the same cost. The \
+			filter of that channel is tuned too.
+		'''
+		if channels == None:
+			channels = range( len(self.parameters) )
+		
+		rng = np.random.default_rng(self.seed)
+		best = { ch: dict(self.parameters[ch]) for ch in channels }
+		cost = { ch: np.inf for ch in channels }
+		before = {}
+		width = 1.0
+		ranges = { ch: self.ranges for ch in channels }
+		
+		# alpha of 0 ignores the measurements. See: PlantSimulator.run()
+		for ch in channels:
+			if 'alpha' not in self.ranges and ps._limit( best[ch].get('alpha', 0) ) == 0:
+				ranges[ch] = dict(self.ranges, **_FILTER_RANGES)
+				warnings.warn(f"alpha of channel {ch} is 0, so the PID controller does not " \
+				              "see the measurements. Its filter is also tuned.", RuntimeWarning)
+		
+		with ProcessPoolExecutor(max_workers=self.workers) as pool:
+			for index in range(rounds):
+				# candidates of every channel, in batches
+				tasks = []
+				for ch in channels:
+					candidates = [ dict(best[ch], **values) for values in \
+					               _sample(rng, ranges[ch], best[ch], width, samples) ]
+					if index == 0:
+						candidates.insert(0, dict(best[ch])) 		# current coefficients
+					
+					for start in range(0, len(candidates), _BATCH):
+						batch = candidates[start:start + _BATCH]
+						future = pool.submit(_evaluate, batch, self.plants[ch], self.targets[ch], \
+						                     self.duration, self.seed, self.weights)
+						tasks.append( (ch, batch, future) )
+				
+				# keep the best candidate of each channel
+				for ch, batch, future in tasks:
+					costs = future.result()
+					if ch not in before: 		# the first batch starts with the current coefficients
+						before[ch] = float(costs[0])
+					position = int( np.argmin(costs) )
+					if costs[position] < cost[ch]:
+						cost[ch] = float(costs[position])
+						best[ch] = batch[position]
+				
+				width *= _SHRINK
+		
+		parameters = [ dict(param) for param in self.parameters ]
+		for ch in channels:
+			for key in ranges[ch]:
+				parameters[ch][key] = best[ch][key]
+			self.costs[ch] = (before[ch], cost[ch])
+		return parameters
+
+#===================================================================================================
+
+def list_of_floats(string:str) -> list:
+	'''Parse a comma delimited list of numbers. Ex: `60,45.5`
+	'''
+	return [ float(item) for item in string.split(",") if item.strip() != "" ]
+
+
+def list_of_ints(string:str) -> list:
+	'''Parse a comma delimited list of integers. Ex: `0,2`
+	'''
+	return [ int(item) for item in string.split(",") if item.strip() != "" ]
+
+
+def captureInputs() -> object:
+	'''Captures the command line parameters of the tuner. See `AutoTuner`
+	'''
+	parser = argparse.ArgumentParser()
+	
+	parser.add_argument('--path', type=str, required=True, \
+	                    help="Path to the JSON file with the controller configuration. \
+	                          Ex: '../coefficients.json'")
+	
+	parser.add_argument('--output', type=str, required=True, \
+	                    help="Path to the JSON file where the tuned configuration is saved")
+	
+	parser.add_argument('--target', type=list_of_floats, required=True, \
+	                    help="Target temperature (Celsius). One for every channel, or one per \
+	                          channel. Ex: 60 or 60,45,80,80")
+	
+	parser.add_argument('--channels', type=list_of_ints, default=None, \
+	                    help="Channels that are tuned. All if not provided. Ex: 0,1")
+	
+	parser.add_argument('--duration', type=float, default=900, \
+	                    help="Simulated time of each candidate (Seconds)")
+	
+	parser.add_argument('--tau', type=float, default=ps._PLANT['tau'], \
+	                    help="Time constant of the thermal plant (Seconds)")
+	
+	parser.add_argument('--heat', type=float, default=ps._PLANT['heat'], \
+	                    help="Heating rate of the plant when the output is on (Celsius/Second)")
+	
+	parser.add_argument('--delay', type=float, default=ps._PLANT['delay'], \
+	                    help="Dead time of the plant (Seconds)")
+	
+	parser.add_argument('--ambient', type=float, default=ps._PLANT['ambient'], \
+	                    help="Temperature of the surroundings (Celsius)")
+	
+	parser.add_argument('--filters', action='store_true', \
+	                    help="Also tune the alpha-beta filter of the controllers")
+	
+	parser.add_argument('--samples', type=int, default=_SAMPLES, \
+	                    help="Candidates per channel and round")
+	
+	parser.add_argument('--rounds', type=int, default=_ROUNDS, \
+	                    help="Rounds of the search. Each one narrows the ranges")
+	
+	parser.add_argument('--workers', type=int, default=None, \
+	                    help="Number of processes. Defaults to the number of processors")
+	
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	args = captureInputs()
+	
+	with open(args.path, 'r') as infile:
+		data = json.load(infile)
+	
+	count = len(data["parameters"])
+	targets = args.target * count if len(args.target) == 1 else args.target
+	plant = {'tau': args.tau, 'heat': args.heat, 'delay': args.delay, 'ambient': args.ambient}
+	
+	tuner = AutoTuner(data["parameters"], [plant] * count, targets, args.duration, \
+	                  filters=args.filters, workers=args.workers)
+	data["parameters"] = tuner.tune(args.channels, args.samples, args.rounds)
+	
+	for ch, (before, after) in tuner.costs.items():
+		param = data["parameters"][ch]
+		gains = ", ".join( f"{key} {param[key]:g}" for key in (*_RANGES, *_FILTER_RANGES) )
+		print(f"channel {ch}: cost {before:.3f} -> {after:.3f} | {gains}")
+	
+	with open(args.output, "w") as outfile:
+		outfile.write( json.dumps(data, indent=4) )
@@ -0,0 +1,271 @@
+"""
+Rolling statistics of the measurements of each channel, updated as they arrive. For each time
+window, the monitor keeps:
+
+- __mean__ and __std__: sliding Welford updates. A measurement is added when it arrives and removed
+  when it leaves the window, so the window is never summed again.
+- __min__ and __max__: monotonic queues. The oldest element of each queue is the extreme.
+- __slope__: least squares slope (Celsius per second), from the sliding co-moment of time and value.
+- __at_target__: time (in seconds) each channel spent within `tolerance` of its target.
+
+Each update costs the same whatever the width of the window. Values that are not finite (NaN or
+infinite, such as an open thermocouple) are skipped in the statistics of their channel only.
+Statistics can be read from any thread:
+
+```python
+monitor = ChannelMonitor(channels=4, windows=[60, 600], targets=controller.get_target())
+monitor.update(seconds, controller.get_filter())
+monitor.stats(600)['slope']
+```
+"""
+
+# Global libraries
+import threading
+from collections import deque
+import numpy as np
+
+#--- CONSTANTS ---
+_WINDOWS = (60,) 	# seconds | Default windows of the statistics
+_TOLERANCE = 0.5 	# Celsius | Distance from the target that counts as being at the target
+
+#===================================================================================================
+
+class _Window:
+	'''Private class with the statistics of one time window
+	'''
+	
+	def __init__(self, width:float, channels:int):
+		self.width = width
+		self.samples = deque() 		# (seconds, values, time at target since the previous one)
+		self.minimum = [ deque() for i in range(channels) ] 		# (seconds, value) increasing
+		self.maximum = [ deque() for i in range(channels) ] 		# (seconds, value) decreasing
+		self.clear(channels)
+	
+	
+	def clear(self, channels:int) -> None:
+		'''Reset the sums of an empty window. Each channel has its own sums of time, since 
+		values that are not finite are skipped.
+		'''
+		self.count = 0
+		self.valid = np.zeros(channels, dtype=int) 	# finite values of each channel
+		self.mean_t = np.zeros(channels)
+		self.mean = np.zeros(channels)
+		self.m2_t = np.zeros(channels) 	# sum of squared deviations of time
+		self.m2 = np.zeros(channels) 	# sum of squared deviations of each channel
+		self.co = np.zeros(channels) 	# sum of the products of the deviations of time and value
+		self.at_target = np.zeros(channels)
+	
+	
+	def add(self, seconds:float, values:np.ndarray, at_target:np.ndarray) -> None:
+		'''Add the newest measurement and remove those older than the width
+		'''
+		self.samples.append( (seconds, values, at_target) )
+		self.at_target += at_target
+		
+		self.count += 1
+		valid = np.isfinite(values)
+		values = np.where(valid, values, 0) 		# skipped values do not change the sums
+		self.valid += valid
+		
+		count = np.maximum(self.valid, 1)
+		delta_t = np.where(valid, seconds - self.mean_t, 0)
+		delta = np.where(valid, values - self.mean, 0)
+		self.mean_t += delta_t / count
+		self.mean += delta / count
+		self.m2_t += delta_t * (seconds - self.mean_t)
+		self.m2 += delta * (values - self.mean)
+		self.co += delta_t * (values - self.mean)
+		
+		for i, value in enumerate(values):
+			if not valid[i]:
+				continue
+			minimum, maximum = self.minimum[i], self.maximum[i]
+			while minimum and minimum[-1][1] >= value:
+				minimum.pop()
+			minimum.append( (seconds, value) )
+			while maximum and maximum[-1][1] <= value:
+				maximum.pop()
+			maximum.append( (seconds, value) )
+		
+		# measurements that left the window. The time before the oldest one is outside of it.
+		while self.samples[0][0] < seconds - self.width:
+			self._remove( *self.samples.popleft() )
+			oldest, values, at_target = self.samples[0]
+			self.at_target -= at_target
+			self.samples[0] = (oldest, values, np.zeros_like(at_target))
+	
+	
+	def _remove(self, seconds:float, values:np.ndarray, at_target:np.ndarray) -> None:
+		'''Private function that reverts the addition of the oldest measurement
+		'''
+		self.at_target -= at_target
+		
+		self.count -= 1
+		if self.count == 0:
+			self.clear(len(values))
+			return
+		
+		valid = np.isfinite(values)
+		values = np.where(valid, values, 0)
+		self.valid -= valid
+		
+		count = np.maximum(self.valid, 1)
+		delta_t = np.where(valid, seconds - self.mean_t, 0)
+		delta = np.where(valid, values - self.mean, 0)
+		self.mean_t -= delta_t / count
+		self.mean -= delta / count
+		self.m2_t -= delta_t * (seconds - self.mean_t)
+		self.m2 -= delta * (values - self.mean)
+		self.co -= delta_t * (values - self.mean)
+		
+		# channels without finite values start again from zero
+		empty = self.valid == 0
+		for sums in (self.mean_t, self.mean, self.m2_t, self.m2, self.co):
+			sums[empty] = 0
+		
+		for queue in (*self.minimum, *self.maximum):
+			if queue and queue[0][0] <= seconds:
+				queue.popleft()
+
+#===================================================================================================
+
+class ChannelMonitor:
+
+	def __init__(self, channels:int, windows:list = _WINDOWS, targets:list = None, \
+	             tolerance:float = _TOLERANCE):
+		'''Initialize the statistics without measurements
+		
+		Parameters
+		----------
+		channels: int
+			Number of values of each measurement
+		
+		windows: list(float)
+			Width (in seconds) of each window of the statistics. Ex: `[60, 600]`
+		
+		targets: list(float)
+			Target of each channel. See `set_targets()`
+		
+		tolerance: float
+			Distance (in Celsius) from the target within which a channel is at its target
+		'''
+		self.channels = channels
+		self.tolerance = tolerance
+		self.lock = threading.Lock()
+		self.windows = list(windows)
+		self._windows = { width: _Window(width, channels) for width in windows }
+		self._last = None 				# previous measurement; (seconds, values)
+		self.set_targets(targets)
+	
+	
+	def set_targets(self, targets:list) -> None:
+		'''Change the targets. The time at the target of every window is computed again with the \
+		new targets.
+		
+		Parameters
+		----------
+		targets: list(float)
+			Target of each channel. Channels without a target (None, or missing from the end \
+			of the list) are never at their target.
+		'''
+		targets = [] if targets is None else list(targets)[:self.channels]
+		targets += [None] * (self.channels - len(targets))
+		
+		with self.lock:
+			self.targets = np.array( [ np.nan if value is None else value for value in targets ], \
+			                         dtype=float )
+			
+			for window in self._windows.values():
+				window.at_target[:] = 0
+				previous = None
+				for i, (seconds, values, at_target) in enumerate(window.samples):
+					at_target = np.zeros(self.channels)
+					if previous != None:
+						at_target = self._at_target(*previous) * (seconds - previous[0])
+					window.samples[i] = (seconds, values, at_target)
+					window.at_target += at_target
+					previous = (seconds, values)
+	
+	
+	def _at_target(self, seconds:float, values:np.ndarray) -> np.ndarray:
+		'''Private function that returns 1 for each channel at its target and 0 for the others
+		'''
+		return ( np.abs(values - self.targets) <= self.tolerance ).astype(float)
+	
+	
+	def update(self, seconds:float, values:list) -> None:
+		'''Add a measurement to every window. Has the form of the callback of `Acquisition`.
+		
+		Parameters
+		----------
+		seconds: float
+			Time of the measurement. Must not decrease.
+		
+		values: list(float)
+			Value of each channel. Ex: the reply of `get_filter()`
+		'''
+		values = np.array(values, dtype=float)
+		
+		with self.lock:
+			# the time until this measurement counts for the state of the previous one
+			at_target = np.zeros(self.channels)
+			if self._last != None:
+				at_target = self._at_target(*self._last) * (seconds - self._last[0])
+			self._last = (seconds, values)
+			
+			for window in self._windows.values():
+				window.add(seconds, values, at_target)
+	
+	
+	def stats(self, window:float = None) -> dict:
+		'''Statistics of the measurements in a window
+		
+		Parameters
+		----------
+		window: float
+			Width of the window. Must be one of those of the constructor. Defaults to the first.
+		
+		Returns
+		-------
+		stats: dict
+			Dictionary with the fields `window`, `count`, and one list with a value per channel \
+			for `mean`, `std`, `min`, `max`, `slope` (Celsius per second) and `at_target` \
+			(seconds). Values are NaN until a channel has enough finite measurements.
+		'''
+		if window == None:
+			window = self.windows[0]
+		
+		with self.lock:
+			data = self._windows[window]
+			valid = data.valid
+			
+			with np.errstate(divide='ignore', invalid='ignore'):
+				std = np.sqrt( np.maximum(data.m2, 0) / (valid - 1) )
+				slope = data.co / data.m2_t
+			
+			stats = {'window': window, 'count': data.count}
+			stats['mean'] = np.where(valid > 0, data.mean, np.nan).tolist()
+			stats['std'] = np.where(valid > 1, std, np.nan).tolist()
+			stats['min'] = [ queue[0][1] if queue else np.nan for queue in data.minimum ]
+			stats['max'] = [ queue[0][1] if queue else np.nan for queue in data.maximum ]
+			stats['slope'] = np.where((valid > 1) & (data.m2_t > 0), slope, np.nan).tolist()
+			stats['at_target'] = data.at_target.tolist()
+		
+		return stats
+	
+	
+	def report(self, window:float = None) -> str:
+		'''Table of the statistics of a window, with a row per channel. See `stats()`
+		
+		Returns
+		-------
+		table: str
+		'''
+		stats = self.stats(window)
+		lines = [ f"==== last {stats['window']:g} s | {stats['count']} samples ====",
+		          "ch     mean    std     min     max   C/min  at target (s)" ]
+		for i in range(self.channels):
+			lines.append( f"{i:<2} {stats['mean'][i]:8.2f} {stats['std'][i]:6.2f} " \
+			              f"{stats['min'][i]:7.2f} {stats['max'][i]:7.2f} " \
+			              f"{stats['slope'][i] * 60:7.2f} {stats['at_target'][i]:10.1f}" )
+		return "\n".join(lines)
@@ -0,0 +1,215 @@
+"""
+This module manages several temperature controllers, one per Arduino and CN0391 shield. Every
+board is configured and polled in parallel by a pool of threads, so the time of a poll is set by
+the slowest board rather than by the sum of all of them.
+
+```python
+with ControllerFleet(ports=["/dev/ttyACM0", "/dev/ttyACM1"]) as fleet:
+	snapshot = fleet.poll(raw=True)
+	print( snapshot["filter"] )
+```
+"""
+
+# Global libraries
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# local file
+from comms import ArduinoSerial
+import TempControllerCN0391 as cntl
+
+#===================================================================================================
+
+class ControllerFleet:
+
+	def __init__(self, ports:list = None, paths:list = None, baud_rate:int = cntl._DEFAULT_BAUD,
+	             sensor_types:list = None, deadline:float = ArduinoSerial._DEADLINE ):
+		'''Connect to every controller in parallel. Each board is configured as it would be by
+		`TempControllerCN0391`.
+		
+		Parameters
+		----------
+		ports: list(str)
+			Serial ports of the Arduinos. Required if `paths` is not provided.
+		
+		paths: list(str)
+			Paths to the JSON configuration file of each controller. Overrides `ports`.
+		
+		baud_rate: int
+			Baud rate of every Arduino. Only used with `ports`.
+		
+		sensor_types: list(str)
+			Sensor types of the CN0391 shields. Only used with `ports`. See `TempControllerCN0391`
+		
+		deadline: float
+			Time (in seconds) each command waits for the reply of an Arduino
+		'''
+		if paths != None:
+			configs = [ dict(path=path, deadline=deadline) for path in paths ]
+		elif ports != None:
+			configs = [ dict(port=port, baud_rate=baud_rate, sensor_types=sensor_types, \
+			                 deadline=deadline) for port in ports ]
+		else:
+			raise ValueError("Did not specify the Serial Ports or JSON files!")
+		
+		if len(configs) == 0:
+			raise ValueError("The fleet needs at least one controller")
+		
+		# one worker per board, reused by every poll
+		self._pool = ThreadPoolExecutor( max_workers=len(configs), \
+		                                 thread_name_prefix='controller-fleet' )
+		
+		connections = [ self._pool.submit(cntl.TempControllerCN0391, **config) \
+		                for config in configs ]
+		self.controllers = []
+		errors = []
+		
+		for connection in connections:
+			try:
+				self.controllers.append( connection.result() )
+			except Exception as error:
+				errors.append(error)
+		
+		if errors:		# close the boards that did connect
+			self.close()
+			raise errors[0]
+	
+	
+	def __len__(self) -> int:
+		return len(self.controllers)
+	
+	
+	def __getitem__(self, index:int) -> cntl.TempControllerCN0391:
+		return self.controllers[index]
+	
+	
+	def __iter__(self):
+		return iter(self.controllers)
+	
+	
+	def __enter__(self):
+		return self
+	
+	
+	def __exit__(self, *args) -> None:
+		self.close()
+	
+	
+	def close(self) -> None:
+		''' Close the serial connection of every controller and stop the threads of the fleet.
+		'''
+		for controller in self.controllers:
+			controller.close()
+		self._pool.shutdown()
+	
+	
+	def is_active(self) -> bool:
+		'''Returns whether every serial connection is active
+		
+		Returns
+		-------
+		is_active: bool
+		'''
+		return all( controller.is_active() for controller in self.controllers )
+	
+	
+	def map(self, func:str, *args) -> list:
+		'''Call the same method of every controller in parallel. For example:
+		
+		```python
+		fleet.map("set_target_all", 40, 40, 40, 40)
+		```
+		
+		Parameters
+		----------
+		func: str
+			Name of a method of `TempControllerCN0391`
+		
+		args:
+			Arguments of the method
+		
+		Returns
+		-------
+		output: list
+			Return value of the method for each controller
+		'''
+		jobs = [ self._pool.submit( getattr(controller, func), *args ) \
+		         for controller in self.controllers ]
+		return [ job.result() for job in jobs ]
+	
+	
+	def _poll_board(self, controller:cntl.TempControllerCN0391, barrier:threading.Barrier,
+	                raw:bool) -> dict:
+		'''Private function executed by a worker. Waits until every worker is ready so that the
+		commands of all boards are written at the same time.
+		'''
+		reading = {"port": controller.json_data["serial_port"], "filter": None, "raw": None, \
+		           "time": None, "error": None}
+		try:
+			barrier.wait()
+			time_send = time.monotonic()
+			
+			# pipeline both measurements on the same board
+			replies = [ controller.serial.submit("0") ]
+			if raw:
+				replies.append( controller.serial.submit("1") )
+			
+			data = [ controller.serial._parse_serial_string(reply.result(), 'param') \
+			         for reply in replies ]
+			time_reply = time.monotonic()
+			
+			reading["filter"] = data[0]
+			if raw:
+				reading["raw"] = data[1]
+			reading["time"] = 0.5*(time_send + time_reply)	# midpoint of the round trip
+		
+		except Exception as error:
+			barrier.abort()		# do not leave other workers waiting
+			reading["error"] = error
+		
+		return reading
+	
+	
+	def poll(self, raw:bool = False) -> dict:
+		'''Retrieve the filtered (and optionally raw) temperatures of every board at the same time.
+		
+		Parameters
+		----------
+		raw: bool
+			Whether the raw measurements are retrieved as well. Both commands are pipelined, so
+			the cost is a few more bytes rather than another round trip.
+		
+		Returns
+		-------
+		snapshot: dict
+			Dictionary with the fields:
+			
+			- `time`: Wall clock time (in seconds since the epoch) of the snapshot
+			- `filter`: List with the filtered temperatures of each board
+			- `raw`: List with the raw temperatures of each board, or `None`
+			- `offset`: Time (in seconds) between `time` and the midpoint of the round trip \
+			  of each board
+			- `spread`: Difference (in seconds) between the earliest and latest reading
+			- `boards`: List with the full reading of each board, including any error
+		'''
+		barrier = threading.Barrier( len(self.controllers) )
+		time_wall = time.time()
+		time_zero = time.monotonic()
+		
+		jobs = [ self._pool.submit(self._poll_board, controller, barrier, raw) \
+		         for controller in self.controllers ]
+		boards = [ job.result() for job in jobs ]
+		
+		# align every reading to the same time reference
+		offset = [ None if board["time"] == None else board["time"] - time_zero \
+		           for board in boards ]
+		valid = [ value for value in offset if value != None ]
+		
+		return {"time":   time_wall,
+		        "filter": [ board["filter"] for board in boards ],
+		        "raw":    [ board["raw"] for board in boards ] if raw else None,
+		        "offset": offset,
+		        "spread": max(valid) - min(valid) if valid else None,
+		        "boards": boards }
+
@@ -0,0 +1,147 @@
+"""
+Reduction of a series to about one point per pixel before it is drawn. Two methods exist:
+
+- __Min-max__ (`minmax()`): splits the series into buckets and keeps the smallest and largest
+  value of each one, in time order. Every spike is preserved, and the cost is a few vectorized
+  passes over the data.
+- __LTTB__ (`lttb()`): Largest-Triangle-Three-Buckets keeps, in each bucket, the point that forms
+  the largest triangle with the point kept in the previous bucket and the average of the next one.
+  The shape of the curve is preserved with fewer points, but the buckets are visited in order.
+
+The first and last points are always kept. A series that is already small is returned unchanged:
+
+```python
+x, y = decimate(buffer_x.view(), buffer_y.view()[0], points=800)
+line.set_data(x, y)
+```
+"""
+
+# Global libraries
+import numpy as np
+
+#--- CONSTANTS ---
+METHODS = ("minmax", "lttb")
+
+#===================================================================================================
+
+def minmax(x:np.ndarray, y:np.ndarray, points:int) -> tuple:
+	'''Keep the smallest and the largest value of each bucket
+	
+	Parameters
+	----------
+	x: np.ndarray
+		Increasing times, with the shape `(count,)`
+	
+	y: np.ndarray
+		Values, with the shape `(count,)`
+	
+	points: int
+		Maximum number of points returned. Ex: width of the plot in pixels
+	
+	Returns
+	-------
+	x: np.ndarray
+	
+	y: np.ndarray
+	'''
+	count = len(y)
+	buckets = (points - 2) // 2
+	if count <= points or buckets < 1:
+		return x, y
+	
+	# buckets between the first and the last point. Their sizes differ by at most one sample, so
+	# every sample belongs to a bucket. Shorter buckets are padded with their own last sample.
+	edges = np.linspace(1, count - 1, buckets + 1).astype(np.intp)
+	width = np.max(np.diff(edges))
+	gather = np.minimum( edges[:-1, None] + np.arange(width), edges[1:, None] - 1 )
+	blocks = y[gather]
+	
+	rows = np.arange(buckets)
+	index_min = gather[rows, np.argmin(blocks, axis=1)]
+	index_max = gather[rows, np.argmax(blocks, axis=1)]
+	
+	index = np.empty(2 * buckets + 2, dtype=np.intp)
+	index[0] = 0
+	index[1:-1:2] = np.minimum(index_min, index_max)
+	index[2:-1:2] = np.maximum(index_min, index_max)
+	index[-1] = count - 1
+	return x[index], y[index]
+
+
+def lttb(x:np.ndarray, y:np.ndarray, points:int) -> tuple:
+	'''Keep the point of each bucket that forms the largest triangle with its neighbors. \
+	See the module description.
+	
+	Parameters
+	----------
+	See `minmax()`
+	
+	Returns
+	-------
+	x: np.ndarray
+	
+	y: np.ndarray
+	'''
+	count = len(y)
+	buckets = points - 2
+	if count <= points or buckets < 1:
+		return x, y
+	
+	# edges of the buckets between the first and the last point
+	edges = np.linspace(1, count - 1, buckets + 1).astype(np.intp)
+	
+	# average of each bucket, and the last point after the last bucket
+	sum_x = np.add.reduceat(x[1:count - 1], edges[:-1] - 1)
+	sum_y = np.add.reduceat(y[1:count - 1], edges[:-1] - 1)
+	sizes = np.diff(edges)
+	mean_x = np.append(sum_x / sizes, x[-1])
+	mean_y = np.append(sum_y / sizes, y[-1])
+	
+	index = np.empty(points, dtype=np.intp)
+	index[0] = 0
+	index[-1] = count - 1
+	
+	# twice the area of the triangle (a, b, c) for each candidate b:
+	# |(x_a - x_c)(y_b - y_a) - (x_a - x_b)(y_c - y_a)|
+	last = 0
+	for i in range(buckets):
+		low, high = edges[i], edges[i + 1]
+		x_a, y_a = x[last], y[last]
+		x_c, y_c = mean_x[i + 1], mean_y[i + 1]
+		area = np.abs( (x_a - x_c) * (y[low:high] - y_a) - (x_a - x[low:high]) * (y_c - y_a) )
+		last = low + np.argmax(area)
+		index[i + 1] = last
+	
+	return x[index], y[index]
+
+
+def decimate(x:np.ndarray, y:np.ndarray, points:int, method:str = "minmax") -> tuple:
+	'''Reduce a series to at most `points` points
+	
+	Parameters
+	----------
+	x: np.ndarray
+		Increasing times, with the shape `(count,)`
+	
+	y: np.ndarray
+		Values, with the shape `(count,)`
+	
+	points: int
+		Maximum number of points returned
+	
+	method: str
+		"minmax" or "lttb". The series is returned unchanged if none is given.
+	
+	Returns
+	-------
+	x: np.ndarray
+	
+	y: np.ndarray
+	'''
+	if method == "minmax":
+		return minmax(x, y, points)
+	if method == "lttb":
+		return lttb(x, y, points)
+	if method == None:
+		return x, y
+	raise ValueError(f"unknown decimation method '{method}'. Use one of {METHODS}")
@@ -0,0 +1,253 @@
+"""
+Live plot of the measurements of a controller. Acquisition and rendering are separate:
+
+- `Acquisition` is a thread that reads measurements as fast as they arrive, timestamps them with a
+  monotonic clock and keeps the newest ones in ring buffers.
+- `LivePlotter` redraws the figure at a fixed frame rate in the main thread, and always shows the
+  newest measurements. Only the lines are drawn on each frame (blitting). The axes are drawn again
+  when the time window scrolls, which happens in steps, or when the figure changes.
+
+A slow or busy window therefore delays the frames, but not the measurements. Long windows are
+reduced to about one point per pixel before they are drawn (see `Decimate`), so the cost of a frame
+does not grow with the width of the window.
+
+```python
+acquisition = Acquisition(controller.get_filter, window=120, rate=1, channels=4)
+plotter = LivePlotter(acquisition, window=120, ylims=[20, 80])
+while acquisition.is_alive():
+	plotter.render()
+	time.sleep(plotter.period)
+```
+"""
+
+# Global libraries
+import time
+import threading
+from typing import Callable
+import matplotlib.pyplot as plt
+
+# local files
+import RingBuffer as rb
+import Decimate as dc
+
+#--- CONSTANTS ---
+_FPS = 20 		# frames per second | Rate at which the plot is drawn
+_SCROLL = 0.25 	# fraction | Step of the time window when the newest measurement leaves the plot
+_JOIN = 5 		# seconds | Time `stop()` waits for a pending measurement
+
+#===================================================================================================
+
+class Acquisition(threading.Thread):
+
+	def __init__(self, read:Callable, window:float, rate:float, channels:int, \
+	             function:Callable = None, initial:list = None, name:str = 'acquisition-thread'):
+		'''Initialize and start the thread that reads measurements
+		
+		Parameters
+		----------
+		read: func
+			Blocking function that returns the newest measurement of each channel. \
+			Ex: `controller.get_filter`
+		
+		window: float
+			Time (in seconds) the measurements are kept
+		
+		rate: float
+			Expected number of measurements per second. Sizes the buffers, which grow if more \
+			measurements arrive.
+		
+		channels: int
+			Number of values of each measurement
+		
+		function: func
+			Callback that is executed by the thread after each measurement. Must have the form \
+			`def function(seconds, values)`. Ex: write the measurement to a file.
+		
+		initial: list(float)
+			Optional measurement stored at time zero, before the thread starts
+		
+		name: str
+			label for the thread
+		'''
+		super(Acquisition, self).__init__(name=name, daemon=True)
+		self._read = read
+		self._function = function
+		self.window = window
+		self.error = None 				# exception that stopped the thread
+		
+		# measurements | shared with the renderer
+		capacity = int(window * rate) + 1
+		self.lock = threading.Lock()
+		self.x = rb.RingBuffer(capacity)
+		self.y = rb.RingBuffer(capacity, channels=channels)
+		self.version = 0 				# number of measurements received
+		
+		# closing thread
+		self._stop_event = threading.Event()
+		self.time_init = time.monotonic()
+		
+		if initial != None:
+			self.add(initial, 0)
+		
+		# Initialize thread
+		self.start()
+	
+	
+	def run(self) -> None:
+		'''Loop executed by the thread. Reads measurements until `stop()` is called or a
+		measurement fails.
+		'''
+		while not self._stop_event.is_set():
+			try:
+				values = self._read()
+			except Exception as error:
+				self.error = error
+				break
+			
+			if values != None:
+				self.add(values)
+	
+	
+	def add(self, values:list, seconds:float = None) -> None:
+		'''Store a measurement and discard those older than the window
+		
+		Parameters
+		----------
+		values: list(float)
+			Value of each channel
+		
+		seconds: float
+			Time of the measurement since the thread started. Defaults to the current time.
+		'''
+		if seconds == None:
+			seconds = time.monotonic() - self.time_init
+		
+		with self.lock:
+			self.x.append(seconds)
+			self.y.append(values)
+			
+			while self.x.first() < seconds - self.window:
+				self.x.popleft()
+				self.y.popleft()
+			self.version += 1
+		
+		if self._function != None:
+			self._function(seconds, values)
+	
+	
+	def stop(self) -> None:
+		'''Stop reading measurements. Waits for the pending measurement.
+		'''
+		self._stop_event.set()
+		if self.is_alive() and threading.current_thread() != self:
+			self.join(_JOIN)
+
+#---------------------------------------------------------------------------------------------------
+
+class LivePlotter:
+
+	def __init__(self, acquisition:Acquisition, window:float, ylims:list, fps:float = _FPS, \
+	             decimation:str = "minmax"):
+		'''Create the figure of the measurements
+		
+		Parameters
+		----------
+		acquisition: Acquisition
+			Thread that provides the measurements
+		
+		window: float
+			Width (in seconds) of the time axis
+		
+		ylims: list(float)
+			Range of visible temperatures; [minimum, maximum]
+		
+		fps: float
+			Number of frames drawn per second. See `render()`
+		
+		decimation: str
+			Method that reduces each line to about one point per pixel: "minmax" or "lttb". \
+			Every measurement is drawn if none is given. See `Decimate`
+		'''
+		self.acquisition = acquisition
+		self.window = window
+		self.period = 1 / fps
+		self.decimation = decimation
+		self._version = -1 				# measurements shown by the last frame
+		self._background = None
+		
+		# plot graphs
+		channels = acquisition.y.channels
+		self.figure, self.ax = plt.subplots()
+		self.lines = [ self.ax.plot([], [], label=f'Channel {i}', animated=True)[0] \
+		               for i in range(channels) ]
+		
+		#---- configure plot ----
+		self.ax.legend()
+		self.ax.set_xlim( [0, window] )
+		self.ax.set_ylim( ylims )
+		self.ax.set_xlabel("Seconds")
+		self.ax.set_ylabel("Celsius")
+		
+		# the background is captured after every full draw. Ex: resize
+		self.canvas = self.figure.canvas
+		self.canvas.mpl_connect('draw_event', self._on_draw)
+		self._update_points()
+		
+		plt.ion()
+		plt.show()
+	
+	
+	def _on_draw(self, event:object) -> None:
+		'''Private function that captures the figure without the lines after a full draw
+		'''
+		if self.canvas.supports_blit:
+			self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+		self._update_points()
+		self._draw_lines()
+	
+	
+	def _update_points(self) -> None:
+		'''Private function that sets the number of points of each line to the width of the axes
+		in pixels
+		'''
+		self.points = max( 1, int(self.ax.bbox.width) )
+	
+	
+	def _draw_lines(self) -> None:
+		'''Private function that draws the lines over the figure
+		'''
+		for line in self.lines:
+			self.ax.draw_artist(line)
+	
+	
+	def render(self) -> None:
+		'''Draw a frame with the newest measurements, if any arrived since the last frame, and
+		process the events of the window. Call it once per `period`.
+		'''
+		acquisition = self.acquisition
+		
+		if acquisition.version != self._version:
+			with acquisition.lock:				# lines copy the measurements
+				self._version = acquisition.version
+				xdata = acquisition.x.view()
+				ydata = acquisition.y.view()
+				for i, line in enumerate(self.lines):
+					line.set_data( *dc.decimate(xdata, ydata[i], self.points, self.decimation) )
+				time_last = acquisition.x.last() if len(acquisition.x) > 0 else 0
+			
+			# scroll the time window in steps, which requires drawing the axes
+			if time_last > self.ax.get_xlim()[1]:
+				time_end = time_last + _SCROLL * self.window
+				self.ax.set_xlim( [time_end - self.window, time_end] )
+				self.canvas.draw()
+			
+			elif self._background == None:
+				self.canvas.draw()
+			
+			# draw only the lines
+			else:
+				self.canvas.restore_region(self._background)
+				self._draw_lines()
+				self.canvas.blit(self.figure.bbox)
+		
+		self.canvas.flush_events()
@@ -0,0 +1,275 @@
+"""
+Time-range queries over a measurement file of `__main__.py`, text or binary (see `MeasureLog`),
+without reading the whole file. The index is sparse: the file is split into blocks of `block`
+bytes, and only the offset and time of the first measurement of each block are kept. Building it
+reads one line or record per block, so a file of several GB is indexed in a fraction of a second
+and the index takes a few KB.
+
+A query seeks to the block that holds its start time and reads only the blocks up to its end time:
+
+```python
+with MeasureIndex("./temp-measure.txt") as index:
+	seconds, values = index.query(3600, 7200, channels=[0, 2])
+	
+	for seconds, values in index.iterate(chunk=2**20): 	# bounded memory
+		print( values.max(axis=0) )
+```
+
+The measurements must be in time order, which is how both formats are written. Compressed segments
+of a `RotatingLog` are not indexed; use `MeasureLog.read_series()`.
+"""
+
+# Global libraries
+import io
+import os
+import numpy as np
+
+# local file
+import MeasureLog as ml
+
+#--- CONSTANTS ---
+_BLOCK = 2**16 		# bytes | Distance between the entries of the index
+_CHUNK = 2**22 		# bytes | Data read at once by `iterate()`
+_TEXT_HEADER = 2 	# lines | see: MeasureLog.TextLog
+
+#===================================================================================================
+
+class MeasureIndex:
+
+	def __init__(self, path:str, block:int = _BLOCK):
+		'''Open a measurement file and index it
+		
+		Parameters
+		----------
+		path: str
+			Path to the file. Its format is detected from the header.
+		
+		block: int
+			Distance (in bytes) between the entries of the index. Smaller blocks make queries read \
+			less data, but the index larger.
+		'''
+		self.path = path
+		self.block = block
+		self.file = open(path, 'rb')
+		try:
+			self.header = ml.read_header(path)
+			self.binary = True
+		except ValueError:
+			self.binary = False
+		
+		# start of the measurements and size of a record
+		if self.binary:
+			self.channels = self.header['channels']
+			self._dtype = ml.record_dtype(self.channels)
+			self._record = self._dtype.itemsize
+			self.start = ml.HEADER_SIZE
+		else:
+			lines = [ self.file.readline() for i in range(_TEXT_HEADER) ]
+			self.header = {'columns': [ name.strip() for name in lines[-1].decode().split(",") ]}
+			self.channels = len(self.header['columns']) - 1
+			self._record = 1
+			self.start = self.file.tell()
+		
+		# sparse index
+		self.times = np.zeros(0)
+		self.offsets = np.zeros(0, dtype=np.int64)
+		self.end = self.start 			# end of the indexed measurements
+		self.update()
+	
+	
+	def __enter__(self):
+		return self
+	
+	
+	def __exit__(self, *args) -> None:
+		self.close()
+	
+	
+	def __len__(self) -> int:
+		'''Number of entries of the index
+		'''
+		return len(self.offsets)
+	
+	
+	def update(self) -> None:
+		'''Index the measurements added to the file since the last update. Ex: a file that is \
+		still being recorded
+		'''
+		size = os.path.getsize(self.path)
+		size -= (size - self.start) % self._record 		# incomplete record
+		
+		times, offsets = [], []
+		position = self.end if len(self) == 0 else self.offsets[-1] + self.block
+		
+		while position < size:
+			offset, seconds = self._entry(position, size)
+			if offset == None:
+				break
+			if len(offsets) == 0 or offset > offsets[-1]:
+				times.append(seconds)
+				offsets.append(offset)
+			position = offset + self.block
+		
+		self.times = np.append(self.times, times)
+		self.offsets = np.append(self.offsets, np.array(offsets, dtype=np.int64))
+		self.end = self._complete(size)
+	
+	
+	def _entry(self, position:int, size:int) -> tuple:
+		'''Private function that finds the first measurement at or after a position
+		
+		Returns
+		-------
+		offset: int
+			Position of the measurement. None if there is none.
+		
+		seconds: float
+			Time of the measurement
+		'''
+		if self.binary:
+			offset = position + (self.start - position) % self._record
+			if offset >= size:
+				return None, None
+			self.file.seek(offset)
+			seconds, = np.frombuffer( self.file.read(8), dtype='<f8' )
+			return offset, float(seconds)
+		
+		self.file.seek(position - 1)
+		if self.file.read(1) != b'\n': 			# inside a line
+			self.file.readline()
+		offset = self.file.tell()
+		line = self.file.readline()
+		if not line.endswith(b'\n'):
+			return None, None
+		return offset, float( line.split(b',', 1)[0] )
+	
+	
+	def _complete(self, size:int) -> int:
+		'''Private function that returns the end of the last complete measurement
+		'''
+		if self.binary or size == self.start:
+			return size
+		
+		position = size
+		while position > self.start:
+			self.file.seek( max(self.start, position - self.block) )
+			data = self.file.read(position - self.file.tell())
+			end = data.rfind(b'\n')
+			if end >= 0:
+				return position - len(data) + end + 1
+			position -= len(data)
+		return self.start
+	
+	
+	def _bounds(self, t0:float, t1:float) -> tuple:
+		'''Private function that returns the range of bytes that holds the measurements between \
+		two times
+		'''
+		if len(self) == 0:
+			return self.start, self.start
+		
+		first = 0 if t0 == None else max( 0, np.searchsorted(self.times, t0, 'right') - 1 )
+		last = len(self) if t1 == None else np.searchsorted(self.times, t1, 'right')
+		start = int(self.offsets[first])
+		end = int(self.offsets[last]) if last < len(self) else self.end
+		return start, end
+	
+	
+	def _parse(self, data:bytes, t0:float, t1:float, channels:list) -> tuple:
+		'''Private function that converts complete measurements into arrays and keeps those \
+		between two times
+		'''
+		if self.binary:
+			records = np.frombuffer(data, dtype=self._dtype)
+			seconds = records['time']
+			values = records['temp'] / self.header['scale']
+		elif len(data) > 0:
+			table = np.loadtxt(io.BytesIO(data), delimiter=',', ndmin=2)
+			seconds = table[:, 0]
+			values = table[:, 1:]
+		else:
+			seconds = np.zeros(0)
+			values = np.zeros( (0, self.channels) )
+		
+		if t0 != None or t1 != None:
+			low = 0 if t0 == None else np.searchsorted(seconds, t0, 'left')
+			high = len(seconds) if t1 == None else np.searchsorted(seconds, t1, 'right')
+			seconds = seconds[low:high]
+			values = values[low:high]
+		
+		if channels != None:
+			values = values[:, channels]
+		return seconds, values
+	
+	
+	def query(self, t0:float = None, t1:float = None, channels:list = None) -> tuple:
+		'''Read the measurements between two times
+		
+		Parameters
+		----------
+		t0: float
+			Earliest time (in seconds, as stored in the file). From the first measurement if \
+			none is given.
+		
+		t1: float
+			Latest time, included. Up to the last indexed measurement if none is given.
+		
+		channels: list(int)
+			Channels that are returned. All if none are given. Ex: `[0, 2]`
+		
+		Returns
+		-------
+		seconds: np.ndarray
+			Time of each measurement, with the shape `(count,)`
+		
+		values: np.ndarray
+			Temperatures, with the shape `(count, channels)`
+		'''
+		start, end = self._bounds(t0, t1)
+		self.file.seek(start)
+		return self._parse(self.file.read(end - start), t0, t1, channels)
+	
+	
+	def iterate(self, t0:float = None, t1:float = None, channels:list = None, \
+	            chunk:int = _CHUNK) -> object:
+		'''Read the measurements between two times in chunks. Only one chunk is in memory at a time.
+		
+		Parameters
+		----------
+		t0, t1, channels:
+			See `query()`
+		
+		chunk: int
+			Maximum size (in bytes) of the data read at once
+		
+		Yields
+		------
+		seconds: np.ndarray
+		
+		values: np.ndarray
+		'''
+		start, end = self._bounds(t0, t1)
+		position = start
+		
+		while position < end:
+			self.file.seek(position)
+			data = self.file.read( min(chunk, end - position) )
+			
+			# split at the end of the last complete measurement
+			if self.binary:
+				size = len(data) - len(data) % self._record
+			else:
+				size = data.rfind(b'\n') + 1
+			if size == 0:
+				raise ValueError(f"a measurement of '{self.path}' is longer than the chunk")
+			position += size
+			
+			seconds, values = self._parse(data[:size], t0, t1, channels)
+			if len(seconds) > 0:
+				yield seconds, values
+	
+	
+	def close(self) -> None:
+		'''Close the file
+		'''
+		self.file.close()
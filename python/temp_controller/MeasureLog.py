@@ -0,0 +1,581 @@
+"""
+Files that store the measurements of `__main__.py`. Two formats exist:
+
+- __Text__ (`TextLog`): one line of comma delimited values per measurement. Easy to read, but each
+  line costs formatting and about 40 bytes.
+- __Binary__ (`MeasureLog`): a header followed by fixed-width records. Temperatures are stored as
+  integers in centi-degrees (`DECIMAL_MAX` decimals), so each record of four channels takes 24
+  bytes and costs no formatting. Records are written in batches.
+
+Binary files are append-only. The header is:
+
+```
+<MAGIC:8s> <VERSION:u16> <CHANNELS:u16> <SCALE:u16> <SENSOR_TYPES:8s> <TIME:f64> <PAD:2>
+```
+
+where `TIME` is the Unix time at which the file was created. Each record is the time in seconds
+since `TIME` (f64) followed by one int32 per channel (value * `SCALE`). `read_log()` maps the
+records into memory and returns them as a NumPy array without parsing:
+
+```python
+header, records = read_log("./temp-measure.bin")
+seconds = records['time']
+celsius = records['temp'] / header['scale']
+```
+
+Long recordings can be split into segments of limited size or age with `RotatingLog`. Completed
+segments are compressed (gzip) by a background thread, and a manifest lists the segments in order
+so that `read_series()` returns them as one continuous series.
+"""
+
+# Global libraries
+import os
+import json
+import time
+import struct
+import threading
+from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+#--- CONSTANTS ---
+_DECIMAL_MAX = 2 		# see: arduino/Constants.h
+_SCALE = 10**_DECIMAL_MAX
+_BATCH = 64 			# records | Number of records kept in memory before they are written
+_INT_MAX = 2**31 - 1
+
+_MAGIC = b'CN0391LG'
+_VERSION = 1
+_HEADER = struct.Struct('<8sHHH8sd2x') 	# see the module description
+HEADER_SIZE = _HEADER.size 		# bytes | start of the records
+
+_MANIFEST = ".manifest.json" 	# suffix of the manifest of a rotating log
+_SEGMENT = "{root}.{index:05d}{ext}" 	# name of each segment. Ex: temp-measure.00001.bin
+_GZIP = ".gz"
+
+#===================================================================================================
+
+class MeasureLog:
+
+	def __init__(self, path:str, channels:int = 4, sensor_types:list = None, batch:int = _BATCH):
+		'''Open a binary measurement file. Records are appended if the file already exists, in \
+		which case it must have the same number of channels. An incomplete record at the end of \
+		the file, left by an interrupted program, is discarded.
+		
+		Parameters
+		----------
+		path: str
+			Path to the file
+		
+		channels: int
+			Number of values of each measurement
+		
+		sensor_types: list(str)
+			Optional sensor type of each port, stored in the header. Ex: `['K', 'K', 'T', 'J']`
+		
+		batch: int
+			Number of records kept in memory before they are written to the file
+		'''
+		self.channels = channels
+		self.batch = batch
+		self._record = struct.Struct(f'<d{channels}i')
+		self._buffer = bytearray()
+		self._count = 0 				# records in the buffer
+		
+		# append to an existing file
+		if os.path.exists(path) and os.path.getsize(path) > 0:
+			self.header = read_header(path)
+			if self.header['channels'] != channels:
+				raise ValueError(f"'{path}' stores {self.header['channels']} channels, " \
+				                 f"not {channels}")
+			
+			self.file = open(path, 'r+b')
+			size = os.path.getsize(path) - _HEADER.size
+			self.size = _HEADER.size + size - size % self._record.size 	# bytes in the file
+			self.file.truncate(self.size)
+			self.file.seek(0, os.SEEK_END)
+		
+		# new file
+		else:
+			types = "".join(sensor_types) if sensor_types != None else ""
+			self.header = {'version': _VERSION, 'channels': channels, 'scale': _SCALE, \
+			               'sensor_types': list(types), 'time': time.time()}
+			
+			self.file = open(path, 'wb')
+			self.file.write( _HEADER.pack(_MAGIC, _VERSION, channels, _SCALE, \
+			                              types.encode('utf-8'), self.header['time']) )
+			self.size = _HEADER.size
+		
+		# seconds between the creation of the file and now
+		self.offset = time.time() - self.header['time']
+	
+	
+	def __enter__(self):
+		return self
+	
+	
+	def __exit__(self, *args) -> None:
+		self.close()
+	
+	
+	def write(self, seconds:float, values:list) -> None:
+		'''Add a measurement. It is written to the file once the batch is complete.
+		
+		Parameters
+		----------
+		seconds: float
+			Time of the measurement since the file was opened
+		
+		values: list(float)
+			Value of each channel. Ex: Temperatures in Celsius
+		'''
+		scale = self.header['scale']
+		numbers = [ round(num * scale) for num in values ]
+		try:
+			self._buffer += self._record.pack(seconds + self.offset, *numbers)
+		except struct.error: 		# outside the range of int32
+			numbers = [ max(-_INT_MAX, min(num, _INT_MAX)) for num in numbers ]
+			self._buffer += self._record.pack(seconds + self.offset, *numbers)
+		self._count += 1
+		self.size += self._record.size
+		
+		if self._count >= self.batch:
+			self._write()
+	
+	
+	def _write(self) -> None:
+		'''Private function that writes the records in memory to the file
+		'''
+		self.file.write(self._buffer)
+		self._buffer.clear()
+		self._count = 0
+	
+	
+	def flush(self) -> None:
+		'''Write every measurement to the file
+		'''
+		self._write()
+		self.file.flush()
+	
+	
+	def close(self) -> None:
+		'''Write every measurement and close the file
+		'''
+		if not self.file.closed:
+			self.flush()
+			self.file.close()
+
+#---------------------------------------------------------------------------------------------------
+
+class TextLog:
+
+	def __init__(self, path:str, columns:list):
+		'''Open a text measurement file. An existing file is overwritten.
+		
+		Parameters
+		----------
+		path: str
+			Path to the file
+		
+		columns: list(str)
+			Name of each value of a measurement. Ex: `['temp_ch0', 'temp_ch1']`
+		'''
+		header = "==== seconds | celcius ====\n" + ", ".join(["time", *columns]) + "\n"
+		self.file = open(path, 'w')
+		self.file.write(header)
+		self.size = len(header) 		# characters in the file
+	
+	
+	def __enter__(self):
+		return self
+	
+	
+	def __exit__(self, *args) -> None:
+		self.close()
+	
+	
+	def write(self, seconds:float, values:list) -> None:
+		'''Add a measurement. See `MeasureLog.write()`
+		'''
+		str_array = ",".join( [ str(round(num, _DECIMAL_MAX)) for num in values ] )
+		self.size += self.file.write( f"{seconds:.3f},{str_array}\n" )
+	
+	
+	def flush(self) -> None:
+		'''Write every measurement to the file
+		'''
+		self.file.flush()
+	
+	
+	def close(self) -> None:
+		'''Close the file
+		'''
+		self.file.close()
+
+#---------------------------------------------------------------------------------------------------
+
+class RotatingLog:
+
+	def __init__(self, path:str, open_segment:Callable, max_bytes:int = None, \
+	             max_age:float = None, keep:int = None, compress:bool = True):
+		'''Split the measurements into segments of limited size or age. A new segment is started \
+		when the current one is full, and the previous one is compressed by a background thread. \
+		The segments are listed in a manifest, next to them, which is updated after each change. \
+		An existing manifest is extended, so a restarted program continues the series.
+		
+		Parameters
+		----------
+		path: str
+			Path of the measurements. Names the segments and the manifest. Ex: `temp-measure.bin` \
+			gives `temp-measure.00000.bin` and `temp-measure.manifest.json`
+		
+		open_segment: func
+			Function that opens a new segment, given its path. Must return a `MeasureLog` or a \
+			`TextLog`. Ex: `lambda path: MeasureLog(path, channels=4)`
+		
+		max_bytes: int
+			Size of a segment after which a new one is started. Unlimited if none is given.
+		
+		max_age: float
+			Time (in seconds) after which a new segment is started. Unlimited if none is given.
+		
+		keep: int
+			Number of segments kept on disk. The oldest ones are deleted. All are kept if none \
+			is given.
+		
+		compress: bool
+			Whether the completed segments are compressed with gzip
+		'''
+		self.max_bytes = max_bytes
+		self.max_age = max_age
+		self.keep = keep
+		self.compress = compress
+		self._open_segment = open_segment
+		
+		folder, name = os.path.split(path)
+		self._folder = folder
+		self._root, self._ext = os.path.splitext(name)
+		self.manifest_path = os.path.join(folder, self._root + _MANIFEST)
+		
+		# segments of previous runs
+		self._lock = threading.Lock() 	# manifest | shared with the compression thread
+		self.segments = []
+		if os.path.exists(self.manifest_path):
+			self.segments = read_manifest(self.manifest_path)['segments']
+		
+		# completed segments are compressed or deleted in order, one at a time
+		self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-compression')
+		self._pending = []
+		
+		self.time_init = time.time()
+		self._open(0)
+	
+	
+	def __enter__(self):
+		return self
+	
+	
+	def __exit__(self, *args) -> None:
+		self.close()
+	
+	
+	def _open(self, seconds:float) -> None:
+		'''Private function that starts a new segment. Its times are relative to `seconds`.
+		'''
+		index = self.segments[-1]['index'] + 1 if len(self.segments) > 0 else 0
+		name = _SEGMENT.format(root=self._root, index=index, ext=self._ext)
+		
+		self.log = self._open_segment( os.path.join(self._folder, name) )
+		self._start = seconds
+		self._entry = {'index':      index,
+		               'file':       name,
+		               'format':     "binary" if isinstance(self.log, MeasureLog) else "text",
+		               'time':       self.time_init + seconds,
+		               'count':      0,
+		               'compressed': False }
+		
+		with self._lock:
+			self.segments.append(self._entry)
+			self._save()
+	
+	
+	def write(self, seconds:float, values:list) -> None:
+		'''Add a measurement. A new segment is started first if the current one is full.
+		
+		Parameters
+		----------
+		seconds: float
+			Time of the measurement since the log was opened
+		
+		values: list(float)
+			Value of each channel
+		'''
+		if self._entry['count'] > 0 and \
+		   ( (self.max_bytes != None and self.log.size >= self.max_bytes) or \
+		     (self.max_age != None and seconds - self._start >= self.max_age) ):
+			self.rotate(seconds)
+		
+		self.log.write(seconds - self._start, values)
+		self._entry['count'] += 1
+	
+	
+	def rotate(self, seconds:float) -> None:
+		'''Complete the current segment and start a new one
+		
+		Parameters
+		----------
+		seconds: float
+			Time since the log was opened. The times of the new segment are relative to it.
+		'''
+		self._close()
+		self._open(seconds)
+		
+		# delete the oldest segments after they are compressed
+		if self.keep != None:
+			with self._lock:
+				while len(self.segments) > self.keep:
+					entry = self.segments.pop(0)
+					self._pending.append( self._pool.submit(self._remove, entry) )
+				self._save()
+		
+		self._pending = [ task for task in self._pending if not task.done() ]
+	
+	
+	def _close(self) -> None:
+		'''Private function that closes the current segment and queues its compression
+		'''
+		self.log.close()
+		if self.compress:
+			self._pending.append( self._pool.submit(self._compress, self._entry) )
+	
+	
+	def _compress(self, entry:dict) -> None:
+		'''Private function, executed by the compression thread, that replaces a segment with its \
+		gzip file
+		'''
+		import gzip
+		import shutil
+		
+		source = os.path.join(self._folder, entry['file'])
+		target = source + _GZIP
+		with open(source, 'rb') as infile, gzip.open(target + ".tmp", 'wb') as outfile:
+			shutil.copyfileobj(infile, outfile)
+		os.replace(target + ".tmp", target)
+		
+		with self._lock:
+			entry['file'] = entry['file'] + _GZIP
+			entry['compressed'] = True
+			self._save()
+		os.remove(source)
+	
+	
+	def _remove(self, entry:dict) -> None:
+		'''Private function, executed by the compression thread, that deletes a segment
+		'''
+		path = os.path.join(self._folder, entry['file'])
+		if os.path.exists(path):
+			os.remove(path)
+	
+	
+	def _save(self) -> None:
+		'''Private function that replaces the manifest. The lock must be held.
+		'''
+		manifest = {'version': _VERSION, 'segments': self.segments}
+		temp_path = self.manifest_path + ".tmp"
+		with open(temp_path, 'w') as outfile:
+			json.dump(manifest, outfile, indent=1)
+		os.replace(temp_path, self.manifest_path)
+	
+	
+	def flush(self) -> None:
+		'''Write every measurement to the current segment
+		'''
+		self.log.flush()
+	
+	
+	def close(self) -> None:
+		'''Close the current segment and wait until every segment is compressed
+		'''
+		if self._pool != None:
+			self._close()
+			with self._lock:
+				self._save()
+			self._pool.shutdown(wait=True)
+			self._pool = None
+			
+			for task in self._pending: 		# report errors of the compression thread
+				task.result()
+
+#===================================================================================================
+
+def read_header(path:str) -> dict:
+	'''Read the header of a binary measurement file
+	
+	Parameters
+	----------
+	path: str
+		Path to the file
+	
+	Returns
+	-------
+	header: dict
+		Dictionary with the fields `version`, `channels`, `scale`, `sensor_types` (list of \
+		characters) and `time` (Unix time at which the file was created)
+	'''
+	with open(path, 'rb') as infile:
+		data = infile.read(_HEADER.size)
+	return _parse_header(data, path)
+
+
+def _parse_header(data:bytes, path:str) -> dict:
+	'''Private function that decodes the header at the start of a binary measurement file
+	'''
+	if len(data) < _HEADER.size or data[:len(_MAGIC)] != _MAGIC:
+		raise ValueError(f"'{path}' is not a binary measurement file")
+	
+	magic, version, channels, scale, types, seconds = _HEADER.unpack_from(data)
+	return {'version':      version,
+	        'channels':     channels,
+	        'scale':        scale,
+	        'sensor_types': list( types.rstrip(b'\0').decode('utf-8') ),
+	        'time':         seconds }
+
+
+def record_dtype(channels:int) -> 'np.dtype':
+	'''NumPy type of a record. Fields: `time` (seconds) and `temp` (one integer per channel)
+	'''
+	import numpy as np
+	return np.dtype([ ('time', '<f8'), ('temp', '<i4', (channels,)) ])
+
+
+def read_log(path:str) -> tuple:
+	'''Map the records of a binary measurement file into memory. The records are not parsed or
+	copied: they are read from the file when they are accessed. An incomplete record at the end
+	of the file is ignored.
+	
+	Parameters
+	----------
+	path: str
+		Path to the file
+	
+	Returns
+	-------
+	header: dict
+		See `read_header()`
+	
+	records: np.ndarray
+		Read-only structured array with the fields `time` (seconds since `header['time']`) and
+		`temp` (integers with the shape `(count, channels)`; divide by `header['scale']`)
+	'''
+	import numpy as np
+	
+	header = read_header(path)
+	dtype = record_dtype(header['channels'])
+	count = (os.path.getsize(path) - _HEADER.size) // dtype.itemsize
+	
+	if count == 0:
+		return header, np.zeros(0, dtype=dtype)
+	
+	records = np.memmap(path, dtype=dtype, mode='r', offset=_HEADER.size, shape=(count,))
+	return header, records
+
+
+def read_manifest(path:str) -> dict:
+	'''Read the manifest of a rotating log
+	
+	Parameters
+	----------
+	path: str
+		Path to the manifest. Ex: `temp-measure.manifest.json`
+	
+	Returns
+	-------
+	manifest: dict
+		Dictionary with the fields `version` and `segments`. Each segment has the fields `index`, \
+		`file` (name in the folder of the manifest), `format` ("binary" or "text"), `time` (Unix \
+		time its seconds are relative to), `count` (measurements) and `compressed`
+	'''
+	with open(path, 'r') as infile:
+		return json.load(infile)
+
+
+def read_segment(path:str, log_format:str) -> tuple:
+	'''Read every measurement of a segment, compressed or not
+	
+	Parameters
+	----------
+	path: str
+		Path to the file
+	
+	log_format: str
+		Format of the file; "binary" or "text"
+	
+	Returns
+	-------
+	seconds: np.ndarray
+		Time of each measurement, with the shape `(count,)`
+	
+	values: np.ndarray
+		Temperatures, with the shape `(count, channels)`
+	'''
+	import gzip
+	import numpy as np
+	
+	opener = gzip.open if path.endswith(_GZIP) else open
+	
+	if log_format == "text":
+		with opener(path, 'rt') as infile:
+			data = np.loadtxt(infile, delimiter=',', skiprows=2, ndmin=2)
+		return data[:, 0], data[:, 1:]
+	
+	if opener == open:
+		header, records = read_log(path)
+	else:
+		with opener(path, 'rb') as infile:
+			data = infile.read()
+		header = _parse_header(data, path)
+		dtype = record_dtype(header['channels'])
+		count = (len(data) - _HEADER.size) // dtype.itemsize
+		records = np.frombuffer(data, dtype=dtype, count=count, offset=_HEADER.size)
+	
+	return np.array(records['time']), records['temp'] / header['scale']
+
+
+def read_series(path:str) -> tuple:
+	'''Join the segments of a rotating log into one series. Segments deleted by the rotation are \
+	skipped.
+	
+	Parameters
+	----------
+	path: str
+		Path to the manifest. Ex: `temp-measure.manifest.json`
+	
+	Returns
+	-------
+	seconds: np.ndarray
+		Time of each measurement since `time_init`, with the shape `(count,)`
+	
+	values: np.ndarray
+		Temperatures, with the shape `(count, channels)`
+	
+	time_init: float
+		Unix time of the first segment
+	'''
+	import numpy as np
+	
+	folder = os.path.dirname(path)
+	segments = read_manifest(path)['segments']
+	time_init = segments[0]['time'] if len(segments) > 0 else 0
+	seconds, values = [], []
+	
+	for entry in segments:
+		file = os.path.join(folder, entry['file'])
+		if not os.path.exists(file):
+			continue
+		
+		times, temps = read_segment(file, entry['format'])
+		seconds.append( times + (entry['time'] - time_init) )
+		values.append(temps)
+	
+	if len(seconds) == 0:
+		return np.zeros(0), np.zeros((0, 0)), time_init
+	return np.concatenate(seconds), np.concatenate(values), time_init
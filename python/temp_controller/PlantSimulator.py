@@ -0,0 +1,313 @@
+"""
+Offline simulation of the control chain of the firmware, for tuning. Each simulated channel is:
+
+- a first-order-plus-dead-time thermal plant: the temperature approaches `ambient` with the time
+  constant `tau`, and heats at `heat` Celsius per second when the output is on, `delay` seconds
+  after the output changes. The raw measurements add gaussian `noise`.
+- `PIDcontroller` of `arduino/src/PIDController`: input limits (`imax`, `imin`), the alpha-beta
+  filter of the raw measurement, and the PID with anti-windup. It runs once per `loop_period`.
+- `DiscretePulseFrequency` of `arduino/src/DiscretePulseFrequency`: the on/off output, updated by
+  the timer interrupt every `PULSE_WIDTH`.
+- `KalmanFilter1D` of `arduino/src/KalmanFilter1D`: the filtered measurement that the firmware
+  reports, like `get_filter()`. As in the firmware, it does not feed the PID.
+
+Many parameter sets are simulated at once: every quantity is an array with one element per set, so
+each time step costs a few NumPy operations whatever the number of sets. The sets use the layout
+of the `parameters` of the JSON configuration:
+
+```python
+simulator = PlantSimulator(controller.json_data["parameters"], plant={'tau': 120, 'delay': 5})
+result = simulator.run(duration=3600, target=60)
+result['iae'] 		# one value per parameter set
+```
+
+Differences with the firmware: the arithmetic is in double precision, and the loop period is
+constant.
+"""
+
+# Global libraries
+import json
+import argparse
+import numpy as np
+
+#--- CONSTANTS ---
+# See: arduino/Constants.h
+_PULSE_WIDTH = 0.1 		# seconds | PULSE_WIDTH
+_LOOP_PERIOD = 0.05 	# seconds | Duration of one iteration of `loop()`. See: ArduinoSimulator
+
+# See: arduino/src/PIDController/PIDController.cpp
+_OUT_MAX = 1
+_OUT_MIN = 0
+_IN_DIFF_MIN = 1
+
+# See: arduino/src/DiscretePulseFrequency/DiscretePulseFrequency.cpp
+_DUTY_FLIP = 2 / 3
+_COUNT_MAX = 2**16 		# uint16_t cycle_count
+
+# Default thermal plant. `ambient`, `noise`, `tau` and `heat` match ArduinoSimulator
+_PLANT = {'ambient': 25, 'noise': 0.05, 'tau': 60, 'heat': 2, 'delay': 2}
+_RECORD = 1 			# seconds | Time between the recorded samples
+_BAND = 0.5 			# Celsius | Distance from the target within which the plant has settled
+
+#===================================================================================================
+
+def _column(parameters:list, key:str) -> np.ndarray:
+	'''Private function that collects one coefficient of every parameter set
+	'''
+	return np.array( [ float(param.get(key, 0)) for param in parameters ] )
+
+
+def _limit(array:np.ndarray) -> np.ndarray:
+	'''Private function that constrains coefficients to [0, 1]. See the `LIMIT` macro of
+	`PIDController.h`
+	'''
+	return np.clip(array, 0, 1)
+
+#===================================================================================================
+
+class PlantSimulator:
+
+	def __init__(self, parameters:list, plant:dict = None, loop_period:float = _LOOP_PERIOD, \
+	             pulse_width:float = _PULSE_WIDTH):
+		'''Prepare the simulation of several parameter sets
+		
+		Parameters
+		----------
+		parameters: list(dict)
+			One parameter set per simulated channel, with the keys of the JSON configuration: \
+			`kp`, `ki`, `kd`, `imax`, `imin`, `alpha`, `beta`, `error` and `noise`. Missing \
+			keys are zero.
+		
+		plant: dict
+			Thermal plant, with the keys `ambient` (Celsius), `noise` (Celsius), `tau` (seconds), \
+			`heat` (Celsius per second) and `delay` (seconds). Missing keys take the defaults of \
+			`_PLANT`. Values can be numbers or arrays with one element per parameter set.
+		
+		loop_period: float
+			Time (in seconds) between updates of the controllers
+		
+		pulse_width: float
+			Time (in seconds) between updates of the on/off outputs
+		'''
+		self.parameters = list(parameters)
+		self.size = len(self.parameters)
+		self.plant = dict(_PLANT)
+		if plant != None:
+			self.plant.update(plant)
+		
+		# time step: the shortest period. The other one is a multiple of it.
+		self.step = min(loop_period, pulse_width)
+		self._loop_steps = max( 1, round(loop_period / self.step) )
+		self._pulse_steps = max( 1, round(pulse_width / self.step) )
+		
+		# PIDcontroller
+		self.kp = _column(parameters, 'kp')
+		self.ki = _column(parameters, 'ki')
+		self.kd = _column(parameters, 'kd')
+		self.alpha = _limit( _column(parameters, 'alpha') )
+		self.beta = _limit( _column(parameters, 'beta') )
+		
+		imax = _column(parameters, 'imax')
+		imin = _column(parameters, 'imin')
+		narrow = np.abs(imax - imin) < _IN_DIFF_MIN 			# prevent zero division
+		imax = np.where(narrow, _IN_DIFF_MIN, imax)
+		imin = np.where(narrow, 0, imin)
+		self.in_scale = 1 / (imax - imin)
+		self.in_offset = -imin * self.in_scale
+		
+		# KalmanFilter1D
+		error = _column(parameters, 'error')
+		qval = _column(parameters, 'noise')
+		valid = (error > 0) & (qval > 0)
+		self.var_measure = np.where(valid, error * error, 1) 	# default values
+		self.qval = np.where(valid, qval, 0)
+	
+	
+	def _normalize(self, value:np.ndarray) -> np.ndarray:
+		'''Private function that scales temperatures with the input limits
+		'''
+		return value * self.in_scale + self.in_offset
+	
+	
+	def run(self, duration:float, target:float | np.ndarray, initial:float = None, \
+	        record:float = _RECORD, seed:int = None, band:float = _BAND) -> dict:
+		'''Simulate the parameter sets from rest, with the controllers enabled
+		
+		Parameters
+		----------
+		duration: float
+			Simulated time (in seconds)
+		
+		target: float | np.ndarray
+			Target temperature, or one per parameter set
+		
+		initial: float
+			Initial temperature of the plant. Defaults to the ambient temperature.
+		
+		record: float
+			Time (in seconds) between the samples that are returned. Metrics use every step.
+		
+		seed: int
+			Seed of the measurement noise. Runs with the same seed are identical.
+		
+		band: float
+			Distance (in Celsius) from the target within which the plant has settled
+		
+		Returns
+		-------
+		result: dict
+			Dictionary with the samples `time` (shape `(samples,)`), and `temperature` (plant), \
+			`measure` (raw), `filter` (Kalman) and `duty` (PID output), with the shape \
+			`(samples, sets)`. Also the metrics of each set, with the shape `(sets,)`: `iae` \
+			(integral of the absolute error of the plant, in Celsius seconds), `overshoot` \
+			(Celsius above the target), `settling` (last time the plant was outside the band, \
+			in seconds), `error` (final error, in Celsius) and `switches` (changes of the \
+			on/off output).
+		'''
+		size = self.size
+		step = self.step
+		rng = np.random.default_rng(seed)
+		
+		plant = { key: np.broadcast_to( np.asarray(value, dtype=float), (size,) ) \
+		          for key, value in self.plant.items() }
+		decay = np.exp(-step / plant['tau'])
+		steady = plant['heat'] * plant['tau'] 				# rise of a channel that is always on
+		target = np.broadcast_to( np.asarray(target, dtype=float), (size,) )
+		target_norm = self._normalize(target)
+		
+		# heater outputs in transit through the dead time, as a ring of steps
+		delays = np.round(plant['delay'] / step).astype(int)
+		history = np.zeros( (int(delays.max()) + 1, size) )
+		columns = np.arange(size)
+		
+		# state after setupControllers() and setupFilters()
+		temperature = np.array(plant['ambient']) if initial == None else np.full(size, initial, float)
+		measure = temperature + rng.normal(0, 1, size) * plant['noise']
+		xvar = self._normalize(measure)
+		dx_dt = np.zeros(size)
+		integral = np.zeros(size)
+		duty = np.zeros(size)
+		estimate = measure.copy()
+		variance = np.ones(size)
+		cycle = np.zeros(size, dtype=np.int64)
+		pulse = np.zeros(size, dtype=bool)
+		
+		# metrics
+		iae = np.zeros(size)
+		overshoot = np.zeros(size)
+		settling = np.zeros(size)
+		switches = np.zeros(size, dtype=np.int64)
+		
+		steps = int( round(duration / step) )
+		record_steps = max( 1, round(record / step) )
+		samples = { key: [] for key in ('time', 'temperature', 'measure', 'filter', 'duty') }
+		loop_dt = self._loop_steps * step
+		
+		# unstable filters or gains diverge. Their metrics are then infinite or NaN.
+		with np.errstate(over='ignore', invalid='ignore'):
+			for index in range(steps):
+				# loop(): read the sensors, update the controllers and the output filters
+				if index % self._loop_steps == 0:
+					measure = temperature + rng.normal(0, 1, size) * plant['noise']
+					
+					# PIDcontroller::update() and updateFilter()
+					dx = self._normalize(measure) - xvar
+					xvar = xvar + dx_dt * loop_dt + self.alpha * dx
+					dx_dt = dx_dt + self.beta * dx / loop_dt
+					
+					error = target_norm - xvar
+					integral_new = integral + self.ki * error * loop_dt
+					output = self.kp * error + integral_new - self.kd * dx_dt
+					inside = (output <= _OUT_MAX) & (output >= _OUT_MIN) 	# prevent integral windup
+					integral = np.where(inside, integral_new, integral)
+					duty = np.clip(output, _OUT_MIN, _OUT_MAX)
+					
+					# KalmanFilter1D::update()
+					gain = variance / (variance + self.var_measure)
+					dx = measure - estimate
+					dxq = dx * self.qval
+					variance = (1 - gain) * variance + dxq * dxq
+					estimate = estimate + gain * dx
+				
+				# timer interrupt: DiscretePulseFrequency::update()
+				if index % self._pulse_steps == 0:
+					previous = pulse
+					cycle = (cycle + 1) % _COUNT_MAX
+					partial = (duty > 0) & (duty < 1) 			# pulses if not saturated
+					with np.errstate(divide='ignore', invalid='ignore'):
+						ratio = np.where(duty < 0.5, (1 - duty) / duty, duty / (1 - duty))
+					high = partial & ( cycle > np.floor(ratio) )
+					pulse = (duty >= 1) | ( high ^ (partial & (duty >= _DUTY_FLIP)) )
+					cycle = np.where(partial & ~high, cycle, 0)
+					switches += pulse != previous
+				
+				# thermal plant, with the output of `delay` seconds ago
+				history[index % len(history)] = pulse
+				heater = history[(index - delays) % len(history), columns]
+				balance = plant['ambient'] + steady * heater
+				temperature = balance + (temperature - balance) * decay
+				
+				# metrics and samples
+				deviation = temperature - target
+				iae += np.abs(deviation) * step
+				overshoot = np.maximum(overshoot, deviation)
+				settling = np.where( np.abs(deviation) > band, (index + 1) * step, settling )
+				
+				if index % record_steps == 0:
+					samples['time'].append( index * step )
+					samples['temperature'].append(temperature)
+					samples['measure'].append(measure)
+					samples['filter'].append(estimate)
+					samples['duty'].append(duty)
+		
+		result = { key: np.array(value) for key, value in samples.items() }
+		result.update( {'iae': iae, 'overshoot': overshoot, 'settling': settling, \
+		                'error': target - temperature, 'switches': switches} )
+		return result
+
+#===================================================================================================
+
+def captureInputs() -> object:
+	'''Captures the command line parameters of the simulation. See `PlantSimulator`
+	'''
+	parser = argparse.ArgumentParser()
+	
+	parser.add_argument('--path', type=str, required=True, \
+	                    help="Path to the JSON file with the controller configuration. \
+	                          Ex: '../coefficients.json'")
+	
+	parser.add_argument('--target', type=float, required=True, \
+	                    help="Target temperature of every channel (Celsius)")
+	
+	parser.add_argument('--duration', type=float, default=600, \
+	                    help="Simulated time (Seconds)")
+	
+	parser.add_argument('--tau', type=float, default=_PLANT['tau'], \
+	                    help="Time constant of the thermal plant (Seconds)")
+	
+	parser.add_argument('--heat', type=float, default=_PLANT['heat'], \
+	                    help="Heating rate of the plant when the output is on (Celsius/Second)")
+	
+	parser.add_argument('--delay', type=float, default=_PLANT['delay'], \
+	                    help="Dead time of the plant (Seconds)")
+	
+	parser.add_argument('--ambient', type=float, default=_PLANT['ambient'], \
+	                    help="Temperature of the surroundings (Celsius)")
+	
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	args = captureInputs()
+	
+	with open(args.path, 'r') as infile:
+		parameters = json.load(infile)["parameters"]
+	
+	plant = {'tau': args.tau, 'heat': args.heat, 'delay': args.delay, 'ambient': args.ambient}
+	result = PlantSimulator(parameters, plant).run(args.duration, args.target)
+	
+	print("ch       iae  overshoot  settling  final error  switches")
+	for ch in range( len(parameters) ):
+		print( f"{ch:<2} {result['iae'][ch]:9.1f} {result['overshoot'][ch]:10.2f} " \
+		       f"{result['settling'][ch]:9.1f} {result['error'][ch]:12.2f} " \
+		       f"{result['switches'][ch]:9d}" )
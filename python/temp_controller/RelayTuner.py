@@ -0,0 +1,292 @@
+"""
+Relay-feedback autotune of one channel of a running controller (Astrom-Hagglund). The heater of
+the channel is switched fully on and off around a setpoint, which makes the temperature oscillate.
+The period and amplitude of the oscillation give the ultimate gain and period of the channel, and
+a tuning rule turns them into PID coefficients:
+
+```python
+tuner = RelayTuner(controller, ch=0, setpoint=60)
+result = tuner.run()
+controller.set_pid(0, result['kp'], result['ki'], result['kd'])
+```
+
+The relay uses the controller of the channel itself: while it is on, the channel is enabled with a
+large proportional gain and a target far above the setpoint, so the output saturates. While it is
+off, the channel is disabled. Each measurement is one `get_filter()`, and each switch is sent in
+the same pipeline as the next measurement, so a cycle costs no other round trips. The other
+channels keep running and their measurements are passed to the callback. The coefficients,
+target, timeout and state of the channel are restored at the end.
+"""
+
+# Global libraries
+import math
+import time
+import argparse
+
+# local file
+import TempControllerCN0391 as cntl
+
+#--- CONSTANTS ---
+_HYSTERESIS = 0.5 	# Celsius | Distance from the setpoint at which the relay switches
+_CYCLES = 4 		# Number of measured cycles
+_SKIP = 1 			# Number of cycles discarded at the start (transient)
+_TIMEOUT = 3600 	# seconds | Maximum duration of the experiment
+_RELAY_GAIN = 1000 	# proportional gain that saturates the output while the relay is on
+_MARGIN = 50 		# Celsius | Distance of the target above the setpoint while the relay is on
+_AMPLITUDE = 0.5 	# Half of the difference between the outputs of the relay (1 and 0)
+
+# Tuning rules: kp / ku, ti / tu, td / tu
+_RULES = {'ziegler-nichols': (0.6, 0.5, 0.125),
+          'tyreus-luyben':   (1 / 2.2, 2.2, 1 / 6.3),
+          'no-overshoot':    (0.2, 0.5, 1 / 3) }
+
+#===================================================================================================
+
+class RelayTuner:
+
+	def __init__(self, controller:cntl.TempControllerCN0391, ch:int, setpoint:float, \
+	             hysteresis:float = _HYSTERESIS, cycles:int = _CYCLES, \
+	             rule:str = 'ziegler-nichols', function=None):
+		'''Prepare the relay experiment of a channel
+		
+		Parameters
+		----------
+		controller: TempControllerCN0391
+			Connected controller
+		
+		ch : int
+			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
+		
+		setpoint: float
+			Temperature (in Celsius) around which the channel oscillates
+		
+		hysteresis: float
+			Distance (in Celsius) from the setpoint at which the relay switches. Larger than the \
+			noise of the measurement.
+		
+		cycles: int
+			Number of oscillations that are measured
+		
+		rule: str
+			Tuning rule: "ziegler-nichols", "tyreus-luyben" (less overshoot) or "no-overshoot"
+		
+		function: func
+			Callback executed after each measurement, with the form `def function(seconds, \
+			values)`. Ex: `log.write`
+		'''
+		if rule not in _RULES:
+			raise ValueError(f"unknown tuning rule '{rule}'. Use one of {list(_RULES)}")
+		if cycles < 1:
+			raise ValueError(f"at least one cycle must be measured, not {cycles}")
+		
+		self.controller = controller
+		self.ch = ch
+		self.setpoint = setpoint
+		self.hysteresis = hysteresis
+		self.cycles = cycles
+		self.rule = rule
+		self._function = function
+	
+	
+	def run(self, timeout:float = _TIMEOUT) -> dict:
+		'''Run the relay experiment until the cycles are measured. Blocks while it runs.
+		
+		Parameters
+		----------
+		timeout: float
+			Maximum duration (in seconds). `TimeoutError` is raised if the cycles are not \
+			measured in time.
+		
+		Returns
+		-------
+		result: dict
+			Dictionary with the ultimate period `tu` (seconds) and gain `ku`, the `amplitude` \
+			(Celsius) of the oscillation, the PID coefficients `kp`, `ki` and `kd` of the tuning \
+			rule, and the number of `samples` and their `rate` (per second).
+		
+		Raises
+		------
+		RuntimeError
+			If the amplitude of the oscillation is not larger than the hysteresis. The ultimate \
+			gain cannot be computed, since the relay switches on the noise rather than on the \
+			oscillation. Use a smaller hysteresis.
+		'''
+		controller = self.controller
+		ch = self.ch
+		
+		# state of the channel, restored at the end
+		gains = controller.get_pid(ch)
+		target = controller.get_target()[ch]
+		timeouts = controller.get_timeout()
+		enabled = controller.get_enable()[ch]
+		imax, imin = cntl._in_limits( *controller.get_in_limit(ch) )
+		
+		try:
+			with controller.pipeline():
+				controller.set_disable(ch)
+				controller.set_pid(ch, _RELAY_GAIN, 0, 0)
+				controller.set_target(ch, self.setpoint + _MARGIN)
+				controller.set_timeout_inf(ch)
+			
+			tu, amplitude, samples, elapsed = self._oscillate(timeout)
+		
+		finally:
+			with controller.pipeline():
+				controller.set_disable(ch)
+				controller.set_pid(ch, *gains)
+				controller.set_target(ch, target)
+				if timeouts[ch] != cntl._TIME_INF:
+					controller.set_timeout(ch, timeouts[ch])
+				if enabled:
+					controller.set_enable(ch)
+		
+		# ultimate gain of the normalized input. See: PIDcontroller::normalize()
+		scale = 1 / (imax - imin)
+		a = amplitude * scale
+		h = self.hysteresis * scale
+		if a <= h:
+			raise RuntimeError(f"The amplitude of channel {ch} ({amplitude:.2f} C) is not larger " \
+			                   f"than the hysteresis ({self.hysteresis:.2f} C)")
+		ku = 4 * _AMPLITUDE / ( math.pi * math.sqrt(a*a - h*h) )
+		
+		kp_ratio, ti_ratio, td_ratio = _RULES[self.rule]
+		kp = kp_ratio * ku
+		return {'tu':        tu,
+		        'ku':        ku,
+		        'amplitude': amplitude,
+		        'kp':        kp,
+		        'ki':        kp / (ti_ratio * tu),
+		        'kd':        kp * td_ratio * tu,
+		        'samples':   samples,
+		        'rate':      samples / elapsed }
+	
+	
+	def _oscillate(self, timeout:float) -> tuple:
+		'''Private function that switches the relay and measures the oscillation. A cycle starts
+		each time the relay turns on.
+		
+		Returns
+		-------
+		tu: float
+			Mean period (in seconds) of the measured cycles
+		
+		amplitude: float
+			Mean half peak-to-peak amplitude (in Celsius) of the measured cycles
+		
+		samples: int
+		
+		elapsed: float
+		'''
+		controller = self.controller
+		ch = self.ch
+		low = self.setpoint - self.hysteresis
+		high = self.setpoint + self.hysteresis
+		
+		periods, amplitudes = [], []
+		time_init = time.monotonic()
+		time_on = None 				# start of the current cycle
+		peak_max, peak_min = -math.inf, math.inf
+		relay = False
+		switch = None
+		samples = 0
+		
+		while len(periods) < _SKIP + self.cycles:
+			# the switch is sent with the measurement. See: pipeline()
+			with controller.pipeline():
+				if switch == True:
+					controller.set_enable(ch)
+				elif switch == False:
+					controller.set_disable(ch)
+				values = controller.get_filter()
+			
+			seconds = time.monotonic() - time_init
+			samples += 1
+			if self._function != None:
+				self._function(seconds, values)
+			if seconds > timeout:
+				raise TimeoutError(f"Channel {ch} did not oscillate {self.cycles} times within " \
+				                   f"{timeout} seconds")
+			
+			temp = values[ch]
+			peak_max = max(peak_max, temp)
+			peak_min = min(peak_min, temp)
+			
+			# relay with hysteresis
+			switch = None
+			if not relay and temp < low:
+				switch = relay = True
+				if time_on != None:
+					periods.append(seconds - time_on)
+					amplitudes.append( (peak_max - peak_min) / 2 )
+				time_on = seconds
+				peak_max, peak_min = temp, temp
+			elif relay and temp > high:
+				switch = relay = False
+		
+		periods = periods[_SKIP:]
+		amplitudes = amplitudes[_SKIP:]
+		return sum(periods) / len(periods), sum(amplitudes) / len(amplitudes), samples, \
+		       time.monotonic() - time_init
+
+#===================================================================================================
+
+def captureInputs() -> object:
+	'''Captures the command line parameters of the autotune. See `RelayTuner`
+	'''
+	parser = argparse.ArgumentParser()
+	
+	group = parser.add_mutually_exclusive_group(required=True)
+	
+	group.add_argument("--port", type=str, default=None, \
+	                   help="Path to the Serial Port the Arduino is connected to.")
+	
+	group.add_argument("--path", type=str, default=None, \
+	                   help="Path to the JSON file with the controller configuration. \
+	                         Ex: './coefficients.json'")
+	
+	parser.add_argument('--channel', type=int, required=True, \
+	                    help="Channel that is tuned. Options are: {0, 1, 2, 3}")
+	
+	parser.add_argument('--setpoint', type=float, required=True, \
+	                    help="Temperature around which the channel oscillates (Celsius)")
+	
+	parser.add_argument('--hysteresis', type=float, default=_HYSTERESIS, \
+	                    help="Distance from the setpoint at which the relay switches (Celsius)")
+	
+	parser.add_argument('--cycles', type=int, default=_CYCLES, \
+	                    help="Number of oscillations that are measured")
+	
+	parser.add_argument('--rule', type=str, default='ziegler-nichols', choices=list(_RULES), \
+	                    help="Rule that converts the oscillation into PID coefficients")
+	
+	parser.add_argument('--timeout', type=float, default=_TIMEOUT, \
+	                    help="Maximum duration of the experiment (Seconds)")
+	
+	parser.add_argument('--resume', action='store_true', \
+	                    help="Reuse the configuration of an Arduino that is already running")
+	
+	parser.add_argument('--save_json', type=str, default=None, \
+	                    help="Path to the JSON file where the configuration with the new \
+	                          coefficients is saved. The coefficients are also sent to the Arduino")
+	
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	args = captureInputs()
+	
+	controller = cntl.TempControllerCN0391(port=args.port, path=args.path, resume=args.resume)
+	tuner = RelayTuner(controller, args.channel, args.setpoint, args.hysteresis, args.cycles, \
+	                   args.rule)
+	
+	try:
+		result = tuner.run(args.timeout)
+		print(f"tu {result['tu']:.2f} s | ku {result['ku']:.3f} | " \
+		      f"amplitude {result['amplitude']:.2f} C | {result['rate']:.1f} samples/s")
+		print(f"kp {result['kp']:.2f} | ki {result['ki']:.2f} | kd {result['kd']:.2f}")
+		
+		if args.save_json != None:
+			controller.set_pid(args.channel, result['kp'], result['ki'], result['kd'])
+			controller.save_json_file(args.save_json)
+	finally:
+		controller.close()
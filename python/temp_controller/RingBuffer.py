@@ -0,0 +1,158 @@
+"""
+Fixed-size circular buffer backed by a numpy array. It keeps the newest samples of one or several
+channels, such as the time window of the live plot. Appending and discarding samples is O(1), and
+the stored samples are always available as a contiguous view without copying:
+
+```python
+buffer = RingBuffer(capacity=120, channels=4)
+buffer.append([25.1, 24.9, 30.2, 31.0])
+lines[0].set_ydata( buffer.view()[0] )
+```
+
+The storage is mirrored: it holds twice the capacity, and each sample is written both at its
+position and one capacity further. The samples from the oldest to the newest are then always
+adjacent in memory, whatever the position of the oldest one.
+"""
+
+# Global libraries
+import numpy as np
+
+#--- CONSTANTS ---
+_GROWTH = 2 	# factor | Increase of the capacity when a buffer that can grow is full
+
+#===================================================================================================
+
+class RingBuffer:
+
+	def __init__(self, capacity:int, channels:int = None, grow:bool = True, dtype:type = float):
+		'''Initialize an empty buffer
+		
+		Parameters
+		----------
+		capacity: int
+			Number of samples that fit in the buffer
+		
+		channels: int
+			Number of values of each sample. The buffer is one-dimensional if none is given.
+		
+		grow: bool
+			Whether a full buffer doubles its capacity (True) or overwrites its oldest sample \
+			(False) when a sample is appended. Growing copies the samples once.
+		
+		dtype: type
+			Numpy type of the values
+		'''
+		self.channels = channels
+		self.grow = grow
+		self._start = 0 		# position of the oldest sample
+		self._count = 0
+		self._allocate( max(1, int(capacity)), dtype )
+	
+	
+	def _allocate(self, capacity:int, dtype:type) -> None:
+		'''Private function that creates the mirrored storage
+		'''
+		shape = (2 * capacity,) if self.channels == None else (self.channels, 2 * capacity)
+		self._data = np.empty(shape, dtype=dtype)
+		self.capacity = capacity
+	
+	
+	def __len__(self) -> int:
+		return self._count
+	
+	
+	def is_full(self) -> bool:
+		'''Returns whether the buffer holds as many samples as its capacity
+		
+		Returns
+		-------
+		is_full: bool
+		'''
+		return self._count == self.capacity
+	
+	
+	def append(self, value:float | list) -> None:
+		'''Add the newest sample. The oldest sample is discarded if the buffer is full and \
+		cannot grow.
+		
+		Parameters
+		----------
+		value: float | list(float)
+			Value of the sample, or one value per channel
+		'''
+		if self._count == self.capacity:
+			if self.grow:
+				self._resize(self.capacity * _GROWTH)
+			else:
+				self.popleft()
+		
+		index = self._start + self._count
+		if index >= self.capacity:
+			index -= self.capacity
+		
+		# write both copies of the sample
+		data = self._data
+		if self.channels == None:
+			data[index] = value
+			data[index + self.capacity] = value
+		else:
+			data[:, index] = value
+			data[:, index + self.capacity] = value
+		self._count += 1
+	
+	
+	def popleft(self, count:int = 1) -> None:
+		'''Discard the oldest samples
+		
+		Parameters
+		----------
+		count: int
+			Number of samples to discard. At most the number of stored samples.
+		'''
+		count = min(count, self._count)
+		self._start = (self._start + count) % self.capacity
+		self._count -= count
+	
+	
+	def clear(self) -> None:
+		'''Discard every sample
+		'''
+		self._start = 0
+		self._count = 0
+	
+	
+	def view(self) -> np.ndarray:
+		'''Samples from the oldest to the newest. The array is a view of the storage, so it must
+		not be kept after the buffer changes.
+		
+		Returns
+		-------
+		data: np.ndarray
+			Array with the shape `(count,)`, or `(channels, count)` if the buffer has channels
+		'''
+		end = self._start + self._count
+		if self.channels == None:
+			return self._data[self._start:end]
+		return self._data[:, self._start:end]
+	
+	
+	def first(self) -> float | np.ndarray:
+		'''Returns the oldest sample. The buffer must not be empty.
+		'''
+		return self._data[..., self._start]
+	
+	
+	def last(self) -> float | np.ndarray:
+		'''Returns the newest sample. The buffer must not be empty.
+		'''
+		return self._data[..., self._start + self._count - 1]
+	
+	
+	def _resize(self, capacity:int) -> None:
+		'''Private function that moves the samples into a larger storage
+		'''
+		data = self.view()
+		self._allocate(capacity, self._data.dtype)
+		self._data[..., :self._count] = data
+		self._data[..., capacity:capacity + self._count] = data
+		self._start = 0
@@ -11,25 +11,103 @@ of a temperature controller built with the CN0391 temperature shield and an Ardu
 # Global libraries
 import time
 import json
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, fields
 
 # local file
 from comms import ArduinoSerial
+from comms import SerialReader
+from comms import SerialCodec
 
 #--- CONSTANTS ---
 _DEFAULT_BAUD = 9600
 _DECIMAL_MAX = 2        # Defined in: "Constants.h" in arduino code. MUST MATCH THIS VALUE.
+_IN_DIFF_MIN = 1        # Defined in: "PIDController.cpp" in arduino code.
+_TIME_INF = -1          # Defined in: "Commands.h" in arduino code.
+_SETUP_TIMEOUT = 30     # seconds | Time allowed for the Arduino to reset and calibrate its sensors
+
+# Getters that retrieve the parameters of every channel: enable, timeout, and then the PID gains, 
+# alpha-beta filter, kalman filter and input limits of each channel. See: "Commands.h"
+_CHANNEL_GETTERS = ["16", "18"] + [ f"{cmd},{ch}" for ch in range(4) \
+                                                for cmd in ("4", "8", "10", "6") ]
 
 #===================================================================================================
 
 def round_input(num:float) -> float:
 	return round(num, _DECIMAL_MAX)
 
+
+def _limit(num:float) -> float:
+	'''Constrain a coefficient to [0, 1]. See the `LIMIT` macro of `PIDController.h`
+	'''
+	return 0 if num < 0 else 1 if num > 1 else num
+
+
+def _in_limits(imax:float, imin:float) -> list:
+	'''Input limits stored by the Arduino, which prevents a division by zero.
+	See `PIDcontroller::setInputLimits()`
+	'''
+	return [imax, imin] if abs(imax - imin) >= _IN_DIFF_MIN else [_IN_DIFF_MIN, 0]
+
+
+def _k_gains(error:float, noise:float) -> list:
+	'''Kalman gains stored by the Arduino, which replaces invalid gains by defaults.
+	See `KalmanFilter1D::setGains()`
+	'''
+	return [error, noise] if error > 0 and noise > 0 else [1, 0]
+
+
+def _set_item(data:list, index:int, value) -> list | None:
+	'''Copy of a list with one element replaced. Returns `None` if there is no list.
+	'''
+	if data == None:
+		return None
+	data = list(data)
+	data[index] = value
+	return data
+
+#---------------------------------------------------------------------------------------------------
+
+@dataclass
+class ChannelParameters:
+	'''Parameters of the PID controller and filters of one channel. The fields have the same names
+	as the entries of `"parameters"` in the JSON file.
+	'''
+	kp: float
+	ki: float
+	kd: float
+	alpha: float
+	beta: float
+	error: float
+	noise: float
+	imax: float
+	imin: float
+	timeout: float
+	enable: bool
+	
+	def to_json(self) -> dict:
+		'''Dictionary with the layout of an entry of `"parameters"` in the JSON file
+		'''
+		data = asdict(self)
+		data["enable"] = int(self.enable)
+		return data
+
+
+@dataclass
+class DeviceSnapshot:
+	'''Parameters loaded on the Arduino. See `TempControllerCN0391.get_device_snapshot()`
+	'''
+	sensor_types: list		# list[str]: sensor type of each port
+	channels: list			# list[ChannelParameters]: parameters of each port
+
 #---------------------------------------------------------------------------------------------------
 
 class TempControllerCN0391:
 
 	def __init__(self, port:str = None, baud_rate:int = _DEFAULT_BAUD, path:str = None,
-	             sensor_types:list = None ):
+	             sensor_types:list = None, deadline:float = ArduinoSerial._DEADLINE,
+	             binary:bool = False, cache_ttl:float = None, resume:bool = False ):
 		'''Initialize the temperature controller.
 		
 		__Note:__ The Serial port changes with operating system:   
@@ -56,17 +134,42 @@ class TempControllerCN0391:
 			CN0391 sensor module. Each element in the list corresponds to the port with the same
 			index. That is: `[ch0, ch1, ch2, ch3]`. Options for the sensor types are: 
 			`T, J, K, E, S, R, N, B`.
+		
+		deadline: float
+			Time (in seconds) each command waits for the reply of the Arduino before a \
+			`TimeoutError` is raised. 
+		
+		binary: bool
+			Whether the Arduino is asked to send binary replies once it is configured. Falls back
+			to CSV replies if the firmware does not support them. See `set_binary()`
+		
+		cache_ttl: float
+			Time (in seconds) the parameters read from the Arduino are kept in memory. They are
+			kept until invalidated if none is given, and never kept if zero. See `invalidate_cache()`
+		
+		resume: bool
+			Whether to reuse the sensor types and calibration of an Arduino that is already 
+			running, instead of resetting it. Falls back to the full setup if the Arduino is not
+			running or uses other sensor types. See `_resume()`
 		'''
 		# initialize dictionary
 		self.json_data = {}
+		self._pipeline = None	# replies of pipelined setters. See: pipeline()
+		self._polls = {}		# pending measurements and last reading returned. See: _poll()
+		self._cache = {}		# getter command -> (reply, time). See: invalidate_cache()
+		self._cache_lock = threading.RLock()	# pipelined setters update the cache from the reader
+		self._commands = None	# setters recorded by apply_json_coefficients()
+		self._dry_run = False
+		self.cache_ttl = cache_ttl
 		
 		# json file is provided
 		if path != None:
 			self._load_json_file(path)
 			self.serial = ArduinoSerial.SerialCommunication( self.json_data["serial_port"], \
-			                                                 self.json_data["baud_rate"] )
+			                                                 self.json_data["baud_rate"], \
+			                                                 deadline, reset=not resume )
 			# send and save data
-			self._setup( self.json_data["sensor_types"] )
+			self._connect( self.json_data["sensor_types"], binary, resume )
 			self._set_json_coefficients() ### need to fix JSON setter
 		
 		# no json file
@@ -77,8 +180,9 @@ class TempControllerCN0391:
 			self.json_data["baud_rate"] = baud_rate
 			
 			# send serial commands
-			self.serial = ArduinoSerial.SerialCommunication(port, baud_rate)
-			self._setup( sensor_types );
+			self.serial = ArduinoSerial.SerialCommunication(port, baud_rate, deadline, \
+			                                                reset=not resume)
+			self._connect( sensor_types, binary, resume )
 			self._get_device_coefficients() ### need to fix JSON setter
 		
 		else:
@@ -87,8 +191,8 @@ class TempControllerCN0391:
 	# ================ setup ================
 	# See: `arduino.ino`   -> setup()
     #      `SerialCom.ino` -> readSensorTypes()
-	
-	def _setup_arduino(self, cmd:str) -> None:
+
+	def _setup_arduino(self, cmd:str, waiting:bool = False) -> None:
 		'''Captures and sends serial commands to configure the sensor types on the Arduino.
 		Sensor calibration is also performed automatically by the Arduino. 
 		
@@ -96,14 +200,20 @@ class TempControllerCN0391:
 		----------
 		cmd : string
 			Serial command 
+		
+		waiting: bool
+			Whether the Arduino already announced that it waits for the sensor types
 		'''
 		# delay to initialize device
-		self.serial.flush()
-		time.sleep(2)
+		if not waiting:
+			self.serial.flush()
+			time.sleep(2)
+		
+		# check and send response
+		end = time.monotonic() + _SETUP_TIMEOUT
+		data = 'WAITING-TYPES' if waiting else self.serial.read_serial(_SETUP_TIMEOUT)
 		
-		# check and send response | [TAG] -> Add timeout to prevent blocking code?
 		while True:
-			data = self.serial.read_serial()
 			print(data)
 			
 			if data == 'WAITING-TYPES': # COMMAND MUST MATCH ARDUINO OUTPUT
@@ -112,9 +222,15 @@ class TempControllerCN0391:
 			elif data  == "CALIBRATED": # COMMAND MUST MATCH ARDUINO OUTPUT
 				self.flush()
 				break
+			
+			remaining = end - time.monotonic()
+			if remaining <= 0:
+				self.serial.close() # gracefully stop connection
+				raise TimeoutError(f"The Arduino did not calibrate within {_SETUP_TIMEOUT} seconds")
+			data = self.serial.read_serial(remaining)
 	
 	
-	def _setup(self, sensor_types:list) -> None:
+	def _setup(self, sensor_types:list, waiting:bool = False) -> None:
 		'''Assigns the sensor types for each port and performs an initial calibration
 		of the temperature sensors. Defaults to pre-programmed sensor types if no
 		parameters are provided. 
@@ -124,10 +240,13 @@ class TempControllerCN0391:
 		sensor_types: list(str)
 			List of characters with the sensor type for each port. 
 			See `Constants.h` in Arduino code for allowable types.
+		
+		waiting: bool
+			See `_setup_arduino()`
 		'''
 		# Default types
 		if sensor_types == None:
-			self._setup_arduino('0')
+			self._setup_arduino('0', waiting)
 		
 		# Custom types
 		else:
@@ -141,11 +260,63 @@ class TempControllerCN0391:
 			
 			# send types
 			cmd = "".join(sensor_types) # Concatenate inputs. Ex: "RNTJ"
-			self._setup_arduino(cmd)
+			self._setup_arduino(cmd, waiting)
 		
 		self._set_sensor_type_json()
 	
 	
+	def _resume(self, sensor_types:list) -> None:
+		'''Reuses the sensor types and calibration of a running Arduino. The Arduino is probed
+		with `GET_SENSOR_TYPE`: a running Arduino replies with its sensor types, while one that 
+		waits for them replies `BAD_COMMAND`. No reply means the Arduino is still booting, since 
+		the first connection without reset may reboot it. The full setup is performed unless the
+		Arduino is running with the requested sensor types.
+		
+		Parameters
+		----------
+		sensor_types: list(str)
+			List of characters with the sensor type for each port. Any type is accepted if \
+			none is given.
+		'''
+		end = time.monotonic() + _SETUP_TIMEOUT
+		reply = None
+		
+		while reply == None:
+			try:
+				reply = self.serial.request("13")
+			except TimeoutError:
+				if time.monotonic() > end:
+					self.serial.close() # gracefully stop connection
+					raise TimeoutError(f"The Arduino did not reply within {_SETUP_TIMEOUT} seconds")
+		
+		data = reply.split(",")
+		
+		# running with the same types
+		if data[0] == "SENSOR_TYPES":
+			if sensor_types == None or list(sensor_types) == data[1:]:
+				self._store("13", data[1:])
+				self._set_sensor_type_json()
+				return
+			self.serial.restart() 	# sensor types are only assigned at startup
+			self._setup(sensor_types)
+		
+		# waiting for the sensor types
+		else:
+			self._setup(sensor_types, waiting=True)
+	
+	
+	def _connect(self, sensor_types:list, binary:bool, resume:bool) -> None:
+		'''Private function that configures the sensor types and the format of the replies
+		'''
+		if resume:
+			self._resume(sensor_types)
+			self.set_binary(binary) 	# format left by the previous connection is unknown
+		else:
+			self._setup(sensor_types)
+			if binary:
+				self.set_binary()
+	
+	
 	# ================ wrappers ================
 	def close(self) -> None:
 		''' Close the serial connection. Must call at the end of program execution to ensure \
@@ -168,8 +339,75 @@ class TempControllerCN0391:
 		'''
 		return self.serial.is_active()
 	
+	def start_reader(self, maxlen:int = SerialReader._MAXLEN) -> SerialReader.SerialReader:
+		'''Start a thread that continuously reads the replies of the Arduino. Required by
+		`poll_filter()` and `poll_raw()`. See `SerialCommunication.start_reader()`
+		
+		Parameters
+		----------
+		maxlen: int
+			Number of parsed lines kept in the ring buffer of the thread
+		
+		Returns
+		-------
+		reader: SerialReader
+			Thread that reads the port. Unsolicited messages are available with `get_event()`
+		'''
+		return self.serial.start_reader(maxlen)
+	
+	
+	def stop_reader(self) -> None:
+		'''Stop the thread that reads the replies of the Arduino
+		'''
+		self.serial.stop_reader()
+	
+	
+	@contextmanager
+	def pipeline(self):
+		'''Context manager that sends setters without waiting for their replies. Several commands
+		are in flight at once and all replies are awaited when the block exits. Getters called 
+		inside the block still return their values. If the block raises, the replies are not 
+		awaited: the pending setters are cancelled and the exception of the block is raised. 
+		For example:
+		
+		```python
+		with controller.pipeline():
+			controller.set_pid(0, 10, 0.1, 20)
+			controller.set_timeout(0, 600)
+		```
+		'''
+		if self._pipeline != None:		# nested blocks share the outer pipeline
+			yield self
+			return
+		
+		self._pipeline = []
+		try:
+			yield self
+		except BaseException:
+			replies, self._pipeline = self._pipeline, None
+			self.serial.cancel(replies)
+			raise
+		
+		replies, self._pipeline = self._pipeline, None
+		for reply in replies:
+			reply.result()
+	
+	
+	def set_binary(self, enable:bool = True) -> bool:
+		'''Select binary replies (True) or CSV replies (False). Binary replies are about half as
+		long, which shortens every round trip. See `SerialCommunication.set_binary()`
+		
+		Returns
+		-------
+		is_binary: bool
+			Whether the replies are binary. False if the firmware does not support them.
+		'''
+		return self.serial.set_binary(enable)
+	
+	
 	def send_serial_command(self, cmd:str) -> str:
-		''' Send an arbitrary serial command and receive a reply from the Arduino
+		''' Send an arbitrary serial command and receive a reply from the Arduino. The cached 
+		parameters are discarded, since the command may change any of them.
 		
 		Parameters
 		----------
@@ -181,9 +419,41 @@ class TempControllerCN0391:
 		reply : str
 			String that contains serial reply from the Arduino
 		'''
+		self.invalidate_cache()
 		return self._setter(cmd)
 	
 	
+	def invalidate_cache(self, cmd:str = None) -> None:
+		'''Discard parameters kept in memory so that the next getter reads them from the Arduino.
+		
+		Parameters that only change through setters (target, PID gains, input limits, filter 
+		gains, timeouts and sensor types) are read once and then updated by each setter once the 
+		Arduino acknowledges it, mirroring how the firmware normalizes the values. The following 
+		rules keep the cache consistent with the device:
+		
+		- Measurements (`get_filter`, `get_raw`, `get_timer`) are never cached.
+		- `get_enable` is served from memory only while no enabled channel has a finite timeout,
+		  since the firmware disables those channels on its own.
+		- A setter that fails, times out, or is too long for the input buffer of the Arduino 
+		  discards the parameter it targets. `send_serial_command` discards every parameter.
+		- Entries expire after `cache_ttl` seconds, if given.
+		
+		Call this function if the Arduino is configured by other means, such as another program
+		or a reset.
+		
+		Parameters
+		----------
+		cmd: str
+			Getter command whose reply is discarded. Ex: "4,0". Discards every parameter if \
+			none is given.
+		'''
+		with self._cache_lock:
+			if cmd == None:
+				self._cache.clear()
+			else:
+				self._cache.pop(cmd, None)
+	
+	
 	# ================ functions ================
 		# private
 	def _getter(self, cmd:str, out:str = None) -> str | list | dict:
@@ -193,7 +463,7 @@ class TempControllerCN0391:
 		----------
 		cmd: str
 			String that contains serial command
-
+		
 		out: str
 			Optional parameter. Specifies the type of output after parsing the string.
 			Can be: None, "param", "str", "str_arr"
@@ -206,25 +476,153 @@ class TempControllerCN0391:
 		
 		param : list[float]
 			returns list[float] of the captured coefficients received from the arduino
-			
+		
 		str : str
 			returns the raw string received via serial
 		
 		str_arr : list[str]
 			returns the received serial command split by a comma (,) delimiter 
 		'''
-		self.serial.write_serial(cmd)
-		return self.serial.read_data(out)
+		return self.serial.request_data(cmd, out)
 	
 	
 	def _setter(self, cmd:str) -> str:
 		''' Private function to send an arbitrary serial command a receive the raw reply. \
-		    See: send_serial_command()
+		    See: send_serial_command(). Returns a pending reply within `pipeline()`, and `None`
+		    during the dry run of `apply_json_coefficients()`.
 		'''
-		self.serial.write_serial(cmd)
-		return self.serial.read_serial()	# recognize message is received
+		if self._commands != None:
+			self._commands.append(cmd)
+			if self._dry_run:
+				return None
+		
+		if self._pipeline != None:
+			reply = self.serial.submit(cmd)
+			self._pipeline.append(reply)
+			return reply
+		
+		return self.serial.request(cmd)		# returns once the reply is received
 	
 	
+	def _lookup(self, cmd:str) -> list | None:
+		''' Private function that returns the cached reply of a getter, or `None` if there is no
+		valid entry. See: invalidate_cache()
+		'''
+		with self._cache_lock:
+			entry = self._cache.get(cmd)
+		if entry == None:
+			return None
+		
+		data, stored = entry
+		if self.cache_ttl != None and time.monotonic() - stored >= self.cache_ttl:
+			return None
+		return list(data)		# callers cannot modify the cache
+	
+	
+	def _store(self, cmd:str, data:list) -> None:
+		''' Private function that caches the reply of a getter
+		'''
+		with self._cache_lock:
+			self._cache[cmd] = ( list(data), time.monotonic() )
+	
+	
+	def _cached_getter(self, cmd:str, out:str = 'param') -> list:
+		''' Private function that returns the reply of a getter from memory, or reads it from the 
+		Arduino and caches it. See: _getter()
+		'''
+		data = self._lookup(cmd)
+		if data == None:
+			data = self._getter(cmd, out)
+			self._store(cmd, data)
+		return list(data)
+	
+	
+	def _cached_setter(self, cmd:str, getter:str, update) -> str:
+		''' Private function that sends a setter and updates the cached reply of a getter once 
+		the Arduino acknowledges it.
+		
+		Parameters
+		----------
+		cmd: str
+			String that contains serial command
+		
+		getter: str
+			Getter command whose reply changes. Ex: "4,0"
+		
+		update: function
+			Function that receives the cached reply (or `None`) and returns the new reply \
+			(or `None` if it is unknown)
+		'''
+		ack = SerialCodec._LABELS[ int(cmd.partition(",")[0]) ]
+		
+		# runs on the reader thread when the reply is pending. See: pipeline()
+		def apply(reply:str) -> None:
+			with self._cache_lock:
+				data = update( self._lookup(getter) ) if reply == ack else None
+				if data == None:
+					self.invalidate_cache(getter)
+				else:
+					self._store(getter, data)
+		
+		# long commands are split by the Arduino and may be truncated
+		if len(cmd) > ArduinoSerial._BUFFER_SIZE:
+			update = lambda data: None
+		
+		try:
+			reply = self._setter(cmd)
+		except Exception:
+			self.invalidate_cache(getter)
+			raise
+		
+		if reply == None:		# not sent. See: apply_json_coefficients()
+			return reply
+		elif isinstance(reply, str):
+			apply(reply)
+		else:			# reply is pending. See: pipeline()
+			self.invalidate_cache(getter)
+			reply.add_done_callback( lambda future: \
+			                         None if future.exception() != None else apply(future.result()) )
+		return reply
+	
+	
+	def _poll(self, cmd:str, func:str) -> list | None:
+		''' Private function that requests a measurement without waiting for the reply. Returns the
+		newest measurement that has not been returned before, or `None` if there is none. 
+		
+		Parameters
+		----------
+		cmd: str
+			String that contains serial command
+		
+		func: str
+			Label of the reply of the Arduino. Ex: "FILTER"
+		'''
+		if self.serial.reader == None:
+			raise RuntimeError("The reader thread is not active. Call start_reader() first")
+		
+		reply, count, sent = self._polls.get(cmd, (None, 0, 0))
+		
+		# a reply that is lost never arrives. Waiting past the deadline fails every pending
+		# command, since the replies after it can no longer be matched.
+		if reply != None and not reply.done() and time.monotonic() - sent >= self.serial.deadline:
+			try:
+				reply.result(0)
+			except TimeoutError:
+				pass
+		
+		if reply == None or reply.done():
+			reply = self.serial.submit(cmd)
+			sent = time.monotonic()
+		
+		data = self.serial.reader.latest(func)
+		if data == None or data['count'] == count:
+			self._polls[cmd] = (reply, count, sent)
+			return None
+		
+		self._polls[cmd] = (reply, data['count'], sent)
+		return data['param']
+		
+		
 		# sensor
 	def get_filter(self) -> list:
 		'''Gets the temperature measurements that have been smoothed by a kalman filter
@@ -250,6 +648,60 @@ class TempControllerCN0391:
 		return self._getter(cmd, out='param')
 	
 	
+	def get_filter_into(self, out:object, offset:int = 0) -> object:
+		'''Same as `get_filter()`, but the temperatures are written into a preallocated array. 
+		Intended for high-rate polling. See `SerialCommunication.request_into()`
+		
+		Parameters
+		----------
+		out: array
+			Array with room for the temperature of each port after `offset`. Ex: \
+			`array('f', [0]*4)` or a row of a NumPy array
+		
+		offset: int
+			Index of `out` where the temperature of the first port is written
+		
+		Returns
+		-------
+		out: array
+			Same array that is passed in
+		'''
+		return self.serial.request_into("0", out, offset)
+	
+	
+	def get_raw_into(self, out:object, offset:int = 0) -> object:
+		'''Same as `get_raw()`, but the temperatures are written into a preallocated array. 
+		See `get_filter_into()`
+		'''
+		return self.serial.request_into("1", out, offset)
+	
+	
+	def poll_filter(self) -> list | None:
+		'''Non-blocking version of `get_filter()`. Requests a new measurement if none is pending
+		and returns the newest one that was not returned before. Requires `start_reader()`. 
+		A request whose reply does not arrive within the deadline of the connection is sent again.
+		
+		Returns
+		-------
+		temp: list[float]
+			Temperature of each port: [port1, port2, port3, port4]. `None` if no new measurement
+			has arrived.
+		'''
+		return self._poll("0", "FILTER")
+	
+	
+	def poll_raw(self) -> list | None:
+		'''Non-blocking version of `get_raw()`. See `poll_filter()`
+		
+		Returns
+		-------
+		temp: list[float]
+			Temperature of each port: [port1, port2, port3, port4]. `None` if no new measurement
+			has arrived.
+		'''
+		return self._poll("1", "RAW")
+	
+	
 	def get_target(self) -> list:
 		'''Gets the target temperatures of the PID controllers
 		
@@ -259,9 +711,9 @@ class TempControllerCN0391:
 			Target temperature of each port: [port1, port2, port3, port4]
 		'''
 		cmd = "2"
-		return self._getter(cmd, out='param')
-	
-	
+		return self._cached_getter(cmd)
+		
+		
 		# target
 	def set_target(self, ch:int, target:float) -> None: 
 		'''Sets the target temperature of the PID controller of a specific port
@@ -277,7 +729,7 @@ class TempControllerCN0391:
 		target = round_input(target)
 		
 		cmd = "3," + str(ch) + "," + str(target) 
-		self._setter(cmd) 
+		self._cached_setter(cmd, "2", lambda data: _set_item(data, ch, target))
 	
 	
 	def set_target_all(self, targ0:float, targ1:float, targ2:float, targ3:float) -> None: 
@@ -301,11 +753,11 @@ class TempControllerCN0391:
 		targ1 = round_input(targ1)
 		targ2 = round_input(targ2)
 		targ3 = round_input(targ3)
-
+		
 		cmd = "3,4," + str(targ0) + "," + str(targ1) + "," + str(targ2) + "," + str(targ3)
-		self._setter(cmd)
-	
-	
+		self._cached_setter(cmd, "2", lambda data: [targ0, targ1, targ2, targ3])
+		
+		
 		# PID controller
 	def get_pid(self, ch:int) -> list:
 		'''Gets the PID coefficients of a specific channel
@@ -320,7 +772,7 @@ class TempControllerCN0391:
 			values in the order: [Proportional, Integral, Derivative]
 		'''
 		cmd = "4," + str(ch)
-		return self._getter(cmd, out='param')
+		return self._cached_getter(cmd)
 	
 	
 	def set_pid(self, ch:int, kp:float, ki:float, kd:float) -> None:
@@ -345,10 +797,10 @@ class TempControllerCN0391:
 		kd = round_input(kd)
 		
 		cmd = "5," + str(ch) + "," + str(kp) + "," + str(ki) + "," + str(kd)
-		self._setter(cmd)
+		self._cached_setter(cmd, "4," + str(ch), lambda data: [kp, ki, kd])
 		self._set_pid_json(ch, kp, ki, kd)
-	
-	
+		
+		
 			# input limits
 	def get_in_limit(self, ch:int) -> list:
 		"""Gets the target temperature limits (in Celsius) for the PID controller 
@@ -365,7 +817,7 @@ class TempControllerCN0391:
 			values in the order: [input_max, input_min]
 		"""
 		cmd = "6," + str(ch)
-		return self._getter(cmd, out='param')
+		return self._cached_getter(cmd)
 	
 	
 	def set_in_limit(self, ch:int, imax:float, imin:float) -> None:
@@ -387,10 +839,10 @@ class TempControllerCN0391:
 		imin = round_input(imin)
 		
 		cmd = "7," + str(ch) + "," + str(imax) + "," + str(imin)
-		self._setter(cmd)
+		self._cached_setter(cmd, "6," + str(ch), lambda data: _in_limits(imax, imin))
 		self._set_in_limit_json(ch, imax, imin)
-	
-	
+		
+		
 		# Filters
 			# alpha-beta
 	def get_ab_filter(self, ch:int) -> list:
@@ -408,7 +860,7 @@ class TempControllerCN0391:
 			 values in the order: [alpha, beta]
 		'''
 		cmd = "8," + str(ch)
-		return self._getter(cmd, out='param')
+		return self._cached_getter(cmd)
 	
 	
 	def set_ab_filter(self, ch:int, alpha:float, beta:float) -> None:
@@ -430,10 +882,10 @@ class TempControllerCN0391:
 		beta = round_input(beta)
 		
 		cmd = "9," + str(ch) + "," + str(alpha) + "," + str(beta)
-		self._setter(cmd)
+		self._cached_setter(cmd, "8," + str(ch), lambda data: [_limit(alpha), _limit(beta)])
 		self._set_ab_filter_json(ch, alpha, beta)
-	
-	
+		
+		
 			# kalman
 	def get_k_filter(self, ch:int) -> list:
 		'''Gets the coefficients of the kalman filter assigned to the temperature \
@@ -450,7 +902,7 @@ class TempControllerCN0391:
 			values in the order: [error, noise]
 		'''
 		cmd = "10," + str(ch)
-		return self._getter(cmd, out='param')
+		return self._cached_getter(cmd)
 	
 	
 	def set_k_filter(self, ch:int, error:float, noise:float) -> None:
@@ -473,7 +925,7 @@ class TempControllerCN0391:
 		noise = round_input(noise)
 		
 		cmd = "11," + str(ch) + "," + str(error) + "," + str(noise)
-		self._setter(cmd)
+		self._cached_setter(cmd, "10," + str(ch), lambda data: _k_gains(error, noise))
 		self._set_k_filter_json(ch, error, noise)
 	
 	
@@ -492,8 +944,8 @@ class TempControllerCN0391:
 		
 		cmd = "12," + str(ch) + "," + str(value)
 		self._setter(cmd)
-	
-	
+		
+		
 		# Sensors
 	def get_sensor_type(self) -> list: 	# NOTE: returns characters
 		'''Retrieves the sensor type (N, K, J, etc) that was assigned \
@@ -505,9 +957,13 @@ class TempControllerCN0391:
 			Sensor type of each port: [port1, port2, port3, port4]
 		'''
 		cmd = "13"
-		return self._getter(cmd, out='str_arr')[1:]
-	
-	
+		data = self._lookup(cmd)
+		if data == None:
+			data = self._getter(cmd, out='str_arr')[1:]
+			self._store(cmd, data)
+		return data
+		
+		
 		#Enable / Disable controllers
 	def set_enable(self, ch:int) -> None:
 		'''Enables the PID controller of a specific channel
@@ -518,7 +974,7 @@ class TempControllerCN0391:
 			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
 		'''
 		cmd = "14," + str(ch)
-		self._setter(cmd)
+		self._cached_setter(cmd, "16", lambda data: _set_item(data, ch, True))
 		self._set_enable_json(ch)
 	
 	
@@ -526,7 +982,7 @@ class TempControllerCN0391:
 		''' Enables the PID controller of every channel
 		'''
 		cmd = "14,4"
-		self._setter(cmd)
+		self._cached_setter(cmd, "16", lambda data: [True]*4)
 		self._set_enable_all_json()
 	
 	
@@ -539,7 +995,7 @@ class TempControllerCN0391:
 			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
 		'''
 		cmd = "15," + str(ch)
-		self._setter(cmd)
+		self._cached_setter(cmd, "16", lambda data: _set_item(data, ch, False))
 		self._set_disable_json(ch)
 	
 	
@@ -547,7 +1003,7 @@ class TempControllerCN0391:
 		''' Disables the PID controller of every channel
 		'''
 		cmd = "15,4"
-		self._setter(cmd)
+		self._cached_setter(cmd, "16", lambda data: [False]*4)
 		self._set_disable_all_json()
 	
 	
@@ -561,10 +1017,20 @@ class TempControllerCN0391:
 			condition of each port: [port1, port2, port3, port4]
 		'''
 		cmd = "16"
+		data = self._lookup(cmd)
+		timeout = self._lookup("18")
+		
+		# enabled channels with a finite timeout are disabled by the Arduino
+		if data != None and timeout != None and \
+		   all( not enable or limit == _TIME_INF for enable, limit in zip(data, timeout) ):
+			return data
+		
 		data = self._getter(cmd, out='param')
 		#[FORLOOP]
-		return [elem == True for elem in data]
-	
+		data = [elem == True for elem in data]
+		self._store(cmd, data)
+		return data
+		
 		# timers
 	def get_timer(self) -> list:
 		'''Retrieves the time (in seconds) each port has been actively controlling its temperature.
@@ -587,7 +1053,7 @@ class TempControllerCN0391:
 			Time each port can be active: [port1, port2, port3, port4]
 		'''
 		cmd = "18"
-		return self._getter(cmd, out='param')
+		return self._cached_getter(cmd)
 	
 	
 	def set_timeout(self, ch:int, time:float) -> None:
@@ -604,7 +1070,7 @@ class TempControllerCN0391:
 		time = round_input(time)
 		
 		cmd = "19," + str(ch) + "," + str(time)
-		self._setter(cmd)
+		self._cached_setter(cmd, "18", lambda data: _set_item(data, ch, time))
 		self._set_timeout_json(ch, time)
 	
 	
@@ -617,7 +1083,7 @@ class TempControllerCN0391:
 			Channel of the Temperature shield. Options are: {0, 1, 2, 3}
 		'''
 		cmd = "19," + str(ch) + ",-1"	# send value for infinite time. See `Commands.h`
-		self._setter(cmd)
+		self._cached_setter(cmd, "18", lambda data: _set_item(data, ch, _TIME_INF))
 		self._set_timeout_inf_json(ch)
 	
 	
@@ -639,34 +1105,106 @@ class TempControllerCN0391:
 	
 	def _set_json_coefficients(self) -> None:
 		'''Load the coefficients contained in the JSON file. Requires Calling `_load_json_file` \
-		beforehand. Will not work otherwise. 
+		beforehand. Will not work otherwise. Only the parameters that differ from those on the 
+		Arduino are sent. See `apply_json_coefficients()`
 		'''
-		# retrieve data
-		parameters = self.json_data["parameters"]
+		self.apply_json_coefficients()
+	
+	
+	def apply_json_coefficients(self, dry_run:bool = False) -> dict:
+		'''Make the parameters on the Arduino match those of the internal JSON buffer. The current
+		parameters are read in one batch (see `get_device_snapshot()`), and only the setters of
+		the parameters that differ are sent. Values are compared after the rounding and limits
+		that the Arduino applies, so a parameter the firmware normalizes is not sent again. 
+		Timeouts the firmware rejects (zero or negative, other than -1) are skipped.
+		Channels that are enabled in the JSON buffer are enabled, but channels that are disabled
+		in it are not disabled on the Arduino.
+		
+		Parameters
+		----------
+		dry_run: bool
+			Whether the commands are only planned (True) or also sent (False)
 		
+		Returns
+		-------
+		report: dict
+			Dictionary with the fields:
+			
+			- `commands`: List with the serial commands, in the order they are sent
+			- `bytes_sent`: Bytes written to the Arduino
+			- `bytes_received`: Bytes of the replies of the Arduino
+			- `wire_time`: Estimated time (in seconds) to transfer the commands and replies at \
+			  the baud rate. The Arduino also executes one command per iteration of its loop.
+		'''
+		snapshot = self.get_device_snapshot()
+		parameters = json.loads( json.dumps(self.json_data["parameters"]) )	# hard copy
+		
+		self._commands = []
+		self._dry_run = dry_run
+		try:
+			with self.pipeline():
+				self._apply_json_diff(snapshot)
+			commands = self._commands
+		finally:
+			self._commands = None
+			self._dry_run = False
+			if dry_run:		# setters also store their values in the buffer
+				self.json_data["parameters"] = parameters
+		
+		# 8N1 framing: start bit, 8 data bits and stop bit per byte
+		bytes_sent = sum( len(cmd) + len(ArduinoSerial._END_CHAR) for cmd in commands )
+		bytes_received = sum( self._reply_size(cmd) for cmd in commands )
+		wire_time = 10*(bytes_sent + bytes_received) / self.json_data["baud_rate"]
+		
+		return {"commands":       commands,
+		        "bytes_sent":     bytes_sent,
+		        "bytes_received": bytes_received,
+		        "wire_time":      wire_time }
+	
+	
+	def _reply_size(self, cmd:str) -> int:
+		'''Private function that returns the size (in bytes) of the acknowledgement of a setter.
+		'''
+		ack = SerialCodec._LABELS[ int(cmd.partition(",")[0]) ]
+		if self.serial.codec.binary:
+			return len( SerialCodec.encode_reply(ack) )
+		return len(ack) + 2		# Serial.println() ends with "\r\n"
+	
+	
+	def _apply_json_diff(self, snapshot:DeviceSnapshot) -> None:
+		'''Private function that sends the setters of the parameters of the JSON buffer that 
+		differ from a snapshot of the Arduino.
+		'''
 		#[FORLOOP]
-		for channel, param in enumerate(parameters):
-			# load paramters
-			kp    = param["kp"]
-			ki    = param["ki"]
-			kd    = param["kd"]
-			alpha = param["alpha"]
-			beta  = param["beta"]
-			error = param["error"]
-			noise = param["noise"]
-			imax  = param["imax"]
-			imin  = param["imin"]
-			timeout = param["timeout"]
-			enable  = param["enable"]
+		for channel, param in enumerate( self.json_data["parameters"] ):
+			current = snapshot.channels[channel]
+			
+			# values stored by the Arduino
+			kp, ki, kd  = [ round_input(param[key]) for key in ("kp", "ki", "kd") ]
+			alpha, beta = [ round_input(param[key]) for key in ("alpha", "beta") ]
+			error, noise = [ round_input(param[key]) for key in ("error", "noise") ]
+			imax, imin  = [ round_input(param[key]) for key in ("imax", "imin") ]
+			timeout = round_input(param["timeout"])
+			enable = bool(param["enable"])
 			
 			# write state
-			self.set_pid(channel, kp, ki, kd)
-			self.set_ab_filter(channel, alpha, beta)
-			self.set_k_filter(channel, error, noise)
-			self.set_in_limit(channel, imax, imin)
-			self.set_timeout(channel, timeout)
+			if [kp, ki, kd] != [current.kp, current.ki, current.kd]:
+				self.set_pid(channel, kp, ki, kd)
+			
+			if [_limit(alpha), _limit(beta)] != [current.alpha, current.beta]:
+				self.set_ab_filter(channel, alpha, beta)
+			
+			if _k_gains(error, noise) != [current.error, current.noise]:
+				self.set_k_filter(channel, error, noise)
 			
-			if enable:
+			if _in_limits(imax, imin) != [current.imax, current.imin]:
+				self.set_in_limit(channel, imax, imin)
+			
+			if (timeout > 0 or timeout == _TIME_INF) and timeout != current.timeout:
+				self.set_timeout(channel, timeout)
+			
+			# as in a full load, a disabled channel in the JSON buffer is left running
+			if enable and not current.enable:
 				self.set_enable(channel)
 	
 	
@@ -731,6 +1269,103 @@ class TempControllerCN0391:
 	
 	#-- functions to store state in JSON file:
 	
+	def get_device_snapshot(self) -> DeviceSnapshot:
+		'''Retrieves every parameter loaded on the Arduino in a single batch. The firmware replies
+		with the parameters of all channels at once (`GET_PARAMETERS`), so the batch costs two
+		iterations of its loop instead of one per getter. Older firmware answers `BAD_COMMAND`,
+		in which case every getter is sent at once instead.
+		
+		Returns
+		-------
+		snapshot: DeviceSnapshot
+			Sensor types and the parameters of each port
+		
+		Raises
+		------
+		ValueError
+			If a reply does not have the expected layout
+		'''
+		# See: arduino/Commands.h
+		replies = [ self.serial.submit("13"), self.serial.submit("21") ]
+		sensor_types = self.serial._parse_serial_string(replies[0].result(), 'str_arr')[1:]
+		
+		if replies[1].result() != 'BAD_COMMAND':
+			channels = self._parse_parameters( replies[1].result() )
+		else:
+			# every getter is in flight at once
+			replies = [ self.serial.submit(cmd) for cmd in _CHANNEL_GETTERS ]
+			channels = self._parse_getters( [ reply.result() for reply in replies ] )
+		
+		snapshot = DeviceSnapshot(sensor_types, channels)
+		self._cache_snapshot(snapshot)
+		return snapshot
+	
+	
+	def _cache_snapshot(self, snapshot:DeviceSnapshot) -> None:
+		'''Private function that caches the parameters of a snapshot as the replies of the
+		getters. See: invalidate_cache()
+		'''
+		self._store("13", snapshot.sensor_types)
+		self._store("16", [ param.enable for param in snapshot.channels ])
+		self._store("18", [ param.timeout for param in snapshot.channels ])
+		
+		#[FORLOOP]
+		for ch, param in enumerate(snapshot.channels):
+			self._store("4," + str(ch), [param.kp, param.ki, param.kd])
+			self._store("8," + str(ch), [param.alpha, param.beta])
+			self._store("10," + str(ch), [param.error, param.noise])
+			self._store("6," + str(ch), [param.imax, param.imin])
+	
+	
+	def _parse_parameters(self, string:str) -> list:
+		'''Private function that converts the reply of `GET_PARAMETERS` into the parameters of 
+		each channel
+		
+		Returns
+		-------
+		channels: list(ChannelParameters)
+		'''
+		func, count = ArduinoSerial._REPLY_FIELDS[21]
+		data = [0.0]*count
+		self.serial.parse_into(string, data, func, count)
+		
+		size = len( fields(ChannelParameters) )
+		channels = []
+		
+		#[FORLOOP]
+		for ch in range(0, 4):
+			*values, enable = data[size*ch : size*(ch + 1)]
+			channels.append( ChannelParameters(*values, enable=enable == True) )
+		return channels
+	
+	
+	def _parse_getters(self, strings:list) -> list:
+		'''Private function that converts the replies of `_CHANNEL_GETTERS` into the parameters of
+		each channel
+		
+		Returns
+		-------
+		channels: list(ChannelParameters)
+		'''
+		data = []
+		for cmd, string in zip(_CHANNEL_GETTERS, strings):
+			func, count = ArduinoSerial._REPLY_FIELDS[ int(cmd.partition(",")[0]) ]
+			values = [0.0]*count
+			self.serial.parse_into(string, values, func, count)
+			data.append(values)
+		
+		is_enabled, timeout = data[0], data[1]
+		channels = []
+		
+		#[FORLOOP]
+		for ch in range(0, 4):
+			pid, ab_filter, k_filter, in_limit = data[2 + 4*ch : 6 + 4*ch]
+			channels.append( ChannelParameters(*pid, *ab_filter, *k_filter, *in_limit, \
+			                                   timeout=timeout[ch], \
+			                                   enable=is_enabled[ch] == True) )
+		return channels
+	
+	
 	def _get_device_coefficients(self) -> None:
 		'''Gets the coefficients currently loaded on the Arduino and saves them to an internal 
 		buffer on the device running this python module. This buffer can then be stored
@@ -744,34 +1379,13 @@ class TempControllerCN0391:
 		Python API with whatever changes happened beforehand. Its assumed one call before other
 		commands are sent is enough to ensure synchronization.
 		'''
-		# get enabled ports
-		is_enabled = self.get_enable()
-		timeout = self.get_timeout()
+		snapshot = self.get_device_snapshot()
 		
 		#[FORLOOP]
-		for ch in range(0, 4):
-			if is_enabled[ch]:
-				self._set_enable_json(ch)
-			else:
-				self._set_disable_json(ch)
-			
-			# set state
-				# pid
-			var = self.get_pid(ch)
-			self._set_pid_json( ch, var[0], var[1], var[2] )
-				# alpha-beta filter
-			var = self.get_ab_filter(ch)
-			self._set_ab_filter_json( ch, var[0], var[1] )
-				# kalman filter
-			var = self.get_k_filter(ch)
-			self._set_k_filter_json( ch, var[0], var[1] )
-				# input limits
-			var = self.get_in_limit(ch)
-			self._set_in_limit_json( ch, var[0], var[1] )
-				# timeout
-			self._set_timeout_json( ch, timeout[ch] )
-		
-		
+		for ch, param in enumerate(snapshot.channels):
+			self.json_data["parameters"][ch].update( param.to_json() )
+	
+	
 	def _set_pid_json(self, ch:int, kp:float, ki:float, kd:float) -> None:
 		'''Stores the PID coefficients in a dictionary
 		
@@ -1,12 +1,10 @@
 # Global libraries
-import matplotlib.pyplot as plt
-import numpy as np
 import time
 import argparse
 
 # local file
-from comms import KeyboardThread as kb
 import TempControllerCN0391 as cntl
+import MeasureLog as ml
 
 ## NOTE: remove CLI interface from basic operation. Split into two files.
 ## Turn this file into a backend plotting function.
@@ -17,6 +15,16 @@ import TempControllerCN0391 as cntl
 
 ## Need to print temperature output to csv file.
 
+# NOTE: matplotlib, numpy and the keyboard thread are imported by the modes that plot. Modes that
+#       only send commands or save the configuration start without them. 
+#       See: benchmark.py -> bench_startup()
+
+#--- CONSTANTS ---
+_FLUSH = 1 		# seconds | Time between writes of the measurement file to disk in headless mode
+_LOG_FORMATS = ("text", "binary") 	# See: MeasureLog
+_DECIMATION = ("minmax", "lttb", "none") 	# See: Decimate
+_LATE = 0.1 	# fraction | Delay, relative to the period, after which a sample counts as late
+
 #===================================================================================================
 
 def list_of_floats(string: str) -> list:
@@ -55,6 +63,30 @@ def positive_int(string: str) -> int:
 		return 1
 
 
+def positive_float(string: str) -> float:
+	'''Converts a string to a number that is greater than zero. 
+	
+	Parameters
+	----------
+	string: str
+		String that contains a number
+	
+	Returns
+	-------
+	num : float
+		Number greater than zero
+	
+	Raises
+	------
+	argparse.ArgumentTypeError
+		If the number is zero or negative
+	'''
+	num = float(string)
+	if not num > 0:
+		raise argparse.ArgumentTypeError(f"must be greater than zero: {string}")
+	return num
+
+
 def captureInputs() -> object: 
 	'''Captures command line parameters provided by the user when calling the script. 
 	For example:
@@ -88,6 +120,51 @@ def captureInputs() -> object:
 		Optional parameter for the number of data samples used to initially configure the plots. \
 		Must be larger than zero. 
 	
+	resume : bool
+		Optional flag to reuse the sensor types and calibration of an Arduino that is running.
+	
+	command : list(str)
+		Optional serial commands that are sent without plotting. Can be repeated.
+	
+	save_json : str
+		Optional path where the configuration of the Arduino is saved without plotting.
+	
+	headless : bool
+		Optional flag to record measurements at a fixed rate without plotting.
+	
+	rate : float
+		Optional parameter for the number of measurements per second in headless mode, and the
+		expected number in the plot.
+	
+	raw : bool
+		Optional flag to also record the raw measurements in headless mode.
+	
+	duration : float
+		Optional parameter for the time the headless mode records. Runs until interrupted \
+		(Ctrl+C) if not provided.
+	
+	binary : bool
+		Optional flag to request binary replies from the Arduino in headless mode.
+	
+	log_format : str
+		Optional parameter for the format of the measurement file: "text" or "binary".
+	
+	rotate_bytes : int
+		Optional parameter for the size of the measurement file after which a new one is started.
+	
+	rotate_seconds : float
+		Optional parameter for the time after which a new measurement file is started.
+	
+	keep_segments : int
+		Optional parameter for the number of measurement files kept when they are rotated.
+	
+	decimation : str
+		Optional parameter for the method that reduces the plotted points: "minmax", "lttb" or \
+		"none".
+	
+	stats : list(float)
+		Optional parameter for the time windows of the rolling statistics of each channel.
+	
 	Returns
 	-------
 	data : object
@@ -112,20 +189,77 @@ def captureInputs() -> object:
 	
 	parser.add_argument('--window', type=float, default=120, \
 	                    help="Width of time window shown in the X axis (Seconds)")
-
+	
 	parser.add_argument('--nsamples', type=positive_int, default=10, \
 	                    help="Number of data samples used to initialize the plot. Must be \
 	                         larger than zero")
+	
+	parser.add_argument('--decimation', type=str, default="minmax", \
+	                    choices=_DECIMATION, \
+	                    help="Method that reduces long time windows to about one point per \
+	                          pixel. 'minmax' keeps every spike")
+	
+	parser.add_argument('--stats', type=list_of_floats, default=None, \
+	                    help="Time windows (Seconds) of the rolling statistics of each channel. \
+	                          Type 'stats' while plotting to print them; printed at exit in \
+	                          headless mode. Ex: --stats 60,600")
 	# Data
 	parser.add_argument('--path_measure', type=str, default="./temp-measure.txt", \
 	                    help="Path to the file that stores temperature measurements")
 	
+	parser.add_argument('--log_format', type=str, default="text", choices=_LOG_FORMATS, \
+	                    help="Format of the measurement file. Binary files are compact, are \
+	                          appended to, and are read with MeasureLog.read_log()")
+	
+	parser.add_argument('--rotate_bytes', type=positive_int, default=None, \
+	                    help="Start a new measurement file after this size (bytes). Completed \
+	                          files are compressed and listed in a manifest")
+	
+	parser.add_argument('--rotate_seconds', type=float, default=None, \
+	                    help="Start a new measurement file after this time (Seconds). Completed \
+	                          files are compressed and listed in a manifest")
+	
+	parser.add_argument('--keep_segments', type=positive_int, default=None, \
+	                    help="Number of measurement files kept when they are rotated. The oldest \
+	                          are deleted. All are kept if not provided")
+	
+	parser.add_argument('--resume', action='store_true', \
+	                    help="Reuse the configuration of an Arduino that is already running \
+	                          instead of resetting it")
+	
+	# modes without plot
+	parser.add_argument('--command', type=str, action='append', default=[], \
+	                    help="Serial command sent to the Arduino instead of plotting. Can be \
+	                          repeated. Ex: --command 3,0,45")
+	
+	parser.add_argument('--save_json', type=str, default=None, \
+	                    help="Path to the JSON file where the configuration of the Arduino is \
+	                          saved instead of plotting")
+	
+	parser.add_argument('--headless', action='store_true', \
+	                    help="Record the measurements at a fixed rate instead of plotting. \
+	                          A summary is printed at exit")
+	
+	parser.add_argument('--rate', type=positive_float, default=1, \
+	                    help="Target number of measurements per second in headless mode. Also \
+	                          sizes the time window of the plot")
+	
+	parser.add_argument('--raw', action='store_true', \
+	                    help="Also record the raw measurements in headless mode")
+	
+	parser.add_argument('--duration', type=float, default=None, \
+	                    help="Time to record in headless mode (Seconds). Runs until Ctrl+C if \
+	                          not provided")
+	
+	parser.add_argument('--binary', action='store_true', \
+	                    help="Request binary replies from the Arduino in headless mode")
+	
 	# object with arguments
 	return parser.parse_args()
 
 #===================================================================================================
 
-def vert_array(arr:list) -> np.ndarray:
+def vert_array(arr:list) -> 'np.ndarray':
 	'''Convert an horizontal array into a vertical numpy array. This function is well suited to
 	transform parsed data into a form that is easily plotted by matplotlib. 
 	
@@ -134,6 +268,7 @@ def vert_array(arr:list) -> np.ndarray:
 	output : np.array
 		Numpy array with the shape: [[]...[]]
 	'''
+	import numpy as np
 	return np.array(arr).reshape(-1,1) 
 
 def round_string(elem:float) -> str:
@@ -152,9 +287,51 @@ def round_string(elem:float) -> str:
 	"""
 	return str( round(elem, cntl._DECIMAL_MAX) )
 
+
+def open_log(path:str, log_format:str, sensor_types:list, raw:bool = False, \
+             rotation:dict = None) -> object:
+	'''Open the file that stores the measurements. See `MeasureLog`
+	
+	Parameters
+	----------
+	path : str
+		Path to the file
+	
+	log_format : str
+		"text" or "binary"
+	
+	sensor_types : list(str)
+		Sensor type of each port. Stored in the header of binary files.
+	
+	raw : bool
+		Whether the raw measurement of each port follows the filtered ones.
+	
+	rotation : dict
+		Arguments of `RotatingLog`: `max_bytes`, `max_age` and `keep`. The measurements are \
+		split into segments if any of them is given.
+	
+	Returns
+	-------
+	log : MeasureLog | TextLog | RotatingLog
+	'''
+	columns = [ f"temp_ch{i}" for i in range(len(sensor_types)) ]
+	if raw:
+		columns += [ f"raw_ch{i}" for i in range(len(sensor_types)) ]
+	
+	def open_file(path:str) -> object:
+		if log_format == "binary":
+			return ml.MeasureLog(path, channels=len(columns), sensor_types=sensor_types)
+		return ml.TextLog(path, columns)
+	
+	if rotation != None and any( value != None for value in rotation.values() ):
+		return ml.RotatingLog(path, open_file, **rotation)
+	return open_file(path)
+
 #===================================================================================================
 
-def main(port:str, path:str, window:float, ylims:list, nsamples:int, path_measure:str) -> None:
+def main(port:str, path:str, window:float, ylims:list, nsamples:int, path_measure:str, \
+         resume:bool = False, rate:float = 1, log_format:str = "text", \
+         rotation:dict = None, decimation:str = "minmax", stats:list = None) -> None:
 	'''Interactive plot that displays temperature measurement in real time. Terminal can be used
 	at the same time to send commands to the Arduino and modify the behavior of controller.
 	
@@ -174,47 +351,70 @@ def main(port:str, path:str, window:float, ylims:list, nsamples:int, path_measur
 	
 	nsamples : int
 		number of data samples used to generate the first points in the plot.
+	
+	resume : bool
+		whether to keep the calibration of a running Arduino instead of resetting it.
+	
+	rate : float
+		expected number of measurements per second. Sizes the buffers of the time window, which 
+		grow if more measurements arrive.
+	
+	log_format : str
+		format of the measurement file: "text" or "binary". See `MeasureLog`
+	
+	rotation : dict
+		optional rotation of the measurement file. See `open_log()`
+	
+	decimation : str
+		method that reduces the plotted points: "minmax", "lttb" or None. See `Decimate`
+	
+	stats : list(float)
+		time windows of the rolling statistics, which are printed when 'stats' is typed. Defaults 
+		to the plot window.
 	'''
+	import numpy as np
+	from comms import KeyboardThread as kb
+	import LivePlotter as lp
+	import ChannelMonitor as cm
+	
 	# ---- Serial ----
-	controller = cntl.TempControllerCN0391(port=port, path=path)
+	controller = cntl.TempControllerCN0391(port=port, path=path, resume=resume)
 	
 	# ---- keyboard inputs ----
 	keythread = kb.KeyboardThread(exit="exit") # starts thread automatically
 	
 	# ---- Plots ----
 	# Size of data
-	time_init = 0
-	time.sleep(2)			# wait for serial to reload
-	
+	if not resume:
+		time.sleep(2)		# wait for serial to reload
+		
 		# calibration 
 	y_init = sum( [vert_array(controller.get_filter()) for i in range(nsamples)] ) / nsamples
 	n_data = np.size(y_init)
 	
-	# figure
-	x = np.array( [] )
-	y = np.array( [] )
+	# open file
+	log = open_log(path_measure, log_format, controller.json_data["sensor_types"], \
+	               rotation=rotation)
 	
-	# plot graphs
-	figure, ax = plt.subplots()
-	lines = [ ax.plot(x, y, label=f'Channel {i}')[0] for i in range(n_data) ] 
-
-	#---- configure plot ----
-	ax.legend()
-	ax.set_xlim( [0, window] )
-	ax.set_ylim( ylims )
-	ax.set_xlabel("Seconds")
-	ax.set_ylabel("Celsius")
-
-	plt.ion()
-	plt.show()
+	# rolling statistics
+	monitor = cm.ChannelMonitor(n_data, stats if stats != None else [window], \
+	                            controller.get_target())
 	
-	# open file
-	file = open(path_measure, 'w')
-	file.write("==== seconds | celcius ====\n")
-	file.write("time, temp_ch0, temp_ch1, temp_ch2, temp_ch3\n")
+	def record(seconds:float, values:list) -> None:
+		log.write(seconds, values)
+		monitor.update(seconds, values)
+	
+	# read replies in the background so that commands do not wait for the serial port
+	controller.start_reader()
+	
+	# measurements are read by a thread, and drawn at a fixed frame rate by this one
+	acquisition = lp.Acquisition(controller.get_filter, window, rate, n_data, \
+	                             function=record, initial=list(y_init[:, 0]))
+	plotter = lp.LivePlotter(acquisition, window, ylims, decimation=decimation)
+	time_frame = time.monotonic()
 	
 	#---- loop ----
-	while controller.is_active(): 	# check connection
+	while controller.is_active() and acquisition.is_alive(): 	# check connection
 		try:
 			# ----- serial inputs -----
 			if keythread.flag():
@@ -222,67 +422,274 @@ def main(port:str, path:str, window:float, ylims:list, nsamples:int, path_measur
 				
 				if not keythread.is_active():
 					break
+				elif key_input == "stats":
+					monitor.set_targets( controller.get_target() )
+					for width in monitor.windows:
+						print( monitor.report(width) )
 				elif key_input != "":
 					reply = controller.send_serial_command(key_input)
 					print(reply)
 			
 			#----- plot -----
-			time_now = time.time()
+			plotter.render()
 			
-			if np.size(x) == 0: 
-				time_init = time_now
-				y_new = y_init
-				#y = y_init.copy()
-				y = y_new.copy()
+			time_frame += plotter.period
+			time_now = time.monotonic()
+			if time_frame > time_now:
+				time.sleep(time_frame - time_now)
 			else:
-				ynew = controller.get_filter()	# breaks when interrupt is called
-				ynew = vert_array(ynew)			# transform to vertical numpy array
-				y = np.hstack( (y, ynew) )
-			
-			time_zero = time_now - time_init
-			x = np.append(x, time_zero);
-			
-			if time_zero > window:
-				y = y[:, 1:] 				# delete first vertical slice
-				x = np.delete(x, 0)
-				ax.set_xlim( [ x[0], x[-1] ] )
-			
-			# update plots
-			for i in range(n_data):
-				lines[i].set_xdata(x)
-				lines[i].set_ydata( y[i] )
-			
-			figure.canvas.draw()
-			figure.canvas.flush_events()
-		
-			# save data to file
-			y_new_flat = y_new.flatten()
-			str_array = [round_string(num) for num in y_new_flat]
-			str_array = ",".join( str_array )
-			str_output = round_string( x[-1] ) + "," + str_array + "\n"
-			file.write(str_output)
+				time_frame = time_now 		# frame took longer than its period
 		
 		except:
 			print("Data Transfer Failed - Exiting")
 			break	# exit loop and ensure serial and thread shutdown
 	
+	if acquisition.error != None:
+		print("Data Transfer Failed - Exiting")
+	
 	#---- exit program ----
+	acquisition.stop()
+	log.close()
 	controller.set_disable_all()
 	controller.close()
 	keythread.stop()
-	file.close()
 	print("CLOSED-PYTHON")
 
+
+def send_commands(port:str, path:str, commands:list, save_json:str, resume:bool = False) -> None:
+	'''Send serial commands and save the configuration of the Arduino without plotting. Suited to 
+	scripts and scheduled tasks, since neither matplotlib nor numpy are loaded.
+	
+	Parameters
+	----------
+	port : str
+		path to the serial port that the Arduino is connected to.
+	
+	path : str
+		path to json file that contains the parameters to configure the controller.
+	
+	commands : list(str)
+		serial commands sent in order. The reply of each one is printed.
+	
+	save_json : str
+		path to the JSON file where the configuration is saved after the commands. Not saved if 
+		none is given.
+	
+	resume : bool
+		whether to keep the calibration of a running Arduino instead of resetting it.
+	'''
+	controller = cntl.TempControllerCN0391(port=port, path=path, resume=resume)
+	
+	try:
+		for cmd in commands:
+			print( controller.send_serial_command(cmd) )
+		
+		if save_json != None:
+			if commands:
+				controller._get_device_coefficients()	# commands may change any parameter
+			controller.save_json_file(save_json)
+	finally:
+		controller.close()
+
+
+def acquire(port:str, path:str, rate:float, path_measure:str, raw:bool = False, \
+            duration:float = None, resume:bool = False, binary:bool = False, \
+            log_format:str = "text", rotation:dict = None, stats:list = None) -> dict:
+	'''Record measurements at a fixed rate without plotting. Readings are scheduled on a monotonic
+	clock. A reading that starts after its scheduled time is late, and scheduled readings that 
+	could not be taken at all because earlier ones took too long are dropped. Readings continue 
+	until the duration elapses or the program is interrupted (Ctrl+C).
+	
+	Parameters
+	----------
+	port : str
+		path to the serial port that the Arduino is connected to.
+	
+	path : str
+		path to json file that contains the parameters to configure the controller.
+	
+	rate : float
+		target number of measurements per second.
+	
+	path_measure : str
+		path to the file that stores the measurements.
+	
+	raw : bool
+		whether the raw measurements are also recorded.
+	
+	duration : float
+		time (in seconds) to record. Records until interrupted if none is given.
+	
+	resume : bool
+		whether to keep the calibration of a running Arduino instead of resetting it.
+	
+	binary : bool
+		whether binary replies are requested from the Arduino.
+	
+	log_format : str
+		format of the measurement file: "text" or "binary". See `MeasureLog`
+	
+	rotation : dict
+		optional rotation of the measurement file. See `open_log()`
+	
+	stats : list(float)
+		optional time windows of the rolling statistics of each channel, which are printed at exit.
+	
+	Returns
+	-------
+	summary : dict
+		Dictionary with the fields `samples`, `elapsed` (seconds), `rate` and `target` (samples
+		per second), `late`, `dropped`, and the median and maximum duration of a reading 
+		`read_p50` and `read_max` (seconds).
+	
+	Raises
+	------
+	ValueError
+		If the rate is not greater than zero
+	'''
+	if not rate > 0:
+		raise ValueError(f"The rate must be greater than zero: {rate}")
+	
+	controller = cntl.TempControllerCN0391(port=port, path=path, resume=resume, binary=binary)
+	period = 1 / rate
+	
+	# open file
+	log = open_log(path_measure, log_format, controller.json_data["sensor_types"], raw, rotation)
+	
+	monitor = None
+	reads = []
+	late = 0
+	dropped = 0
+	index = 0 				# scheduled reading
+	elapsed = None
+	time_init = time.monotonic()
+	time_flush = time_init
+	
+	#---- loop ----
+	try:
+		# rolling statistics
+		if stats != None:
+			import ChannelMonitor as cm
+			channels = len(controller.json_data["sensor_types"]) * (2 if raw else 1)
+			monitor = cm.ChannelMonitor(channels, stats, controller.get_target())
+		
+		while True:
+			time_slot = time_init + index * period
+			time_now = time.monotonic()
+			
+			if duration != None and max(time_now, time_slot) - time_init >= duration:
+				elapsed = duration
+				break
+			
+			if time_now < time_slot:
+				time.sleep(time_slot - time_now)
+			elif time_now - time_slot >= period: 	# skip the readings that can no longer be taken
+				skipped = int( (time_now - time_slot) / period )
+				dropped += skipped
+				index += skipped
+				time_slot += skipped * period
+			
+			# ----- serial inputs -----
+			time_read = time.monotonic()
+			if time_read - time_slot > _LATE * period:
+				late += 1
+			
+			values = controller.get_filter()
+			if raw:
+				values = values + controller.get_raw()
+			
+			reads.append( time.monotonic() - time_read )
+			index += 1
+			
+			# save data to file
+			log.write(time_read - time_init, values)
+			if monitor != None:
+				monitor.update(time_read - time_init, values)
+			
+			if time_read - time_flush >= _FLUSH:
+				log.flush()
+				time_flush = time_read
+	
+	except KeyboardInterrupt:
+		pass
+	except:
+		print("Data Transfer Failed - Exiting")
+	
+	#---- exit program ----
+	finally:
+		if elapsed == None:
+			elapsed = time.monotonic() - time_init
+		log.close()
+		try:
+			controller.set_disable_all() 	# channels enabled by the json file stop heating
+		except Exception:
+			print("Failed to disable the channels")
+		finally:
+			controller.close()
+	
+	reads.sort()
+	summary = {"samples":  len(reads),
+	           "elapsed":  elapsed,
+	           "rate":     len(reads) / elapsed if elapsed > 0 else 0,
+	           "target":   rate,
+	           "late":     late,
+	           "dropped":  dropped,
+	           "read_p50": reads[len(reads) // 2] if reads else None,
+	           "read_max": reads[-1] if reads else None }
+	
+	print("==== summary ====")
+	print(f"samples: {summary['samples']} in {elapsed:.2f} s")
+	print(f"rate: {summary['rate']:.2f} Hz (target {rate:.2f} Hz)")
+	print(f"late: {late} | dropped: {dropped}")
+	if reads:
+		print(f"reading: p50 {summary['read_p50']*1e3:.2f} ms | max {summary['read_max']*1e3:.2f} ms")
+	if monitor != None:
+		for width in monitor.windows:
+			print( monitor.report(width) )
+	print("CLOSED-PYTHON")
+	return summary
+
 #===================================================================================================
 
 if __name__ == '__main__':
 	data = captureInputs()
+	rotation = {'max_bytes': data.rotate_bytes, 'max_age': data.rotate_seconds, \
+	            'keep': data.keep_segments}
+	
+	# record without plotting
+	if data.headless:
+		acquire(port=data.port,                 \
+		        path=data.path,                 \
+		        rate=data.rate,                 \
+		        path_measure=data.path_measure, \
+		        raw=data.raw,                   \
+		        duration=data.duration,         \
+		        resume=data.resume,             \
+		        binary=data.binary,             \
+		        log_format=data.log_format,     \
+		        rotation=rotation,              \
+		        stats=data.stats)
+	
+	# configure without plotting
+	elif data.command or data.save_json != None:
+		send_commands(port=data.port,           \
+		              path=data.path,           \
+		              commands=data.command,    \
+		              save_json=data.save_json, \
+		              resume=data.resume)
 	
 	# capture serial data and plot it
-	main(port=data.port,         \
-	     path=data.path,         \
-	     window=data.window,     \
-	     ylims=data.ylims,       \
-	     nsamples=data.nsamples, \
-	     path_measure=data.path_measure)
+	else:
+		main(port=data.port,         \
+		     path=data.path,         \
+		     window=data.window,     \
+		     ylims=data.ylims,       \
+		     nsamples=data.nsamples, \
+		     path_measure=data.path_measure, \
+		     resume=data.resume,             \
+		     rate=data.rate,                 \
+		     log_format=data.log_format,     \
+		     rotation=rotation,              \
+		     decimation=data.decimation if data.decimation != "none" else None, \
+		     stats=data.stats)
 
@@ -0,0 +1,841 @@
+# local import
+import TempControllerCN0391 as cntl
+import ArduinoSimulator as sim
+import AsyncTempController
+import MeasureLog as ml
+import MeasureIndex as mi
+import Decimate as dec
+import benchmark
+import ChannelMonitor as cm
+import PlantSimulator as ps
+import AutoTuner as at
+import RelayTuner as rt
+from comms import SerialCodec as codec
+from comms import AsyncSerial
+
+# global import
+import os
+import json
+import asyncio
+import time
+import types
+import tempfile
+import unittest
+import warnings
+import numpy as np
+
+# Note: Regression tests that need no hardware. Commands are sent to `ArduinoSimulator` on a
+# pseudo-terminal (Linux and macOS), and file formats are checked in a temporary directory.
+#
+# python3 _tests_simulator.py [-v] [TestSimulator ...]
+
+#--- CONSTANTS ---
+PATH_LOAD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "json/coefficients_load.json")
+
+#===================================================================================================
+
+class SimulatorTest(unittest.TestCase):
+
+	BINARY = False
+	
+	@classmethod
+	def setUpClass(cls):
+		cls.start_simulator()
+		cls.controller = cntl.TempControllerCN0391(path=cls.path, binary=cls.BINARY)
+	
+	
+	@classmethod
+	def tearDownClass(cls):
+		cls.controller.set_disable_all()
+		cls.controller.close()
+		cls.stop_simulator()
+	
+	
+	@classmethod
+	def start_simulator(cls) -> None:
+		cls.simulator = sim.ArduinoSimulator(boot_time=0.1, loop_period=0.01, binary=cls.BINARY)
+		port = cls.simulator.start()
+		
+		# the port of the json file is replaced by the port of the simulator
+		cls.directory = tempfile.TemporaryDirectory()
+		cls.path = os.path.join(cls.directory.name, "coefficients.json")
+		with open(PATH_LOAD) as file:
+			json_data = json.load(file)
+		json_data["serial_port"] = port
+		with open(cls.path, 'w') as file:
+			json.dump(json_data, file)
+	
+	
+	@classmethod
+	def stop_simulator(cls) -> None:
+		cls.simulator.stop()
+		cls.directory.cleanup()
+
+#---------------------------------------------------------------------------------------------------
+
+class TestSimulator(SimulatorTest):
+
+	def test_connection(self):
+		self.assertEqual(self.controller.get_sensor_type(), ['N', 'T', 'K', 'N'])
+		
+		temperatures = self.controller.get_filter()
+		self.assertEqual(len(temperatures), 4)
+		self.assertTrue( all( abs(temp - 25) < 5 for temp in temperatures ) )	# ambient
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_bad_command(self):
+		self.assertEqual(self.controller.serial.request("99,0"), "BAD_COMMAND")
+		self.assertEqual(self.controller.get_pid(0), [15, 0.25, 20])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_request_into(self):
+		out = np.zeros((2, 4))
+		self.controller.get_raw_into(out[1])
+		self.assertTrue( np.all( abs(out[1] - 25) < 5 ) )
+		self.assertTrue( np.all(out[0] == 0) )
+
+#---------------------------------------------------------------------------------------------------
+
+class TestPipeline(SimulatorTest):
+
+	def test_fifo_replies(self):
+		serial = self.controller.serial
+		commands = ["4,0", "0", "6,1", "17", "8,2", "BAD", "10,3", "2"] * 3
+		pending = [ serial.submit(cmd) for cmd in commands ]
+		labels = [ reply.result().split(",")[0] for reply in pending ]
+		
+		expected = ["PID_0", "FILTER", "IN_LIMIT_1", "TIMER", "AB_FILTER_2", "BAD_COMMAND", \
+		            "K_FILTER_3", "TARGET"] * 3
+		self.assertEqual(labels, expected)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_pipelined_setters(self):
+		with self.controller.pipeline():
+			for ch in range(4):
+				self.controller.set_target(ch, 30 + ch)
+		self.assertEqual(self.controller.get_target(), [30, 31, 32, 33])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_pipeline_error(self):
+		# the error of the block is raised, not the error of an aborted setter
+		with self.assertRaises(KeyError):
+			with self.controller.pipeline():
+				for ch in range(4):
+					self.controller.set_timeout(ch, 600 + ch)
+				raise KeyError("block")
+		
+		# later commands receive their own replies
+		for cmd, label in [ ("4,0", "PID_0"), ("2", "TARGET"), ("18", "TIMEOUT") ]:
+			self.assertEqual(self.controller.serial.request(cmd).split(",")[0], label)
+
+#---------------------------------------------------------------------------------------------------
+
+class TestPoll(SimulatorTest):
+
+	def poll(self, seconds:float) -> list:
+		end = time.monotonic() + seconds
+		readings = []
+		while time.monotonic() < end:
+			temperatures = self.controller.poll_filter()
+			if temperatures != None:
+				readings.append(temperatures)
+			time.sleep(0.01)
+		return readings
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_lost_reply(self):
+		self.controller.start_reader()
+		try:
+			self.assertGreater(len( self.poll(0.5) ), 5)
+			
+			# the next reply is lost. Polls resume once the deadline of the request has passed.
+			decoder = self.controller.serial.codec
+			feed = decoder.feed
+			decoder.feed = lambda data: []
+			time.sleep(0.1)
+			decoder.feed = feed
+			
+			deadline, self.controller.serial.deadline = self.controller.serial.deadline, 0.5
+			try:
+				readings = self.poll(1.5)
+			finally:
+				self.controller.serial.deadline = deadline
+			self.assertGreater(len(readings), 5)
+			self.assertTrue( all( len(temperatures) == 4 for temperatures in readings ) )
+		finally:
+			self.controller.stop_reader()
+
+#---------------------------------------------------------------------------------------------------
+
+class TestAsync(SimulatorTest):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.start_simulator()
+	
+	
+	@classmethod
+	def tearDownClass(cls):
+		cls.stop_simulator()
+	
+	
+	async def session(self) -> list:
+		async with AsyncTempController.AsyncTempController(path=self.path) as controller:
+			await controller.set_target(2, 42.5)
+			replies = await asyncio.gather( controller.get_filter(), controller.get_target(), \
+			                                *[ controller.get_pid(ch) for ch in range(4) ] )
+			await controller.set_disable_all()
+			controller.close()		# closed again by the block
+		return replies
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_session(self):
+		temperatures, targets, *gains = asyncio.run( self.session() )
+		self.assertEqual(len(temperatures), 4)
+		self.assertEqual(targets[2], 42.5)
+		self.assertEqual(gains[0], [15, 0.25, 20])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_partial_writes(self):
+		# the port accepts a few bytes at a time. The rest is written when it is writable again.
+		write = os.write
+		calls = [0]
+		
+		def slow_write(fd:int, data:bytes) -> int:
+			calls[0] += 1
+			if calls[0] % 2:
+				raise BlockingIOError
+			return write(fd, bytes(data[:3]))
+		
+		AsyncSerial.os = types.SimpleNamespace(write=slow_write)
+		try:
+			temperatures, targets, *gains = asyncio.run( self.session() )
+		finally:
+			AsyncSerial.os = os
+		self.assertGreater(calls[0], 100)
+		self.assertEqual(gains[3], [0, 0, 0])
+
+#===================================================================================================
+
+def replies(*lines:str) -> list:
+	return [ codec.encode_reply(line) for line in lines ]
+
+
+def corrupt(frame:bytes, index:int, value:int) -> bytes:
+	frame = bytearray(frame)
+	frame[index] = value
+	return bytes(frame)
+
+#===================================================================================================
+
+class TestCodec(unittest.TestCase):
+
+	LINES = ["FILTER,26.37,0.00,-1.50,300.00", "PID_2,15.00,0.25,20.00", "TIMER,1.00,2.00,3.00,4.00"]
+	
+	def feed(self, data:bytes, step:int = None) -> list:
+		decoder = codec.BinaryCodec()
+		if step == None:
+			return [ decoder.decode(reply) for reply in decoder.feed(data) ]
+		
+		output = []
+		for i in range(0, len(data), step):
+			output += [ decoder.decode(reply) for reply in decoder.feed(data[i:i + step]) ]
+		return output
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_round_trip(self):
+		data = b''.join( replies(*self.LINES) )
+		for step in (None, 1, 5):
+			self.assertEqual(self.feed(data, step), self.LINES)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_text_between_frames(self):
+		first, second, third = replies(*self.LINES)
+		output = self.feed(first + b"SET_BINARY\r\n" + second + b"BAD_COMMAND\n" + third)
+		self.assertEqual(output, [self.LINES[0], "SET_BINARY", self.LINES[1], "BAD_COMMAND", \
+		                          self.LINES[2]])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_resync_length(self):
+		first, second, third = replies(*self.LINES)
+		
+		# too short, longer than any reply, and shorter than the frame
+		for size in (0, 2, 250, 5, len(first) - 4):
+			with self.subTest(size=size):
+				output = self.feed(corrupt(first, 1, size) + second + third)
+				self.assertEqual(output, [codec.BAD_FRAME, *self.LINES[1:]])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_resync_checksum(self):
+		first, second, third = replies(*self.LINES)
+		for index in (2, 5, len(first) - 1):
+			with self.subTest(index=index):
+				output = self.feed(corrupt(first, index, first[index] ^ 0x10) + second + third, 3)
+				self.assertEqual(output, [codec.BAD_FRAME, *self.LINES[1:]])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_unknown_kind(self):
+		frame = corrupt(replies(self.LINES[0])[0], 2, 0xEE)
+		body = frame[1:-1]
+		frame = frame[:-1] + bytes([ codec.crc8(body) ])
+		self.assertEqual(self.feed(frame), [codec.BAD_FRAME])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_parse_into(self):
+		data = b''.join( replies(*self.LINES) ) + b"PID_1,1.50,-2.25,3.00\r\n"
+		decoder = codec.BinaryCodec()
+		frame, pid, timer, text = decoder.feed(data)
+		out = np.zeros(6)
+		
+		self.assertIs(decoder.parse_into(frame, out, "FILTER", 4, 1), out)
+		self.assertEqual(list(out), [0, 26.37, 0, -1.5, 300, 0])
+		self.assertEqual(list( decoder.parse_into(pid, out, "PID_", 3) )[:3], [15, 0.25, 20])
+		self.assertEqual(list( decoder.parse_into(text, out, "PID_", 3) )[:3], [1.5, -2.25, 3])
+		
+		for reply, func, count in ((timer, "FILTER", 4), (pid, "PID_", 2), (text, "RAW", 3)):
+			with self.subTest(func=func, count=count):
+				with self.assertRaises(ValueError):
+					decoder.parse_into(reply, out, func, count)
+
+#---------------------------------------------------------------------------------------------------
+
+class TestBinaryReplies(SimulatorTest):
+
+	BINARY = True
+	
+	def test_getters(self):
+		self.assertTrue(self.controller.serial.codec.binary)
+		self.assertEqual(len(self.controller.get_filter()), 4)
+		self.assertEqual(self.controller.get_pid(0), [15, 0.25, 20])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_request_into(self):
+		out = np.full(5, np.nan)
+		self.assertIs(self.controller.get_filter_into(out, 1), out)
+		self.assertTrue(np.isnan(out[0]))
+		self.assertTrue(np.all( np.isfinite(out[1:]) ))
+		
+		reply = self.controller.serial.submit("2", sink = (out, "FILTER", 4, 0))	# TARGET reply
+		with self.assertRaises(ValueError):
+			reply.result()
+		self.assertEqual(self.controller.get_pid(0), [15, 0.25, 20])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_corrupted_frame(self):
+		decoder = self.controller.serial.codec
+		feed = decoder.feed
+		state = {'sync': False, 'done': False}
+		
+		def corrupt_length(data:bytes) -> list:
+			data = bytearray(data)
+			for i, byte in enumerate(data):
+				if state['done']:
+					break
+				if state['sync']:
+					data[i] = 4 		# LEN of the frame after the first SYNC byte
+					state['done'] = True
+				state['sync'] = byte == 0xA5
+			return feed( bytes(data) )
+		
+		decoder.feed = corrupt_length
+		try:
+			with self.assertRaises(ValueError):
+				self.controller.get_filter()
+		finally:
+			decoder.feed = feed
+		
+		# later replies are matched to their own commands
+		self.assertEqual(len(self.controller.get_raw()), 4)
+		self.assertEqual(self.controller.get_pid(0), [15, 0.25, 20])
+
+#---------------------------------------------------------------------------------------------------
+
+class TestCache(SimulatorTest):
+
+	def check_cache(self, getter:str, ch:int) -> list:
+		cached = getattr(self.controller, getter)(ch)
+		self.controller.invalidate_cache()
+		device = getattr(self.controller, getter)(ch)
+		self.assertEqual(cached, device, getter)
+		return device
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_normalized_setters(self):
+		# values that the firmware clamps, rounds or replaces with defaults
+		cases = [ ("set_ab_filter", "get_ab_filter", [(1.5, -0.2), (0.333, 0.6667)]), \
+		          ("set_in_limit",  "get_in_limit",  [(50, 50), (40.004, 40), (100, -20)]), \
+		          ("set_k_filter",  "get_k_filter",  [(-1, 0.5), (0, 0), (2.5, 0.125)]), \
+		          ("set_pid",       "get_pid",       [(1.234, 0.005, 10)]) ]
+		
+		for setter, getter, inputs in cases:
+			for ch, args in enumerate(inputs):
+				with self.subTest(setter=setter, args=args):
+					getattr(self.controller, setter)(ch, *args)
+					self.check_cache(getter, ch)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_pipelined_cache(self):
+		with self.controller.pipeline():
+			self.controller.set_ab_filter(3, 2, 2)
+			self.controller.set_in_limit(3, 10, 10)
+		self.assertEqual(self.check_cache("get_ab_filter", 3), [1, 1])
+		self.check_cache("get_in_limit", 3)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_benchmark_round_trips(self):
+		serial = self.controller.serial
+		calls = [0]
+		
+		def request_data(*args, **kwargs):
+			calls[0] += 1
+			return type(serial).request_data(serial, *args, **kwargs)
+		
+		serial.request_data = request_data
+		self.controller.invalidate_cache()
+		try:
+			for cached, count in ((False, 4), (True, 0)):
+				calls[0] = 0
+				benchmark.bench_methods(self.controller, 3, [("get_pid", (0,))], cached)
+				self.assertEqual(calls[0], count, f"cached={cached}")
+		finally:
+			del serial.request_data
+
+#---------------------------------------------------------------------------------------------------
+
+class TestJsonDiff(SimulatorTest):
+
+	def dry_run(self) -> list:
+		return self.controller.apply_json_coefficients(dry_run=True)["commands"]
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_unchanged(self):
+		self.assertEqual(self.dry_run(), [])
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_changed_parameter(self):
+		parameters = self.controller.json_data["parameters"]
+		parameters[0]["kp"] = 12.5
+		parameters[2]["alpha"] = 1.5 		# stored as 1 by the firmware
+		parameters[2]["beta"] = 0
+		
+		commands = self.dry_run()
+		self.assertEqual([ cmd.split(",")[0:2] for cmd in commands ], [["5", "0"], ["9", "2"]])
+		self.assertEqual(self.controller.json_data["parameters"][0]["kp"], 12.5)
+		
+		report = self.controller.apply_json_coefficients()
+		self.assertEqual(report["commands"], commands)
+		self.assertEqual(self.controller.get_pid(0)[0], 12.5)
+		self.assertEqual(self.dry_run(), [])		# normalized values are not sent again
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_disabled_channel(self):
+		self.controller.set_enable(1)
+		self.controller.json_data["parameters"][1]["enable"] = 0
+		try:
+			self.assertEqual(self.dry_run(), [])		# left running, as in a full load
+		finally:
+			self.controller.set_disable(1)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_benchmark_apply(self):
+		pid = self.controller.get_pid(0)
+		results = benchmark.bench_config(self.controller, 2)
+		self.assertEqual(results["apply_changed"]["n"], 2)
+		self.assertEqual(self.controller.get_pid(0), pid)
+		self.assertEqual(self.dry_run(), [])
+
+#===================================================================================================
+
+class MeasureFileTest(unittest.TestCase):
+
+	def setUp(self):
+		self.directory = tempfile.TemporaryDirectory()
+		rng = np.random.default_rng(1)
+		self.seconds = np.round( np.cumsum(rng.uniform(0.01, 0.1, 5000)), 3 )	# text resolution
+		self.values = np.round( rng.uniform(-50, 300, (5000, 4)), 2 )
+	
+	
+	def tearDown(self):
+		self.directory.cleanup()
+	
+	
+	def write(self, log:object) -> None:
+		with log:
+			for seconds, values in zip(self.seconds, self.values):
+				log.write(seconds, list(values))
+	
+	
+	def paths(self) -> list:
+		'''Write both formats. Returns each path with the times stored in the file.
+		'''
+		path_text = os.path.join(self.directory.name, "measure.txt")
+		path_binary = os.path.join(self.directory.name, "measure.bin")
+		self.write( ml.TextLog(path_text, [f"temp_ch{ch}" for ch in range(4)]) )
+		
+		log = ml.MeasureLog(path_binary, 4, ['K', 'K', 'T', 'J'])
+		self.write(log)		# binary times are relative to the time in the header
+		return [ (path_text, self.seconds), (path_binary, self.seconds + log.offset) ]
+
+#---------------------------------------------------------------------------------------------------
+
+class TestMeasureLog(MeasureFileTest):
+
+	def test_binary_round_trip(self):
+		path, times = self.paths()[1]
+		header, records = ml.read_log(path)
+		self.assertEqual(header['channels'], 4)
+		np.testing.assert_array_equal(records['time'], times)
+		np.testing.assert_allclose(records['temp'] / header['scale'], self.values)
+		
+		# an interrupted record is discarded when the file is opened again
+		with open(path, 'ab') as file:
+			file.write(b'\x00' * 5)
+		with ml.MeasureLog(path, 4) as log:
+			log.write(times[-1] + 1, [1, 2, 3, 4])
+		header, records = ml.read_log(path)
+		self.assertEqual(len(records), len(self.seconds) + 1)
+
+#---------------------------------------------------------------------------------------------------
+
+class TestRotatingLog(MeasureFileTest):
+
+	def rotating(self, log_format:str, **kwargs) -> ml.RotatingLog:
+		path = os.path.join(self.directory.name, "measure.bin" if log_format == "binary" else \
+		                    "measure.txt")
+		if log_format == "binary":
+			open_segment = lambda path: ml.MeasureLog(path, 4)
+		else:
+			open_segment = lambda path: ml.TextLog(path, [f"temp_ch{ch}" for ch in range(4)])
+		return ml.RotatingLog(path, open_segment, **kwargs)
+	
+	
+	def files(self) -> list:
+		return sorted( os.listdir(self.directory.name) )
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_rotation_by_size(self):
+		log = self.rotating("binary", max_bytes=ml.HEADER_SIZE + 12000) 	# 500 records
+		self.write(log)
+		
+		segments = ml.read_manifest(log.manifest_path)['segments']
+		self.assertEqual([ entry['count'] for entry in segments ], [500] * 10)
+		self.assertTrue( all( entry['compressed'] for entry in segments ) )
+		self.assertEqual(self.files(), sorted( [ entry['file'] for entry in segments ] + \
+		                                       ["measure.manifest.json"] ))
+		
+		seconds, values, time_init = ml.read_series(log.manifest_path)
+		np.testing.assert_allclose(seconds, self.seconds, atol=0.01) 	# offset of each header
+		np.testing.assert_allclose(values, self.values)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_keep(self):
+		log = self.rotating("text", max_age=20, keep=3)
+		self.write(log)
+		
+		segments = ml.read_manifest(log.manifest_path)['segments']
+		self.assertEqual(len(segments), 3)
+		self.assertEqual(len(self.files()), 4)
+		
+		count = sum( entry['count'] for entry in segments )
+		seconds, values, time_init = ml.read_series(log.manifest_path)
+		self.assertEqual(time_init, segments[0]['time'])
+		np.testing.assert_allclose(values, self.values[-count:])
+		np.testing.assert_allclose(seconds + (time_init - log.time_init), self.seconds[-count:], \
+		                           atol=1e-6)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_restart(self):
+		self.write( self.rotating("text", max_age=100) )
+		with self.rotating("text") as log: 		# continues the series
+			log.write(0, [1, 2, 3, 4])
+		
+		segments = ml.read_manifest(log.manifest_path)['segments']
+		self.assertEqual([ entry['index'] for entry in segments ], list(range( len(segments) )))
+		self.assertEqual(segments[-1]['count'], 1)
+		
+		seconds, values, time_init = ml.read_series(log.manifest_path)
+		self.assertEqual(len(values), len(self.seconds) + 1)
+		np.testing.assert_allclose(values[-1], [1, 2, 3, 4])
+
+#===================================================================================================
+
+class TestDecimate(unittest.TestCase):
+
+	def test_small_series(self):
+		x = np.arange(100.0)
+		y = np.sin(x)
+		for method in dec.METHODS:
+			x_out, y_out = dec.decimate(x, y, 100, method)
+			self.assertIs(y_out, y)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_minmax_spikes(self):
+		# every sample belongs to a bucket, including the remainder of the division
+		for count, points, index in [ (1000, 800, 150), (1000, 800, 998), (10**5, 801, 1), \
+		                              (1003, 10, 2), (1003, 10, 1001) ]:
+			with self.subTest(count=count, points=points, index=index):
+				x = np.arange(count, dtype=float)
+				y = np.zeros(count)
+				y[index] = 5
+				y[index - 1] = -5
+				
+				x_out, y_out = dec.minmax(x, y, points)
+				self.assertLessEqual(len(y_out), points)
+				self.assertEqual( (y_out.max(), y_out.min()), (5, -5) )
+				self.assertEqual( (x_out[0], x_out[-1]), (0, count - 1) )
+				self.assertTrue( np.all(np.diff(x_out) >= 0) )
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_minmax_random(self):
+		rng = np.random.default_rng(0)
+		for count in (803, 1601, 12345):
+			x = np.sort( rng.uniform(0, 100, count) )
+			y = rng.normal(0, 1, count)
+			x_out, y_out = dec.minmax(x, y, 800)
+			self.assertEqual( (y_out.max(), y_out.min()), (y.max(), y.min()) )
+			self.assertTrue( np.all(np.isin(x_out, x)) )
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_lttb(self):
+		x = np.arange(5000, dtype=float)
+		y = np.cos(x / 100)
+		x_out, y_out = dec.lttb(x, y, 500)
+		self.assertEqual(len(y_out), 500)
+		self.assertEqual( (x_out[0], x_out[-1]), (0, 4999) )
+		self.assertTrue( np.all(np.diff(x_out) > 0) )
+		
+		with self.assertRaises(ValueError):
+			dec.decimate(x, y, 500, "mean")
+
+#===================================================================================================
+
+class TestMeasureIndex(MeasureFileTest):
+
+	def test_index_query(self):
+		for path, times in self.paths():
+			with mi.MeasureIndex(path, block=1024) as index:
+				for t0, t1, channels in [ (None, None, None), (10, 20, [0, 2]), \
+				                          (times[100], times[100], [3]), \
+				                          (-5, 1e9, None), (1e9, 2e9, None) ]:
+					with self.subTest(path=path, t0=t0, t1=t1):
+						seconds, values = index.query(t0, t1, channels)
+						
+						low = -np.inf if t0 == None else t0
+						high = np.inf if t1 == None else t1
+						mask = (times >= low) & (times <= high)
+						columns = list(range(4)) if channels == None else channels
+						
+						np.testing.assert_array_equal(seconds, times[mask])
+						np.testing.assert_allclose(values.reshape(-1, len(columns)), \
+						                           self.values[mask][:, columns], atol=1e-6)
+				
+				chunks = list( index.iterate(chunk=4096) )
+				self.assertGreater(len(chunks), 1)
+				seconds = np.concatenate([ seconds for seconds, values in chunks ])
+				np.testing.assert_array_equal(seconds, times)
+
+#===================================================================================================
+
+class TestChannelMonitor(unittest.TestCase):
+
+	def expected(self, times:np.ndarray, values:np.ndarray, width:float) -> dict:
+		inside = times >= times[-1] - width
+		times, values = times[inside], values[inside]
+		stats = {'mean': [], 'std': [], 'min': [], 'max': [], 'slope': []}
+		
+		for column in values.T:
+			valid = np.isfinite(column)
+			t, v = times[valid], column[valid]
+			stats['mean'].append( v.mean() if len(v) > 0 else np.nan )
+			stats['std'].append( v.std(ddof=1) if len(v) > 1 else np.nan )
+			stats['min'].append( v.min() if len(v) > 0 else np.nan )
+			stats['max'].append( v.max() if len(v) > 0 else np.nan )
+			stats['slope'].append( np.polyfit(t, v, 1)[0] if len(np.unique(t)) > 1 else np.nan )
+		return stats
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_numpy_recompute(self):
+		rng = np.random.default_rng(3)
+		times = np.cumsum( rng.uniform(0.1, 1, 400) )
+		values = 25 + np.cumsum( rng.normal(0, 0.5, (400, 3)), axis=0 )
+		values[rng.random((400, 3)) < 0.1] = np.nan 		# open thermocouple
+		values[150:220, 2] = np.nan 						# longer than the short window
+		
+		monitor = cm.ChannelMonitor(channels=3, windows=[20, 1000])
+		for i in range(len(times)):
+			monitor.update(times[i], values[i])
+			
+			for width in monitor.windows:
+				stats = monitor.stats(width)
+				expected = self.expected(times[:i + 1], values[:i + 1], width)
+				for key, value in expected.items():
+					np.testing.assert_allclose(stats[key], value, rtol=1e-6, atol=1e-6, \
+					                           err_msg=f"{key} of window {width} at {i}")
+
+#===================================================================================================
+
+class TestRelayTuner(SimulatorTest):
+
+	def state(self, ch:int) -> list:
+		self.controller.invalidate_cache()
+		return [ self.controller.get_pid(ch), self.controller.get_target()[ch], \
+		         self.controller.get_timeout()[ch], self.controller.get_enable()[ch] ]
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_cycles(self):
+		with self.assertRaises(ValueError):
+			rt.RelayTuner(self.controller, 0, 30, cycles=0)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_run(self):
+		before = self.state(1)
+		tuner = rt.RelayTuner(self.controller, 1, 60, cycles=2)
+		result = tuner.run(timeout=120)
+		
+		self.assertEqual(self.state(1), before) 		# restored
+		self.assertGreater(result['amplitude'], tuner.hysteresis)
+		self.assertGreater(result['tu'], 0)
+		self.assertTrue( all( result[key] > 0 for key in ('ku', 'kp', 'ki', 'kd') ) )
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_amplitude_within_hysteresis(self):
+		before = self.state(2)
+		tuner = rt.RelayTuner(self.controller, 2, 30, cycles=1)
+		tuner._oscillate = lambda timeout: (10, 0.4, 100, 1) 		# tu, amplitude, samples, time
+		with self.assertRaises(RuntimeError):
+			tuner.run()
+		self.assertEqual(self.state(2), before)
+
+#===================================================================================================
+
+class TestPlantSimulator(unittest.TestCase):
+
+	DURATION = 600
+	TARGET = 40
+	
+	def firmware(self, parameters:list, loop_period:float) -> np.ndarray:
+		'''Temperature of each channel of `ArduinoSimulator` once per second, with a simulated clock
+		'''
+		clock = [0.0]
+		sim.time = types.SimpleNamespace(monotonic=lambda: clock[0], sleep=time.sleep)
+		try:
+			arduino = sim.ArduinoSimulator(noise=0, loop_period=loop_period)
+			arduino._calibrate()
+			for ch, param in enumerate(parameters):
+				controller = arduino.controller[ch]
+				controller.setPIDGains(param['kp'], param['ki'], param['kd'])
+				controller.setFilterGains(param['alpha'], param['beta'])
+				controller.setInputLimits(param['imax'], param['imin'])
+				arduino.target[ch] = self.TARGET
+				arduino.enable_pid[ch] = True
+			arduino.state = 'running'
+			
+			temperatures = []
+			per_second = round(1 / loop_period)
+			for index in range( round(self.DURATION / loop_period) ):
+				clock[0] += loop_period
+				arduino._loop()
+				if index % per_second == per_second - 1:
+					temperatures.append( arduino._temperature[:len(parameters)] )
+		finally:
+			sim.time = time
+		return np.array(temperatures)
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_matches_firmware(self):
+		with open(PATH_LOAD) as infile:
+			param = json.load(infile)["parameters"][0]
+		parameters = [ param, dict(param, kd=0), dict(param, alpha=0.2, beta=0.01) ]
+		
+		# ArduinoSimulator has no dead time and no noise here. It drives the heater with the duty
+		# instead of pulses, so the gains saturate the output until the target is near.
+		simulator = ps.PlantSimulator(parameters, {'noise': 0, 'delay': 0}, loop_period=0.05)
+		result = simulator.run(self.DURATION, self.TARGET, record=1)
+		expected = self.firmware(parameters, 0.05)
+		
+		count = min( len(expected), len(result['temperature']) )
+		deviation = np.abs(result['temperature'][:count] - expected[:count])
+		self.assertLess(deviation.mean(), 0.15)
+		self.assertLess(deviation.max(), 2.5) 				# pulses during the rise
+		np.testing.assert_allclose(result['temperature'][-1], expected[-1], atol=0.2)
+		
+		# time at which each channel first reaches the band around the target
+		rise = lambda temps: np.argmax(temps > self.TARGET - 1, axis=0)
+		np.testing.assert_allclose(rise(result['temperature']), rise(expected), atol=1)
+
+#---------------------------------------------------------------------------------------------------
+
+class TestAutoTuner(unittest.TestCase):
+
+	def setUp(self):
+		with open(PATH_LOAD) as infile:
+			self.parameters = json.load(infile)["parameters"][:2]
+	
+	
+	def tune(self, parameters:list, channels:list = None) -> tuple:
+		tuner = at.AutoTuner(parameters, [ps._PLANT] * len(parameters), [60] * len(parameters), \
+		                     120, workers=1)
+		with warnings.catch_warnings(record=True) as caught:
+			warnings.simplefilter("always")
+			tuned = tuner.tune(channels, samples=8, rounds=2)
+		return tuner, tuned, [ str(warning.message) for warning in caught ]
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_tune(self):
+		tuner, tuned, caught = self.tune(self.parameters, [0])
+		self.assertEqual(caught, [])
+		self.assertEqual(list(tuner.costs), [0])
+		
+		before, after = tuner.costs[0]
+		self.assertLessEqual(after, before) 		# the current coefficients are a candidate
+		self.assertEqual(tuned[1], self.parameters[1])
+		self.assertEqual(tuned[0]["alpha"], self.parameters[0]["alpha"])
+		self.assertTrue( all( round(tuned[0][key], 2) == tuned[0][key] for key in at._RANGES ) )
+	
+	#-----------------------------------------------------------------------------------------------
+	
+	def test_alpha_zero(self):
+		parameters = [ dict(self.parameters[0], alpha=0) ]
+		tuner, tuned, caught = self.tune(parameters)
+		self.assertEqual(len(caught), 1)
+		self.assertIn("alpha of channel 0", caught[0])
+		self.assertGreater(tuned[0]["alpha"], 0)
+
+#===================================================================================================
+
+if __name__ == '__main__':
+	unittest.main()
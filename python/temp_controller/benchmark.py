@@ -0,0 +1,462 @@
+"""
+Benchmark of the serial round trips of the Python API. It measures the latency percentiles and
+the commands per second of every public method of `TempControllerCN0391` with the cache of getters
+discarded before each call, and separately the getters served from the cache, the time of the setup
+handshake and the time to load and save a full configuration. The import time of the command line
+interface (`__main__.py`) in the modes that do not plot is also measured against a budget.
+
+By default the benchmark runs against `ArduinoSimulator`. A real board can be used instead:
+
+```bash
+python3 benchmark.py --output results.json
+python3 benchmark.py --port "/dev/ttyACM0" --baseline results.json
+```
+
+When a baseline is given, the script exits with an error if the median latency of any measurement
+is slower than the baseline by more than the tolerance, or if the startup exceeds its budget.
+"""
+
+# Global libraries
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+
+# local file
+import TempControllerCN0391 as cntl
+
+#--- CONSTANTS ---
+_TOLERANCE = 0.25 		# fraction | Allowed slowdown of the median latency relative to the baseline
+_STARTUP_BUDGET = 0.1 	# seconds | Allowed import time of the command line interface without plot
+
+_CLI = os.path.join( os.path.dirname(os.path.abspath(__file__)), "__main__.py" )
+_PLOT_MODULES = ("matplotlib", "numpy")		# must not be imported by the modes without plot
+
+# Public methods and their arguments. Setters use values that are valid on every channel.
+_METHODS = [
+	("get_filter",         ()),
+	("get_raw",            ()),
+	("get_target",         ()),
+	("set_target",         (0, 30)),
+	("set_target_all",     (30, 30, 30, 30)),
+	("get_pid",            (0,)),
+	("set_pid",            (0, 1, 0.1, 1)),
+	("get_in_limit",       (0,)),
+	("set_in_limit",       (0, 100, 0)),
+	("get_ab_filter",      (0,)),
+	("set_ab_filter",      (0, 0.5, 0.05)),
+	("get_k_filter",       (0,)),
+	("set_k_filter",       (0, 1, 0.1)),
+	("set_k_filter_state", (0, 25)),
+	("get_sensor_type",    ()),
+	("set_enable",         (0,)),
+	("set_enable_all",     ()),
+	("set_disable",        (0,)),
+	("set_disable_all",    ()),
+	("get_enable",         ()),
+	("get_timer",          ()),
+	("get_timeout",        ()),
+	("set_timeout",        (0, 600)),
+	("set_timeout_inf",    (0,)),
+	("get_device_snapshot", ()),
+	("send_serial_command", ("0",)),
+]
+
+# Getters whose replies are kept in memory. See: TempControllerCN0391.invalidate_cache()
+_CACHED = [
+	("get_target",         ()),
+	("get_pid",            (0,)),
+	("get_in_limit",       (0,)),
+	("get_ab_filter",      (0,)),
+	("get_k_filter",       (0,)),
+	("get_sensor_type",    ()),
+	("get_enable",         ()),
+	("get_timeout",        ()),
+]
+
+#===================================================================================================
+
+def percentile(data:list, q:float) -> float:
+	'''Percentile of a list of numbers using linear interpolation between the closest ranks.
+	
+	Parameters
+	----------
+	data: list(float)
+		Measurements. Must not be empty.
+	
+	q: float
+		Percentile between 0 and 100
+	
+	Returns
+	-------
+	value: float
+	'''
+	data = sorted(data)
+	rank = (len(data) - 1) * q / 100
+	low = int(rank)
+	high = min(low + 1, len(data) - 1)
+	return data[low] + (data[high] - data[low]) * (rank - low)
+
+
+def summarize(samples:list) -> dict:
+	'''Summary statistics of a list of latencies (in seconds)
+	
+	Returns
+	-------
+	stats: dict
+		Dictionary with the fields `n`, `mean`, `min`, `p50`, `p90`, `p99`, `max` (seconds) and
+		`rate` (calls per second)
+	'''
+	total = sum(samples)
+	return {"n":    len(samples),
+	        "mean": total / len(samples),
+	        "min":  min(samples),
+	        "p50":  percentile(samples, 50),
+	        "p90":  percentile(samples, 90),
+	        "p99":  percentile(samples, 99),
+	        "max":  max(samples),
+	        "rate": len(samples) / total if total > 0 else None }
+
+
+def time_call(func, *args, setup = None) -> float:
+	'''Duration (in seconds) of a single function call. The optional `setup` function is called
+	before and is not timed.
+	'''
+	if setup != None:
+		setup()
+	start = time.perf_counter()
+	func(*args)
+	return time.perf_counter() - start
+
+#===================================================================================================
+
+def bench_methods(controller:cntl.TempControllerCN0391, repeat:int, methods:list = _METHODS, \
+                  cached:bool = False) -> dict:
+	'''Latency of the public methods of the controller
+	
+	Parameters
+	----------
+	controller: TempControllerCN0391
+		Connected controller
+	
+	repeat: int
+		Number of calls of each method
+	
+	methods: list(tuple)
+		Name and arguments of each method. Defaults to every public method.
+	
+	cached: bool
+		Whether getters may be served from memory. If False, the cache is discarded before each \
+		call (outside of the timing) so that every call is a serial round trip.
+	
+	Returns
+	-------
+	results: dict
+		Summary statistics of each method. See `summarize()`
+	'''
+	results = {}
+	setup = None if cached else controller.invalidate_cache
+	
+	for name, args in methods:
+		func = getattr(controller, name)
+		func(*args)												# warm up
+		samples = [ time_call(func, *args, setup=setup) for i in range(repeat) ]
+		results[name] = summarize(samples)
+		label = f"{name} (cached)" if cached else name
+		print(f"{label:>25}: p50 = {results[name]['p50']*1e3:8.2f} ms")
+	
+	controller.set_disable_all()
+	return results
+
+
+def bench_config(controller:cntl.TempControllerCN0391, repeat:int) -> dict:
+	'''Time to load a full configuration onto the device and to read it back. Loading a 
+	configuration that the device already has only reads a snapshot, so a load where a 
+	coefficient of each channel differs is also measured (`apply_changed`).
+	
+	Returns
+	-------
+	results: dict
+		Summary statistics of `_set_json_coefficients`, `apply_changed` and \
+		`_get_device_coefficients`
+	'''
+	parameters = controller.json_data["parameters"]
+	gains = [ param["kp"] for param in parameters ]
+	
+	def change() -> None:
+		for param, kp in zip(parameters, gains):
+			param["kp"] = kp + 1 if param["kp"] == kp else kp 		# alternate between 2 values
+	
+	calls = [("_set_json_coefficients",   controller._set_json_coefficients,   None),
+	         ("apply_changed",            controller._set_json_coefficients,   change),
+	         ("_get_device_coefficients", controller._get_device_coefficients, None)]
+	
+	results = {}
+	try:
+		for name, func, setup in calls:
+			samples = [ time_call(func, setup=setup) for i in range(repeat) ]
+			results[name] = summarize(samples)
+			print(f"{name:>25}: p50 = {results[name]['p50']*1e3:8.2f} ms")
+	finally:
+		for param, kp in zip(parameters, gains):
+			param["kp"] = kp
+		controller._set_json_coefficients()
+		controller.set_disable_all()
+	return results
+
+
+class _TimedController(cntl.TempControllerCN0391):
+	'''Controller that records the duration of the setup handshake
+	'''
+	def _setup_arduino(self, cmd:str, waiting:bool = False) -> None:
+		self.setup_time = time_call(super()._setup_arduino, cmd, waiting)
+
+
+def bench_setup(port:str, baud_rate:int, repeat:int) -> dict:
+	'''Time of the connection and setup handshake (`_setup_arduino`) of the controller
+	
+	Returns
+	-------
+	results: dict
+		Summary statistics of the constructor and of the handshake alone
+	'''
+	total = []
+	handshake = []
+	
+	for i in range(repeat):
+		start = time.perf_counter()
+		controller = _TimedController(port=port, baud_rate=baud_rate)
+		total.append( time.perf_counter() - start )
+		handshake.append( controller.setup_time )
+		controller.close()
+	
+	results = {"constructor": summarize(total), "_setup_arduino": summarize(handshake)}
+	for name, stats in results.items():
+		print(f"{name:>25}: p50 = {stats['p50']*1e3:8.2f} ms")
+	return results
+
+
+def import_times(stderr:str) -> dict:
+	'''Cumulative import time of each top-level module from the output of `python -X importtime`
+	
+	Returns
+	-------
+	times: dict
+		Module name -> seconds
+	'''
+	times = {}
+	for line in stderr.splitlines():
+		if not line.startswith("import time:"):
+			continue
+		
+		fields = line.split("|")
+		name = fields[2].rstrip()
+		if len(fields) == 3 and not name.startswith("  ") and fields[1].strip().isdigit():
+			times[name.strip()] = int(fields[1]) * 1e-6
+	return times
+
+
+def bench_startup(repeat:int) -> tuple:
+	'''Import time of the command line interface when it does not plot. Each sample starts a new
+	interpreter with `-X importtime` and runs `__main__.py --help`, which parses the arguments
+	after the imports of the modes without plot. Modules imported by a bare interpreter are not 
+	counted, so the startup of the interpreter itself is excluded.
+	
+	Returns
+	-------
+	results: dict
+		Summary statistics of the import time
+	
+	plot_modules: list(str)
+		Plotting modules that were imported. Should be empty.
+	'''
+	command = [sys.executable, "-X", "importtime"]
+	bare = import_times( subprocess.run(command + ["-c", "pass"], capture_output=True, \
+	                                    text=True).stderr )
+	samples = []
+	
+	for i in range(repeat):
+		proc = subprocess.run(command + [_CLI, "--help"], capture_output=True, text=True, \
+		                      cwd=os.path.dirname(_CLI))
+		times = import_times(proc.stderr)
+		samples.append( sum( value for name, value in times.items() if name not in bare ) )
+	
+	plot_modules = [ name for name in _PLOT_MODULES if name in times ]
+	results = {"cli_import": summarize(samples)}
+	print(f"{'cli_import':>25}: p50 = {results['cli_import']['p50']*1e3:8.2f} ms")
+	
+	for name in plot_modules:
+		print(f"{'':>25}  imports {name}")
+	return results, plot_modules
+
+
+def check_startup(results:dict, budget:float) -> list:
+	'''Find the violations of the startup budget
+	
+	Parameters
+	----------
+	results: dict
+		Output of `run()`
+	
+	budget: float
+		Allowed median import time (in seconds) of the command line interface
+	
+	Returns
+	-------
+	violations: list(str)
+		Description of each violation. Empty if there is none.
+	'''
+	violations = []
+	p50 = results["benchmarks"]["startup"]["cli_import"]["p50"]
+	
+	if p50 > budget:
+		violations.append(f"startup.cli_import: p50 {p50*1e3:.2f} ms > budget {budget*1e3:.2f} ms")
+	for name in results["plot_modules"]:
+		violations.append(f"startup: {name} is imported by the modes without plot")
+	return violations
+
+
+def compare(results:dict, baseline:dict, tolerance:float) -> list:
+	'''Find the measurements whose median latency is slower than the baseline
+	
+	Parameters
+	----------
+	results: dict
+		Output of `run()`
+	
+	baseline: dict
+		Output of a previous run
+	
+	tolerance: float
+		Allowed relative slowdown. Ex: 0.25 allows a 25% slower median.
+	
+	Returns
+	-------
+	regressions: list(str)
+		Description of each regression. Empty if there is none.
+	'''
+	regressions = []
+	
+	for group, stats in results["benchmarks"].items():
+		for name, value in stats.items():
+			try:
+				reference = baseline["benchmarks"][group][name]["p50"]
+			except KeyError:
+				continue		# new measurement
+			
+			if value["p50"] > reference * (1 + tolerance):
+				regressions.append(f"{group}.{name}: p50 {value['p50']*1e3:.2f} ms > " \
+				                   f"baseline {reference*1e3:.2f} ms")
+	return regressions
+
+
+def run(port:str, baud_rate:int, repeat:int, setup_repeat:int) -> dict:
+	'''Run every benchmark against a serial port
+	
+	Returns
+	-------
+	results: dict
+		Dictionary with the metadata of the run and the field `benchmarks`
+	'''
+	benchmarks = {}
+	benchmarks["startup"], plot_modules = bench_startup( max(1, repeat // 10) )
+	benchmarks["setup"] = bench_setup(port, baud_rate, setup_repeat)
+	
+	controller = cntl.TempControllerCN0391(port=port, baud_rate=baud_rate)
+	try:
+		benchmarks["methods"] = bench_methods(controller, repeat)
+		benchmarks["cached"] = bench_methods(controller, repeat, _CACHED, cached=True)
+		benchmarks["config"] = bench_config(controller, max(1, repeat // 10))
+	finally:
+		controller.close()
+	
+	return {"time":       time.time(),
+	        "python":     platform.python_version(),
+	        "platform":   platform.platform(),
+	        "baud_rate":  baud_rate,
+	        "repeat":     repeat,
+	        "plot_modules": plot_modules,
+	        "benchmarks": benchmarks }
+
+#===================================================================================================
+
+def captureInputs() -> object:
+	'''Captures the command line parameters of the benchmark
+	'''
+	parser = argparse.ArgumentParser()
+	
+	parser.add_argument("--port", type=str, default=None, \
+	                    help="Serial port of a real Arduino. Uses the simulator if not given")
+	
+	parser.add_argument("--baud_rate", type=int, default=cntl._DEFAULT_BAUD, \
+	                    help="Baud rate of the Arduino")
+	
+	parser.add_argument("--repeat", type=int, default=50, \
+	                    help="Number of calls of each method")
+	
+	parser.add_argument("--setup_repeat", type=int, default=2, \
+	                    help="Number of times the setup handshake is measured")
+	
+	parser.add_argument("--output", type=str, default=None, \
+	                    help="Path of the JSON file where the results are saved")
+	
+	parser.add_argument("--baseline", type=str, default=None, \
+	                    help="Path of the results of a previous run used to detect regressions")
+	
+	parser.add_argument("--tolerance", type=float, default=_TOLERANCE, \
+	                    help="Allowed relative slowdown of the median latency")
+	
+	parser.add_argument("--startup_budget", type=float, default=_STARTUP_BUDGET, \
+	                    help="Allowed import time of the command line interface (Seconds)")
+	
+	# simulator
+	parser.add_argument("--latency", type=float, default=0, \
+	                    help="Reply latency of the simulator (Seconds)")
+	
+	parser.add_argument("--loop_period", type=float, default=0.05, \
+	                    help="Loop period of the simulated firmware (Seconds)")
+	
+	return parser.parse_args()
+
+
+if __name__ == '__main__':
+	args = captureInputs()
+	simulator = None
+	
+	if args.port == None:
+		import ArduinoSimulator as sim
+		simulator = sim.ArduinoSimulator(latency=args.latency, baud_rate=args.baud_rate, \
+		                                 loop_period=args.loop_period)
+		args.port = simulator.start()
+	
+	try:
+		results = run(args.port, args.baud_rate, args.repeat, args.setup_repeat)
+	finally:
+		if simulator != None:
+			simulator.stop()
+	
+	if simulator != None:
+		results["simulator"] = {"latency": args.latency, "loop_period": args.loop_period}
+	
+	if args.output != None:
+		with open(args.output, "w") as outfile:
+			outfile.write( json.dumps(results, indent=4) )
+	
+	violations = check_startup(results, args.startup_budget)
+	for line in violations:
+		print("[BUDGET]", line)
+	
+	regressions = []
+	if args.baseline != None:
+		with open(args.baseline) as infile:
+			regressions = compare(results, json.load(infile), args.tolerance)
+		
+		for line in regressions:
+			print("[REGRESSION]", line)
+	
+	if violations or regressions:
+		sys.exit(1)
+
@@ -14,6 +14,19 @@ with commands that have the form of a comma delimited string:
 # Global libraries
 import serial
 import time
+import errno
+import threading
+from collections import deque
+from concurrent.futures import Future, CancelledError, wait
+
+try:
+	import termios		# POSIX only. See: SerialCommunication._hang_up()
+except ImportError:
+	termios = None
+
+# local file
+from . import SerialReader
+from . import SerialCodec
 
 # NOTE: keyboard inputs are separate from receiving and sending serial commands.
 
@@ -21,16 +34,65 @@ import time
 _END_CHAR = '\n' # see: arduino/Constants.h
 _TIMEOUT  = 60   # seconds | Time that serial reads are allowed to block code execution. 
 _DELAY    = 0.5  # seconds | Required delay that allows serial command to be sent | 1 sec is safe but slow
+_DEADLINE = 2    # seconds | Default time a request waits for its reply before failing
+_PULSE    = 0.1  # seconds | Time DTR is released to reset the Arduino. See: restart()
+
+_BUFFER_SIZE = 30   # characters | see: arduino/Constants.h. Longer commands are split by the Arduino
+_RX_BUFFER   = 64   # bytes | Serial input buffer of the Arduino Uno. Bounds the pipelined commands
 
 # NOTE: Time delays need to be long enough to compensate for the slow execution of python
 
+# Label and number of values of the reply of each getter. See: arduino/Commands.h
+_REPLY_FIELDS = {
+	0:  ('FILTER', 4),      1: ('RAW', 4),       2: ('TARGET', 4),
+	4:  ('PID_', 3),        6: ('IN_LIMIT_', 2), 8: ('AB_FILTER_', 2),
+	10: ('K_FILTER_', 2),  16: ('ENABLE', 4),   17: ('TIMER', 4),
+	18: ('TIMEOUT', 4),    21: ('PARAMETERS', 44)
+}
+
 #===================================================================================================
 
-class SerialCommunication:
+class PendingReply(Future):
+	'''Future returned by `SerialCommunication.submit()`. Its result is the raw reply string of 
+	the command, or the array the reply was parsed into when the command has a sink. Waiting on the result reads replies from the serial port until this one arrives.
+	'''
+	
+	def __init__(self, serial:object, command:str):
+		super(PendingReply, self).__init__()
+		self.command = command
+		self._serial = serial
 	
-	def __init__(self, port:str, baud_rate:int):
+	
+	def result(self, timeout:float = None) -> str:
+		'''Wait for the reply of the command
+		
+		Parameters
+		----------
+		timeout: float
+			Optional time (in seconds) to wait. Defaults to the deadline of the connection.
+		
+		Returns
+		-------
+		reply : str
+			String that contains the reply of the Arduino
+		'''
+		if not self.done():
+			self._serial._wait(self, timeout)
+		return super(PendingReply, self).result(0)
+
+#---------------------------------------------------------------------------------------------------
+
+class SerialCommunication:
+
+	def __init__(self, port:str, baud_rate:int, deadline:float = _DEADLINE, reset:bool = True):
 		'''Initialize serial communication with an Arduino.
 		
+		__Note:__ The Arduino Uno resets when DTR is asserted. Without a reset, DTR is disabled
+		before the port opens on Windows. On Linux and macOS the port always asserts DTR when it 
+		opens, so the hang-up on close (`hupcl`) is disabled instead: DTR then stays asserted 
+		between connections, and only the first connection after a reset connection reboots 
+		the Arduino.
+		
 		Parameters
 		----------
 		port: str
@@ -40,9 +102,40 @@ class SerialCommunication:
 		baud_rate: int
 			Baud rate at which the Arduino is configured. Optional parameter that defaults to \
 			hardcoded value if none is provided
+		
+		deadline: float
+			Default time (in seconds) that `request()` waits for a reply before raising a \
+			`TimeoutError`. Can be overridden for each command.
+		
+		reset: bool
+			Whether opening the port resets the Arduino (True) or leaves a running Arduino \
+			untouched (False)
 		'''
-		self.arduino = serial.Serial(port, baud_rate, timeout=_TIMEOUT) 
+		self.arduino = serial.Serial(None, baud_rate, timeout=_TIMEOUT)
+		self.arduino.port = port
+		if not reset and termios == None:
+			self.arduino.dtr = False 		# Windows: DTR is never asserted
+		self.arduino.open()
+		self.deadline = deadline
 		self._isActive = True
+		
+		# pipelined commands | replies arrive in the same order as the commands
+		self._pending = deque()
+		self._inflight = 0
+		self._window = _RX_BUFFER
+		self._lock = threading.RLock()
+		self._room = threading.Condition(self._lock)	# notified when a reply frees the buffer
+		self._lines = deque()							# replies that were not read yet. See: SerialCodec
+		self.codec = SerialCodec.CsvCodec()				# format of the replies. See: set_binary()
+		if not reset:
+			self.codec = SerialCodec.BinaryCodec()		# a running Arduino may send binary replies
+		
+		# optional thread that drains the port. See: start_reader()
+		self.reader = None
+		
+		hangs_up = self._hang_up(reset)
+		if reset and not hangs_up:
+			self.restart() 		# DTR stayed asserted since a connection without reset
 	
 	
 	# helpers
@@ -50,6 +143,7 @@ class SerialCommunication:
 		'''Close the serial connection. It is necessary to run this command when a program 
 		finished to ensure the serial connection does not stay active. 
 		'''
+		self.stop_reader()
 		self.arduino.close()
 		self._isActive = False
 	
@@ -77,6 +171,74 @@ class SerialCommunication:
 		self.arduino.reset_output_buffer()
 	
 	
+	def restart(self) -> None:
+		'''Reset the Arduino by releasing and asserting DTR. The Arduino then waits for its 
+		sensor types again. Has no effect on ports without modem lines.
+		'''
+		try:
+			self.arduino.dtr = False
+			time.sleep(_PULSE)
+			self.arduino.dtr = True
+		except OSError as error:
+			if error.errno not in (errno.EINVAL, errno.ENOTTY):	# ports without modem lines
+				raise
+		
+		with self._lock:
+			self._clear_input()
+			self.codec = SerialCodec.CsvCodec()
+	
+	
+	def _hang_up(self, enable:bool) -> bool:
+		'''Private function that selects whether closing the port releases DTR, which resets the
+		Arduino the next time the port is opened. Returns the previous setting. Only changes the 
+		setting on Linux and macOS.
+		'''
+		if termios == None:
+			return enable
+		
+		try:
+			attrs = termios.tcgetattr( self.arduino.fileno() )
+		except termios.error:
+			return enable
+		
+		previous = bool(attrs[2] & termios.HUPCL)
+		if enable:
+			attrs[2] |= termios.HUPCL
+		else:
+			attrs[2] &= ~termios.HUPCL
+		termios.tcsetattr( self.arduino.fileno(), termios.TCSANOW, attrs )
+		return previous
+	
+	
+	def start_reader(self, maxlen:int = SerialReader._MAXLEN) -> SerialReader.SerialReader:
+		'''Start a thread that continuously reads the serial port. Replies are then assigned to 
+		pending commands as soon as they arrive, every parsed line is kept in a ring buffer, and
+		unsolicited messages are routed to a stream of events. See `SerialReader`.
+		
+		Parameters
+		----------
+		maxlen: int
+			Number of parsed lines kept in the ring buffer
+		
+		Returns
+		-------
+		reader: SerialReader
+			Thread that reads the port
+		'''
+		if self.reader == None:
+			self.reader = SerialReader.SerialReader(self, maxlen)
+		return self.reader
+	
+	
+	def stop_reader(self) -> None:
+		'''Stop the thread that reads the serial port, if it is active. Replies are read by 
+		the callers that wait for them afterwards.
+		'''
+		if self.reader != None:
+			self.reader.stop()
+			self.reader = None
+	
+	
 	def _strip_string(self, string:str) -> None:
 		''' Private function remote trailing characters that are send via serial by the Arduino.
 		
@@ -96,37 +258,315 @@ class SerialCommunication:
 	
 	
 	# read serial strings
-	def read_serial(self) -> str: 
+	def read_serial(self, timeout:float = _TIMEOUT) -> str: 
 		''' Read any incoming serial commands at the specified port. This is a blocking function
 		that waits until data is received, or the connection times out. 
 		
+		Parameters
+		----------
+		timeout: float
+			Time (in seconds) to wait for data
+		
 		Returns
 		-------
 		reply : str
 			String that contains the captured data. Returns "" if no data is captured
-			or if connection times out.
+			or if connection times out. Returns the oldest unread event if the reader thread is active.
 		'''
-		data = self.arduino.readline().decode('utf-8') 	# blocks unless timeout is given
-		self.arduino.flush()							# clear buffers
-		data = self._strip_string(data)
-		return data
+		if self.reader != None:
+			event = self.reader.get_event(timeout)
+			return "" if event == None else event['str']
+		
+		with self._lock:
+			data = self._read_line(timeout) 			# blocks until a reply or the timeout
+		return "" if data == None else self.codec.decode(data)
 	
 	
 	# write serial strings
-	def write_serial(self, string:str) -> None:
+	def write_serial(self, string:str, delay:float = _DELAY) -> None:
 		'''Write a string via serial to the specified port
 		
 		Parameters
 		----------
 		string: str
 			String that is sent via serial
+		
+		delay: float
+			Time (in seconds) to wait after the string is written. Use zero when the reply is \
+			awaited with `read_serial()` or `request()` instead.
 		'''
 		string = f'{string}{_END_CHAR}'     # add end-of-line to avoid blocking. ESSENTIAL
 		cmd = string.encode('utf-8')
 		self.arduino.reset_output_buffer()  # ensure no unwanted data is sent
 		self.arduino.write(cmd)
 		self.arduino.flush()				# ensure data is written
-		time.sleep(_DELAY)					# wait for message to be received
+		
+		if delay > 0:
+			time.sleep(delay)				# wait for message to be received
+	
+	
+	# request/response
+	def request(self, string:str, deadline:float = None) -> str:
+		'''Write a command and wait for its reply. Returns as soon as the end character of the \
+		reply arrives instead of sleeping for a fixed delay.
+		
+		Parameters
+		----------
+		string: str
+			String that is sent via serial
+		
+		deadline: float
+			Optional time (in seconds) to wait for the reply. Defaults to the value given to \
+			the constructor.
+		
+		Returns
+		-------
+		reply : str
+			String that contains the reply of the Arduino
+		'''
+		with self._lock:
+			if not self._pending and self.reader == None:
+				self._clear_input()					# discard stale replies of previous commands
+			future = self.submit(string)
+		
+		return future.result(deadline)
+	
+	
+	def submit(self, string:str, sink:tuple = None) -> PendingReply:
+		'''Write a command without waiting for its reply. Several commands can be in flight at 
+		once, as long as they fit in the serial input buffer of the Arduino. Replies are matched
+		to the commands in the order they were sent.
+		
+		Parameters
+		----------
+		string: str
+			String that is sent via serial
+		
+		sink: tuple
+			Optional `(out, func, count, offset)`. The reply is then parsed from the received \
+			bytes into `out` when it arrives, and the future resolves to `out`. \
+			See `SerialCodec.CsvCodec.parse_into()`
+		
+		Returns
+		-------
+		reply : PendingReply
+			Future that resolves to the reply string of the Arduino
+		'''
+		cmd = f'{string}{_END_CHAR}'.encode('utf-8')
+		
+		# The Arduino splits long commands into chunks of BUFFER_SIZE characters and replies 
+		# to each of them. Only the first reply is kept.
+		nreplies = len(string) // _BUFFER_SIZE + 1
+		future = PendingReply(self, string)
+		
+		with self._lock:
+			# wait for room in the input buffer of the Arduino
+			while self._pending and self._inflight + len(cmd) > self._window:
+				if self.reader == None:
+					self._pump(self.deadline)
+				elif not self._room.wait(self.deadline):
+					self._abort( TimeoutError(f"No room for '{string}' within the deadline") )
+			
+			self.arduino.write(cmd)
+			self._pending.append( [future, len(cmd), nreplies, sink] )
+			self._inflight += len(cmd)
+		
+		return future
+	
+	
+	def _wait(self, future:PendingReply, timeout:float) -> None:
+		'''Private function that reads replies until a pending command is resolved
+		'''
+		if timeout == None:
+			timeout = self.deadline
+		end = time.monotonic() + timeout
+		
+		# replies are assigned by the reader thread
+		if self.reader != None:
+			wait( [future], timeout )
+			with self._lock:
+				if not future.done():
+					self._abort( TimeoutError(f"No reply to '{future.command}' within " \
+					                          f"{timeout} seconds") )
+			return
+		
+		with self._lock:
+			while not future.done():
+				self._pump(end - time.monotonic())
+	
+	
+	def _pump(self, timeout:float) -> None:
+		'''Private function that reads a single reply and assigns it to the oldest pending
+		command. All pending commands fail if no reply arrives in time, since later replies 
+		can no longer be matched.
+		'''
+		line = self._read_line(timeout) if timeout > 0 else None
+		
+		if line == None:
+			command = self._pending[0][0].command
+			self._abort( TimeoutError(f"No reply to '{command}' within the deadline") )
+		else:
+			self._dispatch(line)
+	
+	
+	def _read_line(self, timeout:float) -> bytes | None:
+		'''Private function that reads a single reply within a time limit. Returns `None` if the
+		reply does not arrive. Incomplete replies are kept by the codec for the next read. The reply
+		is not decoded. See `SerialCodec.CsvCodec.feed()`
+		'''
+		end = time.monotonic() + timeout
+		
+		while not self._lines:
+			remaining = end - time.monotonic()
+			if remaining <= 0:
+				return None
+			
+			self.arduino.timeout = remaining
+			try:
+				data = self.arduino.read( max(1, self.arduino.in_waiting) )
+			finally:
+				self.arduino.timeout = _TIMEOUT
+			
+			if not data:
+				return None
+			self._lines.extend( self.codec.feed(data) )
+		
+		return self._lines.popleft()
+	
+	
+	def _clear_input(self) -> None:
+		'''Private function that discards received bytes and replies that were not read
+		'''
+		self.arduino.reset_input_buffer()
+		self.codec.reset()
+		self._lines.clear()
+	
+	
+	def _dispatch(self, reply:bytes) -> None:
+		'''Private function that routes a reply read from the port. Status messages of the 
+		Arduino and replies without a pending command are events. `BAD_COMMAND` is both an event 
+		and the reply of the oldest command.
+		'''
+		with self._lock:
+			is_event = self.codec.is_event(reply)
+			is_bad = is_event and self.codec.decode(reply) == 'BAD_COMMAND'
+			is_reply = bool(self._pending) and (not is_event or is_bad)
+			
+			if is_reply:
+				self._resolve(reply)
+			
+			if self.reader != None:
+				self.reader._record(self.codec.decode(reply), is_event = not is_reply or is_bad)
+	
+	
+	def _resolve(self, reply:bytes) -> None:
+		'''Private function that assigns a reply to the oldest pending command. Replies of
+		commands with a sink are parsed into it, the others are decoded into a string.
+		'''
+		entry = self._pending[0]
+		future, nbytes, nreplies, sink = entry
+		
+		if future.done():
+			pass
+		elif reply == SerialCodec.BAD_FRAME:
+			future.set_exception( ValueError(f"Corrupted reply to '{future.command}'") )
+		elif sink != None:
+			try:
+				future.set_result( self.codec.parse_into(reply, *sink) )
+			except ValueError as error:
+				future.set_exception(error)
+		else:
+			future.set_result( self.codec.decode(reply) )
+		
+		entry[2] = nreplies - 1
+		if entry[2] == 0:
+			self._pending.popleft()
+			self._inflight -= nbytes
+			self._room.notify_all()
+	
+	
+	def cancel(self, replies:list = None, error:Exception = None) -> None:
+		'''Fail commands that are waiting for their reply, without waiting. The commands keep
+		their place in the queue, so that their replies are discarded when they arrive instead
+		of being assigned to later commands.
+		
+		Parameters
+		----------
+		replies: list(PendingReply)
+			Commands to cancel, as returned by `submit()`. Every pending command if none are given.
+		
+		error: Exception
+			Exception raised by the result of each cancelled command. Defaults to a \
+			`CancelledError`.
+		'''
+		if error == None:
+			error = CancelledError("The command was cancelled before its reply arrived")
+		
+		with self._lock:
+			futures = [ entry[0] for entry in self._pending ] if replies == None else replies
+			for future in futures:
+				if not future.done():
+					future.set_exception(error)
+	
+	
+	def _abort(self, error:Exception) -> None:
+		'''Private function that fails every pending command and discards late replies
+		'''
+		while self._pending:
+			future = self._pending.popleft()[0]
+			if not future.done():
+				future.set_exception(error)
+		
+		self._inflight = 0
+		self._room.notify_all()
+		self._clear_input()
+	
+	
+	def set_binary(self, enable:bool = True) -> bool:
+		'''Select the format of the replies of the Arduino. Binary replies are framed, checked 
+		with a CRC and carry numbers as fixed-point integers, so they are about half as long as 
+		the CSV replies. See `SerialCodec`. Firmware without binary support answers `BAD_COMMAND`,
+		in which case the connection keeps using CSV. Other threads must not send commands while
+		the format changes.
+		
+		Parameters
+		----------
+		enable: bool
+			Whether binary replies are used (True) or CSV replies (False)
+		
+		Returns
+		-------
+		is_binary: bool
+			Whether the replies are binary after the call
+		'''
+		# replies of the commands in flight use the current format
+		for future in [ entry[0] for entry in list(self._pending) ]:
+			try:
+				future.result()
+			except Exception:
+				pass
+		
+		# the reply of this command is always a line of text
+		try:
+			reply = self.request(f"{SerialCodec.SET_BINARY},{int(enable)}")
+		except TimeoutError:
+			reply = None
+		
+		if reply == "SET_BINARY":
+			with self._lock:
+				self.codec = SerialCodec.BinaryCodec() if enable else SerialCodec.CsvCodec()
+		elif reply == "BAD_COMMAND":
+			with self._lock:
+				self.codec = SerialCodec.CsvCodec()		# firmware without binary replies
+		
+		return self.codec.binary
+	
+	
+	def request_data(self, string:str, out:str = None, deadline:float = None) -> str | list | dict:
+		'''Write a command and parse its reply. See `request()` and `read_data()`
+		'''
+		reply = self.request(string, deadline)
+		return self._parse_serial_string(reply, out)
 	
 	
 	# parse command
@@ -152,10 +592,10 @@ class SerialCommunication:
 		
 		# separate inputs
 		string_arr = string.split(",") 		# delimiter. Must match DELIM_CHAR from Arduino.
-
+		
 		if out == 'str_arr':
 			return string_arr
-
+			
 			# outputs
 		output = []
 		parseIsGood = True
@@ -170,7 +610,7 @@ class SerialCommunication:
 			for element in parameters:
 				try:
 					number = float(element)
-				except:
+				except ValueError:
 					number = 0 	# default value
 					parseIsGood = False
 					break;
@@ -184,6 +624,72 @@ class SerialCommunication:
 		          'str': string, 'str_arr': string_arr} 
 	
 	
+	def parse_into(self, string:str, out:object, func:str, count:int, offset:int = 0) -> None:
+		'''Fast path of `_parse_serial_string()` for reply strings with a known layout. The values 
+		are written into a preallocated array instead of a new list or dictionary. Use \
+		`request_into()` to skip the string and parse the received bytes instead.
+		
+		Parameters
+		----------
+		string: str
+			Reply of the Arduino. Ex: `FILTER,26.37,0.00,0.00,0.00`
+		
+		out: array
+			Mutable sequence of numbers with room for `count` values after `offset`. Ex: \
+			`array('f', [0]*4)` or a row of a NumPy array.
+		
+		func: str
+			Expected label of the reply. Labels of channel parameters match any channel. Ex: `PID_`
+		
+		count: int
+			Expected number of values
+		
+		offset: int
+			Index of `out` where the first value is written
+		
+		Raises
+		------
+		ValueError
+			If the label or the number of values do not match, or a value is not a number. \
+			The values in `out` are then undefined.
+		'''
+		fields = string.split(",")
+		
+		if not fields[0].startswith(func):
+			raise ValueError(f"Expected a '{func}' reply, received '{string}'")
+		if len(fields) != count + 1:
+			raise ValueError(f"Expected {count} values in '{string}'")
+		
+		index = offset
+		for field in fields[1:]:
+			out[index] = float(field)		# raises ValueError
+			index += 1
+	
+	
+	def request_into(self, string:str, out:object, offset:int = 0, deadline:float = None) -> object:
+		'''Write a getter command and parse its reply into a preallocated array. The reply is 
+		parsed from the received bytes by the codec, without decoding it into a string first: \
+		binary frames are unpacked from their fixed-point integers and CSV replies are split as \
+		bytes. See `request()` and `SerialCodec.CsvCodec.parse_into()`
+		
+		Returns
+		-------
+		out: array
+			Same array that is passed in
+		'''
+		try:
+			func, count = _REPLY_FIELDS[ int(string.partition(",")[0]) ]
+		except (KeyError, ValueError):
+			raise ValueError(f"The reply of '{string}' does not have a fixed layout")
+		
+		with self._lock:
+			if not self._pending and self.reader == None:
+				self._clear_input()					# discard stale replies of previous commands
+			future = self.submit(string, sink = (out, func, count, offset))
+		
+		return future.result(deadline)
+	
+	
 	def read_data(self, out:str=None) -> str | list | dict:
 		'''Read any incoming serial commands and parse them to useful data
 		
@@ -0,0 +1,366 @@
+"""
+Non-blocking counterpart of `ArduinoSerial` for programs that use `asyncio`. The serial port is
+watched by the event loop, so a single loop can talk to several Arduinos without threads blocking
+on `readline()`. Commands use the same comma delimited strings and the same in-order matching of
+replies as `ArduinoSerial.SerialCommunication.submit()`.
+"""
+
+# Global libraries
+import os
+import asyncio
+import serial
+from collections import deque
+
+# local file
+from . import ArduinoSerial
+from . import SerialReader
+from . import SerialCodec
+
+#--- CONSTANTS ---
+_POLL = 0.01 	# seconds | Polling period on platforms where the event loop cannot watch the port
+
+#===================================================================================================
+
+class AsyncSerialCommunication:
+
+	# parsing is shared with the blocking connection
+	_strip_string = ArduinoSerial.SerialCommunication._strip_string
+	_parse_serial_string = ArduinoSerial.SerialCommunication._parse_serial_string
+	parse_into = ArduinoSerial.SerialCommunication.parse_into
+	
+	def __init__(self, port:str, baud_rate:int, deadline:float = ArduinoSerial._DEADLINE):
+		'''Initialize serial communication with an Arduino. The port is watched by the event loop
+		that runs the first coroutine of this object.
+		
+		Parameters
+		----------
+		port: str
+			Serial port used by the Arduino to communicate with the computer.
+		
+		baud_rate: int
+			Baud rate at which the Arduino is configured.
+		
+		deadline: float
+			Default time (in seconds) that `request()` waits for a reply before raising a \
+			`TimeoutError`. Can be overridden for each command.
+		'''
+		self.arduino = serial.Serial(port, baud_rate, timeout=0, write_timeout=0) 	# never block
+		self.deadline = deadline
+		self._isActive = True
+		
+		# pipelined commands | replies arrive in the same order as the commands
+		self._pending = deque()
+		self._inflight = 0
+		self._window = ArduinoSerial._RX_BUFFER
+		self.codec = SerialCodec.CsvCodec()		# format of the replies. See: set_binary()
+		
+		# bytes waiting for room in the output buffer of the port. See: _write()
+		self._output = bytearray()
+		self._writing = False
+		
+		# created once the event loop is known
+		self._loop = None
+		self._room = None
+		self._events = None
+		self._poller = None
+		self._fd = None 		# file descriptor watched by the event loop
+	
+	
+	def _attach(self) -> None:
+		'''Private function that registers the serial port with the running event loop
+		'''
+		if self._loop != None:
+			return
+		
+		self._loop = asyncio.get_running_loop()
+		self._room = asyncio.Condition()
+		self._events = asyncio.Queue(maxsize=SerialReader._MAXLEN)
+		
+		try:
+			self._loop.add_reader(self.arduino.fileno(), self._on_readable)
+			self._fd = self.arduino.fileno()
+		except (AttributeError, NotImplementedError):	# Windows: no file descriptor to watch
+			self._poller = self._loop.create_task( self._poll() )
+	
+	
+	async def _poll(self) -> None:
+		'''Private coroutine that reads the port periodically when it cannot be watched
+		'''
+		while self._isActive:
+			if self.arduino.in_waiting > 0:
+				self._on_readable()
+			if self._output:
+				self._on_writable()
+			await asyncio.sleep(_POLL)
+	
+	
+	# helpers
+	def close(self) -> None:
+		'''Close the serial connection. Pending commands fail with a `ConnectionError`. Closing
+		a connection that is already closed does nothing.
+		'''
+		if not self._isActive:
+			return
+		
+		self._fail( ConnectionError("Serial connection was closed") )
+		
+		if self._loop != None:
+			if self._poller != None:
+				self._poller.cancel()
+			else:
+				self._loop.remove_reader(self._fd)
+		
+		self.arduino.close()
+		self._isActive = False
+		self._loop = None
+		self._poller = None
+		self._fd = None
+	
+	
+	def is_active(self) -> bool:
+		'''Returns whether the serial connection is active (True) or disabled (False)
+		
+		Returns
+		-------
+		is_active: bool
+		'''
+		return self._isActive
+	
+	
+	# read serial strings
+	def _on_readable(self) -> None:
+		'''Private callback of the event loop that splits the received bytes into replies
+		'''
+		try:
+			data = self.arduino.read( max(1, self.arduino.in_waiting) )
+		except serial.SerialException as error:
+			self._fail(error)
+			return
+		
+		for reply in self.codec.feed(data):
+			self._dispatch(reply)
+	
+	
+	def _dispatch(self, reply:bytes) -> None:
+		'''Private function that assigns a reply to the oldest pending command, or to the stream
+		of events. See `ArduinoSerial.SerialCommunication._dispatch()`
+		'''
+		is_event = self.codec.is_event(reply)
+		is_bad = is_event and self.codec.decode(reply) == 'BAD_COMMAND'
+		is_reply = bool(self._pending) and (not is_event or is_bad)
+		
+		if is_reply:
+			entry = self._pending[0]
+			future, nbytes, nreplies, sink = entry
+			
+			if future.done():
+				pass
+			elif reply == SerialCodec.BAD_FRAME:
+				future.set_exception( ValueError("Corrupted reply") )
+			elif sink != None:
+				try:
+					future.set_result( self.codec.parse_into(reply, *sink) )
+				except ValueError as error:
+					future.set_exception(error)
+			else:
+				future.set_result( self.codec.decode(reply) )
+			
+			entry[2] = nreplies - 1
+			if entry[2] == 0:
+				self._pending.popleft()
+				self._inflight -= nbytes
+				self._loop.create_task( self._notify_room() )
+		
+		if not is_reply or is_bad:
+			if self._events.full():
+				self._events.get_nowait()		# discard oldest event
+			self._events.put_nowait( self.codec.decode(reply) )
+	
+	
+	async def _notify_room(self) -> None:
+		'''Private coroutine that wakes up commands waiting for room in the input buffer
+		'''
+		async with self._room:
+			self._room.notify_all()
+	
+	
+	def _fail(self, error:Exception) -> None:
+		'''Private function that fails every pending command and discards late replies
+		'''
+		while self._pending:
+			future = self._pending.popleft()[0]
+			if not future.done():
+				future.set_exception(error)
+		
+		self._inflight = 0
+		self.codec.reset()
+		
+		# commands that were not sent yet would receive no pending command
+		self._output.clear()
+		if self._writing:
+			self._loop.remove_writer(self._fd)
+			self._writing = False
+		
+		if self._isActive:
+			self.arduino.reset_input_buffer()
+		if self._loop != None:
+			self._loop.create_task( self._notify_room() )
+	
+	
+	async def read_event(self, timeout:float = None) -> str:
+		'''Wait for a line that is not the reply of a command, such as `CALIBRATED`.
+		
+		Parameters
+		----------
+		timeout: float
+			Optional time (in seconds) to wait. Waits forever if none is given.
+		
+		Returns
+		-------
+		event : str
+			String sent by the Arduino
+		'''
+		self._attach()
+		return await asyncio.wait_for(self._events.get(), timeout)
+	
+	
+	# write serial strings
+	async def submit(self, string:str, sink:tuple = None) -> asyncio.Future:
+		'''Write a command without waiting for its reply. Waits only while the input buffer of the
+		Arduino is full. See `ArduinoSerial.SerialCommunication.submit()`
+		
+		Parameters
+		----------
+		string: str
+			String that is sent via serial
+		
+		sink: tuple
+			Optional `(out, func, count, offset)` that the reply is parsed into. \
+			See `ArduinoSerial.SerialCommunication.submit()`
+		
+		Returns
+		-------
+		reply : asyncio.Future
+			Future that resolves to the reply string of the Arduino
+		'''
+		self._attach()
+		cmd = f'{string}{ArduinoSerial._END_CHAR}'.encode('utf-8')
+		nreplies = len(string) // ArduinoSerial._BUFFER_SIZE + 1
+		
+		# wait for room in the input buffer of the Arduino
+		async with self._room:
+			fits = lambda: not self._pending or self._inflight + len(cmd) <= self._window
+			try:
+				await asyncio.wait_for(self._room.wait_for(fits), self.deadline)
+			except asyncio.TimeoutError:
+				self._fail( TimeoutError(f"No room for '{string}' within the deadline") )
+		
+		future = self._loop.create_future()
+		self._pending.append( [future, len(cmd), nreplies, sink] )
+		self._inflight += len(cmd)
+		self._write(cmd)
+		return future
+	
+	
+	def _write(self, data:bytes) -> None:
+		'''Private function that writes bytes without blocking the event loop. Bytes that the port
+		cannot accept yet are kept and written once it can, like the replies are read.
+		'''
+		self._output += data
+		self._on_writable()
+	
+	
+	def _on_writable(self) -> None:
+		'''Private callback of the event loop that writes the bytes that the port can accept
+		'''
+		try:
+			if self._fd != None:
+				count = os.write(self._fd, self._output)
+			else:
+				count = self.arduino.write(self._output)	# write_timeout=0: returns immediately
+		except BlockingIOError:
+			count = 0
+		except (OSError, serial.SerialException) as error:
+			self._fail(error)
+			return
+		
+		del self._output[:count]
+		
+		if self._fd == None:
+			return
+		if self._output and not self._writing:
+			self._loop.add_writer(self._fd, self._on_writable)
+			self._writing = True
+		elif not self._output and self._writing:
+			self._loop.remove_writer(self._fd)
+			self._writing = False
+	
+	
+	async def request(self, string:str, deadline:float = None, sink:tuple = None) -> str:
+		'''Write a command and wait for its reply.
+		
+		Parameters
+		----------
+		string: str
+			String that is sent via serial
+		
+		deadline: float
+			Optional time (in seconds) to wait for the reply. Defaults to the value given to \
+			the constructor.
+		
+		sink: tuple
+			Optional `(out, func, count, offset)` that the reply is parsed into. See `submit()`
+		
+		Returns
+		-------
+		reply : str
+			String that contains the reply of the Arduino, or `out` if a sink is given
+		'''
+		if deadline == None:
+			deadline = self.deadline
+		
+		future = await self.submit(string, sink)
+		try:
+			return await asyncio.wait_for(asyncio.shield(future), deadline)
+		except asyncio.TimeoutError:
+			self._fail( TimeoutError(f"No reply to '{string}' within {deadline} seconds") )
+			return future.result()	# raises the error
+	
+	
+	async def set_binary(self, enable:bool = True) -> bool:
+		'''Select the format of the replies of the Arduino. See 
+		`ArduinoSerial.SerialCommunication.set_binary()`
+		'''
+		# replies of the commands in flight use the current format
+		await asyncio.gather( *[ entry[0] for entry in list(self._pending) ], return_exceptions=True )
+		
+		try:
+			reply = await self.request(f"{SerialCodec.SET_BINARY},{int(enable)}")
+		except TimeoutError:
+			reply = None
+		
+		if reply == "SET_BINARY":
+			self.codec = SerialCodec.BinaryCodec() if enable else SerialCodec.CsvCodec()
+		return self.codec.binary
+	
+	
+	async def request_data(self, string:str, out:str = None, deadline:float = None) \
+	                                                                -> str | list | dict:
+		'''Write a command and parse its reply. See `ArduinoSerial.SerialCommunication.read_data()`
+		'''
+		reply = await self.request(string, deadline)
+		return self._parse_serial_string(reply, out)
+	
+	
+	async def request_into(self, string:str, out:object, offset:int = 0, deadline:float = None) \
+	                                                                                    -> object:
+		'''Write a getter command and parse its reply into a preallocated array. 
+		See `ArduinoSerial.SerialCommunication.request_into()`
+		'''
+		try:
+			func, count = ArduinoSerial._REPLY_FIELDS[ int(string.partition(",")[0]) ]
+		except (KeyError, ValueError):
+			raise ValueError(f"The reply of '{string}' does not have a fixed layout")
+		
+		return await self.request(string, deadline, sink = (out, func, count, offset))
+
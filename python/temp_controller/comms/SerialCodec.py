@@ -0,0 +1,368 @@
+"""
+Decoders that split the bytes received from the Arduino into replies. Two formats exist:
+
+- __CSV__ (default): each reply is a comma delimited line of text. Ex: `FILTER,26.37,0.00,0.00,0.00`
+- __Binary__: each reply is a frame with a length and a checksum, and numbers are sent as
+  fixed-point integers with `DECIMAL_MAX` decimals (centi-degrees):
+
+```
+<SYNC> <LEN> <KIND> <CHANNEL> <FORMAT> <DATA ...> <CRC8>
+```
+
+`LEN` counts the bytes from `KIND` to the end of `DATA`, and `CRC8` (polynomial 0x07) covers the
+bytes from `LEN` to the end of `DATA`. Binary frames are decoded back into the same strings as the
+CSV protocol, so the rest of the API does not depend on the format. Lines of text are still
+accepted between frames, which is how the Arduino answers before and after the format changes.
+
+`feed()` returns the replies as received (bytes), and a reply is only converted when it is used:
+
+- `decode()` returns the string of the CSV protocol
+- `parse_into()` writes the numbers into a preallocated array without building the string. 
+  Binary frames are unpacked from their fixed-point integers, and CSV lines are split as bytes.
+"""
+
+# Global libraries
+import struct
+
+# local file
+from . import SerialReader
+
+#--- CONSTANTS ---
+_END_CHAR = b'\n' 		# see: arduino/Constants.h
+_DECIMAL_MAX = 2 		# see: arduino/Constants.h
+_SCALE = 10**_DECIMAL_MAX
+
+_SYNC = 0xA5			# first byte of a frame. Never the first character of a line of text
+_NO_CHANNEL = 0xFF
+_FMT_NONE, _FMT_INT16, _FMT_INT32, _FMT_CHAR = range(4)
+
+# Command that selects the format of the replies: "20,1" binary, "20,0" CSV
+SET_BINARY = 20
+
+# Reply that replaces a corrupted frame. The pending command fails instead of receiving it.
+BAD_FRAME = "BAD_FRAME"
+_MAX_SIZE = 3 + 4 * 44	# LEN of the longest reply: PARAMETERS with 44 int32 numbers
+
+# Kind of each reply. Commands use their number in `arduino/Commands.h`.
+# Labels that end with "_" are followed by the channel.
+_LABELS = {
+	0: "FILTER",      1: "RAW",          2: "TARGET",        3: "SET_TARGET",
+	4: "PID_",        5: "SET_PID",      6: "IN_LIMIT_",     7: "SET_IN_LIMIT",
+	8: "AB_FILTER_",  9: "SET_AB_FILTER", 10: "K_FILTER_",   11: "SET_K_FILTER",
+	12: "SET_K_FILTER_STATE", 13: "SENSOR_TYPES", 14: "SET_ENABLE", 15: "SET_DISABLE",
+	16: "ENABLE",     17: "TIMER",       18: "TIMEOUT",      19: "SET_TIMEOUT",
+	SET_BINARY: "SET_BINARY", 21: "PARAMETERS",
+	# messages that are not replies to a getter or setter
+	0xF0: "BAD_COMMAND",    0xF1: "CONNECTED",     0xF2: "WAITING-TYPES",
+	0xF3: "RECEIVED-TYPES", 0xF4: "DEFAULT-TYPES", 0xF5: "CALIBRATED",
+}
+_KINDS = { label: kind for kind, label in _LABELS.items() }
+
+_INT16 = struct.Struct('<h')
+_INT32 = struct.Struct('<i')
+_NUMBERS = { _FMT_INT16: _INT16, _FMT_INT32: _INT32 }
+
+# messages of the Arduino that are not replies. See: SerialReader
+_EVENT_LINES = frozenset( event.encode('utf-8') for event in SerialReader._EVENTS )
+_EVENT_KINDS = frozenset( _KINDS[event] for event in SerialReader._EVENTS )
+
+#===================================================================================================
+
+def crc8(data:bytes) -> int:
+	'''Checksum of a frame. CRC-8 with polynomial 0x07 and initial value 0.
+	'''
+	crc = 0
+	for byte in data:
+		crc ^= byte
+		for i in range(8):
+			crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+	return crc
+
+
+def encode_reply(line:str) -> bytes:
+	'''Convert a reply of the CSV protocol into a binary frame. This is the encoding the firmware
+	uses in binary mode. See `ArduinoSimulator`
+	
+	Parameters
+	----------
+	line: str
+		Reply without end characters. Ex: `PID_0,15.00,0.25,20.00`
+	
+	Returns
+	-------
+	frame: bytes
+	'''
+	fields = line.split(",")
+	label, values = fields[0], fields[1:]
+	channel = _NO_CHANNEL
+	
+	if label not in _KINDS:		# label followed by a channel. Ex: PID_0
+		prefix = label.rstrip("0123456789")
+		channel = int( label[len(prefix):] )
+		label = prefix
+	
+	kind = _KINDS[label]
+	
+	if len(values) == 0:
+		fmt, data = _FMT_NONE, b''
+	elif kind == _KINDS["SENSOR_TYPES"]:
+		fmt, data = _FMT_CHAR, "".join(values).encode('utf-8')
+	else:
+		numbers = [ round(float(value) * _SCALE) for value in values ]
+		if all( -2**15 <= num < 2**15 for num in numbers ):
+			fmt, data = _FMT_INT16, b''.join( _INT16.pack(num) for num in numbers )
+		else:
+			numbers = [ max(-2**31, min(num, 2**31 - 1)) for num in numbers ]
+			fmt, data = _FMT_INT32, b''.join( _INT32.pack(num) for num in numbers )
+	
+	body = bytes([ 3 + len(data), kind, channel, fmt ]) + data
+	return bytes([_SYNC]) + body + bytes([ crc8(body) ])
+
+#===================================================================================================
+
+class CsvCodec:
+	'''Splits the received bytes into lines of text
+	'''
+	
+	binary = False
+	
+	def __init__(self):
+		self._buffer = b''
+	
+	
+	def reset(self) -> None:
+		'''Discard any incomplete reply
+		'''
+		self._buffer = b''
+	
+	
+	def feed(self, data:bytes) -> list:
+		'''Add received bytes and return the replies that are complete
+		
+		Parameters
+		----------
+		data: bytes
+			Bytes read from the serial port
+		
+		Returns
+		-------
+		replies: list(bytes)
+			Replies without end characters. See `decode()` and `parse_into()`
+		'''
+		self._buffer += data
+		if _END_CHAR not in self._buffer:
+			return []
+		
+		*lines, self._buffer = self._buffer.split(_END_CHAR)
+		return [ line.replace(b'\r', b'') for line in lines ]
+	
+	
+	def decode(self, reply:bytes) -> str:
+		'''Convert a reply returned by `feed()` into the string of the CSV protocol
+		
+		Parameters
+		----------
+		reply: bytes
+		
+		Returns
+		-------
+		string: str
+			Ex: `FILTER,26.37,0.00,0.00,0.00`
+		'''
+		if isinstance(reply, str): 		# BAD_FRAME
+			return reply
+		return reply.decode('utf-8', errors='replace')
+	
+	
+	def is_event(self, reply:bytes) -> bool:
+		'''Returns whether a reply is a message of the Arduino that can arrive without a command,
+		such as `CALIBRATED` or `BAD_COMMAND`. See `SerialReader`
+		'''
+		return reply in _EVENT_LINES
+	
+	
+	def parse_into(self, reply:bytes, out:object, func:str, count:int, offset:int = 0) -> object:
+		'''Write the numbers of a reply into a preallocated array. See \
+		`SerialCommunication.parse_into()`
+		
+		Parameters
+		----------
+		reply: bytes
+			Reply returned by `feed()`
+		
+		out: array
+			Mutable sequence of numbers with room for `count` values after `offset`
+		
+		func: str
+			Expected label of the reply. Labels of channel parameters match any channel. Ex: `PID_`
+		
+		count: int
+			Expected number of values
+		
+		offset: int
+			Index of `out` where the first value is written
+		
+		Returns
+		-------
+		out: array
+			Same array that is passed in
+		
+		Raises
+		------
+		ValueError
+			If the label or the number of values do not match, or a value is not a number.
+		'''
+		if isinstance(reply, str):
+			raise ValueError(f"Expected a '{func}' reply, received '{reply}'")
+		
+		fields = reply.split(b',')
+		
+		if not fields[0].startswith( func.encode('utf-8') ):
+			raise ValueError(f"Expected a '{func}' reply, received '{self.decode(reply)}'")
+		if len(fields) != count + 1:
+			raise ValueError(f"Expected {count} values in '{self.decode(reply)}'")
+		
+		index = offset
+		for field in fields[1:]:
+			out[index] = float(field)		# raises ValueError
+			index += 1
+		return out
+
+#---------------------------------------------------------------------------------------------------
+
+class _Frame(bytes):
+	'''Body of a binary frame, from `LEN` to the end of `DATA`. Keeps frames apart from lines of
+	text in the replies of `BinaryCodec.feed()`
+	'''
+	__slots__ = ()
+
+#---------------------------------------------------------------------------------------------------
+
+class BinaryCodec(CsvCodec):
+	'''Decodes binary frames into the strings of the CSV protocol. Lines of text are also accepted.
+	A corrupted frame is reported once as `BAD_FRAME`, so that the pending command fails instead 
+	of receiving the reply of the next one. The decoder then skips to the next `SYNC` byte.
+	'''
+	
+	binary = True
+	
+	def feed(self, data:bytes) -> list:
+		'''See `CsvCodec.feed()`
+		'''
+		self._buffer += data
+		replies = []
+		buffer = self._buffer
+		
+		while buffer:
+			# line of text
+			if buffer[0] != _SYNC:
+				end = buffer.find(_END_CHAR)
+				if end < 0:
+					break
+				replies.append( buffer[:end].replace(b'\r', b'') )
+				buffer = buffer[end + 1:]
+				continue
+			
+			# frame
+			if len(buffer) < 2:
+				break
+			size = buffer[1]
+			isGood = 3 <= size <= _MAX_SIZE
+			
+			if isGood:
+				if len(buffer) < size + 3:
+					break
+				body = buffer[1:size + 2]
+				isGood = crc8(body) == buffer[size + 2] and self._is_boundary(buffer, size + 3) \
+				         and body[1] in _LABELS
+			
+			if isGood:
+				replies.append( _Frame(body) )
+				buffer = buffer[size + 3:]
+			else:
+				replies.append(BAD_FRAME)
+				buffer = self._resync(buffer)
+		
+		self._buffer = buffer
+		return replies
+	
+	
+	def decode(self, reply:bytes) -> str:
+		'''See `CsvCodec.decode()`
+		'''
+		if isinstance(reply, _Frame):
+			return self._decode(reply)
+		return super().decode(reply)
+	
+	
+	def is_event(self, reply:bytes) -> bool:
+		'''See `CsvCodec.is_event()`
+		'''
+		if isinstance(reply, _Frame):
+			return reply[1] in _EVENT_KINDS
+		return super().is_event(reply)
+	
+	
+	def parse_into(self, reply:bytes, out:object, func:str, count:int, offset:int = 0) -> object:
+		'''See `CsvCodec.parse_into()`. The fixed-point integers of a frame are scaled straight 
+		into `out`.
+		'''
+		if not isinstance(reply, _Frame):
+			return super().parse_into(reply, out, func, count, offset)
+		
+		kind, fmt = reply[1], reply[3]
+		if _LABELS.get(kind) != func:
+			raise ValueError(f"Expected a '{func}' reply, received '{self.decode(reply)}'")
+		
+		number = _NUMBERS.get(fmt)
+		if number == None or len(reply) != 4 + count * number.size:
+			raise ValueError(f"Expected {count} values in '{self.decode(reply)}'")
+		
+		index = offset
+		for num, in number.iter_unpack( memoryview(reply)[4:] ):
+			out[index] = num / _SCALE
+			index += 1
+		return out
+	
+	
+	def _is_boundary(self, buffer:bytes, index:int) -> bool:
+		'''Private function that returns whether a frame or a line of text can start at `index`.
+		Text lines are printable, while a shifted frame usually continues with binary data.
+		'''
+		if index >= len(buffer):
+			return True
+		byte = buffer[index]
+		return byte == _SYNC or 0x20 <= byte < 0x7F or byte in b'\r\n'
+	
+	
+	def _resync(self, buffer:bytes) -> bytes:
+		'''Private function that drops the first byte of a corrupted frame and the bytes before
+		the next `SYNC` byte
+		'''
+		start = buffer.find(bytes([_SYNC]), 1)
+		return b'' if start < 0 else buffer[start:]
+	
+	
+	def _decode(self, body:bytes) -> str:
+		'''Private function that converts the body of a frame into a CSV string
+		'''
+		kind, channel, fmt = body[1], body[2], body[3]
+		data = body[4:]
+		if kind not in _LABELS:
+			return BAD_FRAME
+		label = _LABELS[kind]
+		
+		if channel != _NO_CHANNEL:
+			label = f"{label}{channel}"
+		
+		if fmt == _FMT_INT16:
+			values = [ f"{num / _SCALE:.{_DECIMAL_MAX}f}" for num, in _INT16.iter_unpack(data) ]
+		elif fmt == _FMT_INT32:
+			values = [ f"{num / _SCALE:.{_DECIMAL_MAX}f}" for num, in _INT32.iter_unpack(data) ]
+		elif fmt == _FMT_CHAR:
+			values = list( data.decode('utf-8', errors='replace') )
+		else:
+			values = []
+		
+		return ",".join([label, *values])
+
@@ -0,0 +1,163 @@
+"""
+Module intended to continuously drain the serial port of an Arduino on a dedicated thread. Replies
+are assigned to pending commands, stored in a bounded ring buffer of parsed lines, and status
+messages that are not replies are routed to a separate stream of events.
+"""
+
+import threading
+import time
+from collections import deque
+
+#--- CONSTANTS ---
+_MAXLEN = 256   # lines | Size of the ring buffer of parsed lines
+_POLL   = 0.1   # seconds | Time a read blocks before checking whether the thread was stopped
+
+# Lines printed by the Arduino that are not replies to a command. See: arduino/SerialCom.ino
+# NOTE: BAD_COMMAND is the reply of a rejected command and is also reported as an event.
+_EVENTS = ('CONNECTED', 'WAITING-TYPES', 'CALIBRATED', 'BAD_COMMAND')
+
+#=========================================================================================
+
+class SerialReader(threading.Thread):
+
+	def __init__(self, serial:object, maxlen:int = _MAXLEN, name:str = 'serial-reader-thread'):
+		'''Initialize thread that reads serial data. The thread is started automatically.
+		
+		Parameters
+		----------
+		serial: SerialCommunication
+			Connection that is read by the thread
+		
+		maxlen: int
+			Number of parsed lines that are kept in the ring buffer. Older lines are discarded.
+		
+		name: str
+			label for the thread. If none is given it defaults to a generic name.
+		'''
+		super(SerialReader, self).__init__(name=name, daemon=True)
+		# Variables
+		self._serial = serial
+		self._lines = deque(maxlen=maxlen)
+		self._events = deque(maxlen=maxlen)
+		self._latest = {}						# newest line of each function
+		self._count = 0							# total number of lines read
+		self._condition = threading.Condition()
+			# closing thread
+		self._stop_event = threading.Event()
+		
+		# Initialize thread
+		self.start()
+	
+	
+	def run(self) -> None:
+		'''Loop that is executed by the thread that listens to the serial port.
+		This loop will continue indefinately until `stop()` is called.
+		'''
+		while self.is_active():
+			try:
+				line = self._serial._read_line(_POLL)
+			except Exception:		# port was closed
+				break
+			
+			if line != None:
+				self._serial._dispatch(line)
+	
+	
+	def _record(self, line:str, is_event:bool) -> None:
+		'''Private function that stores a line read by the thread. Called by the connection.
+		
+		Parameters
+		----------
+		line: str
+			Line without end characters
+		
+		is_event: bool
+			Whether the line is an unsolicited message of the Arduino
+		'''
+		entry = self._serial._parse_serial_string(line, None)
+		entry['time'] = time.monotonic()
+		
+		with self._condition:
+			self._count += 1
+			entry['count'] = self._count
+			self._lines.append(entry)
+			self._latest[entry['func']] = entry
+			
+			if is_event:
+				self._events.append(entry)
+			self._condition.notify_all()
+	
+	
+	def latest(self, func:str = None) -> dict | None:
+		'''Returns the newest parsed line without waiting.
+		
+		Parameters
+		----------
+		func: str
+			Optional label of the line, such as "FILTER" or "RAW". Any line is returned if none
+			is given.
+		
+		Returns
+		-------
+		line: dict
+			Dictionary of the parsed line (see `SerialCommunication.read_data()`) with the \
+			additional fields `time` (monotonic seconds) and `count`. `None` if no line was read.
+		'''
+		with self._condition:
+			if func == None:
+				return self._lines[-1] if self._lines else None
+			return self._latest.get(func)
+	
+	
+	def lines(self) -> list:
+		'''Returns a copy of the ring buffer of parsed lines, from oldest to newest
+		
+		Returns
+		-------
+		lines: list[dict]
+		'''
+		with self._condition:
+			return list(self._lines)
+	
+	
+	def get_event(self, timeout:float = None) -> dict | None:
+		'''Returns the oldest unread event, such as `CALIBRATED` or `BAD_COMMAND`.
+		
+		Parameters
+		----------
+		timeout: float
+			Time (in seconds) to wait for an event. Returns immediately if none is given.
+		
+		Returns
+		-------
+		event: dict
+			Parsed line of the event. `None` if no event arrived.
+		'''
+		with self._condition:
+			if not self._events and timeout != None:
+				self._condition.wait_for(lambda: self._events or not self.is_active(), timeout)
+			return self._events.popleft() if self._events else None
+	
+	
+	def stop(self) -> None:
+		'''Stops the thread. Must be called before the serial connection is closed.
+		'''
+		self._stop_event.set()
+		if self is not threading.current_thread():
+			self.join()
+		
+		with self._condition:
+			self._condition.notify_all()
+	
+	
+	def is_active(self) -> bool:
+		'''Indicates whether the thread is active.
+		
+		Returns
+		-------
+		flag: bool
+			True when the thread is reading the serial port.
+			False when `stop()` is called and the thread is closed.
+		'''
+		return not self._stop_event.is_set()
+